@@ -0,0 +1,95 @@
+"""Bulk product endpoints versus one request per product.
+
+Creates --products products with POST /api/products one at a time and
+with a single POST /api/products/bulk, then restocks them with
+PUT /api/products/{id} per product versus one PATCH /api/products/bulk,
+and reports rows/sec for each.
+
+Usage (from backend/):
+    python benchmarks/bench_bulk_products.py --products 500
+    python benchmarks/bench_bulk_products.py --products 500 --mock
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from common import CATEGORIES, UNITS, asgi_client, reset_database, server, use_mongomock
+
+
+def product_rows(count: int) -> list:
+    rows = []
+    for i in range(count):
+        cost = round(random.uniform(0.5, 5), 2)
+        rows.append({
+            "name": f"Product {i}",
+            "category": random.choice(CATEGORIES),
+            "cost_price": cost,
+            "selling_price": round(cost * 1.4, 2),
+            "quantity": 10,
+            "unit": random.choice(UNITS),
+        })
+    return rows
+
+
+async def timed(label: str, rows: int, coro) -> tuple:
+    """(stats, result) for awaiting coro"""
+    started = time.perf_counter()
+    result = await coro
+    elapsed = time.perf_counter() - started
+    print(f"{label:<32} {rows:>7} rows {elapsed:>8.3f}s {rows / elapsed:>10.1f} rows/s")
+    return {"rows": rows, "seconds": round(elapsed, 4), "rows_per_s": round(rows / elapsed, 1)}, result
+
+
+async def main(args):
+    if args.mock:
+        use_mongomock()
+    await reset_database()
+    await server.ensure_indexes()
+    rows = product_rows(args.products)
+    results = {}
+
+    async with asgi_client() as client:
+        async def create_each():
+            ids = []
+            for row in rows:
+                response = await client.post("/api/products", json=row)
+                ids.append(response.json()["id"])
+            return ids
+
+        async def update_each(ids):
+            for product_id in ids:
+                await client.put(f"/api/products/{product_id}", json={"quantity": 20})
+
+        async def create_bulk():
+            response = await client.post("/api/products/bulk", json=rows)
+            return [row["id"] for row in response.json()["results"]]
+
+        async def update_bulk(ids):
+            response = await client.patch(
+                "/api/products/bulk",
+                json=[{"id": product_id, "quantity_delta": 10} for product_id in ids],
+            )
+            return response.json()["updated"]
+
+        results["create_per_item"], ids = await timed("POST /api/products x N", len(rows), create_each())
+        results["update_per_item"], _ = await timed("PUT /api/products/{id} x N", len(rows), update_each(ids))
+        await reset_database()
+        await server.ensure_indexes()
+
+        results["create_bulk"], ids = await timed("POST /api/products/bulk", len(rows), create_bulk())
+        results["update_bulk"], _ = await timed("PATCH /api/products/bulk", len(rows), update_bulk(ids))
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump({"products": args.products, **results}, fh, indent=2)
+    await reset_database()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--mock", action="store_true", help="use mongomock-motor instead of MONGO_URL")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,88 @@
+"""Concurrent tills hammering POST /api/receipts/create.
+
+Seeds a small catalog with scarce stock, runs --tills concurrent clients
+each ringing up --carts random carts, then checks that no product was
+oversold: final stock must equal initial stock minus every quantity on a
+stored receipt, and never drop below zero. Run it on two commits and
+compare the reported p99 to see the effect of a change.
+
+Usage (from backend/, with a local mongod or replica set):
+    python benchmarks/bench_checkout.py --products 20 --stock 200 --tills 16 --carts 50
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import defaultdict
+
+from common import asgi_client, cart, reset_database, seed_products, server, summarize, use_mongomock
+
+
+async def till(client, products: list, carts: int, lines: int, latencies: list, outcomes: dict):
+    for _ in range(carts):
+        started = time.perf_counter()
+        response = await client.post("/api/receipts/create", json=cart(products, lines))
+        latencies.append(time.perf_counter() - started)
+        outcomes[response.status_code] += 1
+
+
+async def check_stock(products: list, initial_stock: float) -> list:
+    sold = defaultdict(float)
+    async for receipt in server.db.receipts.find({}, {"_id": 0, "items": 1}):
+        for item in receipt["items"]:
+            sold[item["product_id"]] += item["quantity"]
+
+    problems = []
+    async for product in server.db.products.find({}, {"_id": 0, "id": 1, "name": 1, "quantity": 1}):
+        expected = initial_stock - sold[product["id"]]
+        if product["quantity"] < 0 or abs(product["quantity"] - expected) > 1e-9:
+            problems.append(f"{product['name']}: stock {product['quantity']}, expected {expected}")
+    return problems
+
+
+async def main(args):
+    if args.mock:
+        use_mongomock()
+    await reset_database()
+    await server.ensure_indexes()
+    products = await seed_products(args.products, quantity=args.stock)
+
+    latencies = []
+    outcomes = defaultdict(int)
+    started = time.perf_counter()
+    async with asgi_client() as client:
+        await asyncio.gather(*[
+            till(client, products, args.carts, args.lines, latencies, outcomes)
+            for _ in range(args.tills)
+        ])
+    elapsed = time.perf_counter() - started
+
+    problems = await check_stock(products, args.stock)
+    results = {
+        "tills": args.tills,
+        "requests": len(latencies),
+        "req_per_s": round(len(latencies) / elapsed, 1),
+        "status_counts": dict(outcomes),
+        "transactions": await server.transactions_supported(),
+        "oversold": problems,
+        **summarize(latencies),
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(results, fh, indent=2)
+    await reset_database()
+    if problems:
+        raise SystemExit("Stock does not match stored receipts")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--stock", type=float, default=200, help="initial stock per product")
+    parser.add_argument("--tills", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--carts", type=int, default=50, help="carts per till")
+    parser.add_argument("--lines", type=int, default=5, help="lines per cart")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--mock", action="store_true", help="use mongomock-motor instead of MONGO_URL")
+    asyncio.run(main(parser.parse_args()))
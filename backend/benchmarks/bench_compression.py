@@ -0,0 +1,150 @@
+"""Bytes saved and CPU spent compressing each endpoint's response.
+
+Seeds the benchmark database and fetches each endpoint once with
+Accept-Encoding: identity, so the body is the raw JSON. Every body is then
+compressed with gzip at levels 1, 6 and 9 and with Brotli at qualities 1, 4
+and 11. For each one the script reports the compressed size, bytes saved,
+ratio and CPU milliseconds (the median of --repeat runs).
+
+The pays-off column compares the CPU time with the time the saved bytes
+take on a --link-mbps connection. "yes" means compressing gets the response
+to the client sooner. The sales list at several page sizes shows where
+that starts, which is what COMPRESSION_MIN_SIZE should be set from.
+
+It then times each endpoint over ASGI with identity, gzip and br. The
+server uses its configured GZIP_LEVEL and BROTLI_QUALITY, and the timings
+show the end-to-end cost of the middleware.
+
+Usage (from backend/, with a local mongod):
+    python benchmarks/bench_compression.py --products 500 --sales 50000
+    python benchmarks/bench_compression.py --mock --link-mbps 5 --output compression.json
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import statistics
+import time
+
+from common import (
+    asgi_client, print_table, reset_database, seed_products, seed_receipts, seed_sales,
+    server, summarize, time_request, use_mongomock,
+)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# label: (url, query params)
+ENDPOINTS = {
+    "products": ("/api/products", {}),
+    "low stock": ("/api/products/low-stock", {}),
+    "sales x1": ("/api/sales", {"limit": 1}),
+    "sales x5": ("/api/sales", {"limit": 5}),
+    "sales x20": ("/api/sales", {"limit": 20}),
+    "sales x100": ("/api/sales", {"limit": 100}),
+    "sales x1000": ("/api/sales", {"limit": 1000}),
+    "receipts x100": ("/api/receipts", {"limit": 100}),
+    "dashboard": ("/api/dashboard/stats", {}),
+    "receipts summary": ("/api/receipts/summary/totals", {}),
+    "top products": ("/api/analytics/products", {"limit": 50}),
+}
+
+
+def compressors() -> dict:
+    """name: function of the body, for each encoding and level measured"""
+    found = {
+        f"gzip-{level}": (lambda level: lambda body: gzip.compress(body, compresslevel=level, mtime=0))(level)
+        for level in (1, 6, 9)
+    }
+    if brotli is not None:
+        for quality in (1, 4, 11):
+            found[f"br-{quality}"] = (
+                lambda quality: lambda body: brotli.compress(body, mode=brotli.MODE_TEXT, quality=quality)
+            )(quality)
+    return found
+
+
+def measure(body: bytes, compress, repeat: int) -> tuple:
+    timings = []
+    for _ in range(repeat):
+        started = time.process_time()
+        compressed = compress(body)
+        timings.append(time.process_time() - started)
+    return len(compressed), statistics.median(timings)
+
+
+async def seed(args):
+    await reset_database()
+    print(f"Seeding {args.products} products, {args.sales} sales and {args.receipts} receipts...")
+    products = await seed_products(args.products)
+    await seed_sales(args.sales, products)
+    await seed_receipts(args.receipts, products)
+    await server.ensure_indexes()
+    if not args.mock:  # mongomock has no $merge
+        await server.rebuild_daily_rollups()
+
+
+async def main(args):
+    if args.mock:
+        use_mongomock()
+    await seed(args)
+    if args.mock:  # mongomock has no $unionWith
+        ENDPOINTS.pop("top products")
+
+    bodies = {}
+    async with asgi_client() as client:
+        for label, (url, params) in ENDPOINTS.items():
+            response = await client.get(url, params=params, headers={"Accept-Encoding": "identity"})
+            response.raise_for_status()
+            bodies[label] = response.content
+
+    bytes_per_ms = args.link_mbps * 1e6 / 8 / 1000
+    results = {"compression": {}, "requests": {}}
+    print(f"\nLink: {args.link_mbps} Mbit/s; COMPRESSION_MIN_SIZE is {server.COMPRESSION_MIN_SIZE} bytes")
+    print(f"{'endpoint':<18} {'raw':>9} {'codec':<8} {'bytes':>9} {'saved':>9} {'ratio':>6} "
+          f"{'cpu ms':>8} {'saved ms':>9} {'pays off':>8}")
+    for label, body in bodies.items():
+        for codec, compress in compressors().items():
+            size, cpu = measure(body, compress, args.repeat)
+            saved = len(body) - size
+            transfer_saved_ms = saved / bytes_per_ms
+            results["compression"][f"{label}/{codec}"] = {
+                "raw_bytes": len(body),
+                "compressed_bytes": size,
+                "saved_bytes": saved,
+                "cpu_ms": round(cpu * 1000, 3),
+                "transfer_saved_ms": round(transfer_saved_ms, 3),
+            }
+            print(f"{label:<18} {len(body):>9} {codec:<8} {size:>9} {saved:>9} {len(body) / size:>5.1f}x "
+                  f"{cpu * 1000:>8.3f} {transfer_saved_ms:>9.3f} {'yes' if transfer_saved_ms > cpu * 1000 else 'no':>8}")
+
+    async with asgi_client() as client:
+        for label, (url, params) in ENDPOINTS.items():
+            for encoding in ("identity", "gzip", "br"):
+                headers = {"Accept-Encoding": encoding}
+                await time_request(client, "GET", url, params=params, headers=headers)  # warm up
+                results["requests"][f"{label} [{encoding}]"] = summarize([
+                    await time_request(client, "GET", url, params=params, headers=headers)
+                    for _ in range(args.requests)
+                ])
+    print_table("Requests over ASGI by Accept-Encoding", results["requests"])
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump({"args": vars(args), **results}, fh, indent=2)
+    await reset_database()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--sales", type=int, default=50_000)
+    parser.add_argument("--receipts", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20, help="compressions per body and codec; the median is reported")
+    parser.add_argument("--requests", type=int, default=50, help="timed requests per endpoint and encoding")
+    parser.add_argument("--link-mbps", type=float, default=10, help="client bandwidth used to weigh bytes saved against CPU")
+    parser.add_argument("--mock", action="store_true", help="use mongomock-motor instead of MONGO_URL")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,122 @@
+"""Latency of GET /api/dashboard/stats and GET /api/receipts/summary/totals.
+
+Seeds a shop-sized dataset, then measures both endpoints over ASGI with
+one client at a time and with --concurrency clients at once. It also runs
+each endpoint's queries directly against MongoDB, first one after another
+and then fanned out with asyncio.gather, to show how much the fan-out
+saves. No If-None-Match is sent, so every request runs its queries.
+
+Usage (from backend/, with a local mongod):
+    python benchmarks/bench_dashboard.py --products 2000 --sales 500000 --receipts 100000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timezone
+
+from common import (
+    asgi_client, print_table, reset_database, seed_products, seed_receipts, seed_sales,
+    server, summarize, time_request, use_mongomock,
+)
+
+ENDPOINTS = ["/api/dashboard/stats", "/api/receipts/summary/totals"]
+
+
+def dashboard_queries():
+    """The queries get_dashboard_stats runs, as coroutine factories"""
+    db = server.db
+    today = server.rollup_day(datetime.now(timezone.utc))
+    return [
+        lambda: db.products.estimated_document_count(),
+        lambda: db.products.count_documents(server.LOW_STOCK),
+        lambda: db.products.find(server.LOW_STOCK, server.DASHBOARD_PRODUCT_FIELDS).sort(
+            [("stock_margin", 1), ("id", 1)]).limit(5).to_list(5),
+        lambda: db.daily_rollups.find_one({"_id": today}),
+        lambda: db.sales.find({}, server.DASHBOARD_SALE_FIELDS).sort("sale_date", -1).limit(5).to_list(5),
+    ]
+
+
+def receipts_summary_queries():
+    """The queries get_receipts_summary runs, as coroutine factories"""
+    today = server.rollup_day(datetime.now(timezone.utc))
+    fields = ["receipts_count", "receipts_amount", "receipts_profit"]
+    return [
+        lambda: server.sum_daily_rollups(fields=fields),
+        lambda: server.db.daily_rollups.find_one({"_id": today}),
+    ]
+
+
+async def time_queries(queries: list, concurrent: bool) -> float:
+    started = time.perf_counter()
+    if concurrent:
+        await asyncio.gather(*(query() for query in queries))
+    else:
+        for query in queries:
+            await query()
+    return time.perf_counter() - started
+
+
+async def seed(args):
+    await reset_database()
+    print(f"Seeding {args.products} products, {args.sales} sales and {args.receipts} receipts...")
+    products = await seed_products(args.products)
+    # A few products below their reorder threshold, as in a real shop
+    low = [product["id"] for product in random.sample(products, max(1, args.products // 20))]
+    await server.db.products.update_many({"id": {"$in": low}}, {"$set": {
+        "quantity": 1, "stock_margin": 1 - server.DEFAULT_REORDER_THRESHOLD,
+    }})
+    await seed_sales(args.sales, products, days=args.days)
+    await seed_receipts(args.receipts, products, days=args.days)
+    if not args.mock:  # mongomock has no $merge; the rollups just stay empty
+        await server.rebuild_daily_rollups()
+    await server.ensure_indexes()
+
+
+async def main(args):
+    if args.mock:
+        use_mongomock()
+    await seed(args)
+
+    results = {"sequential_clients": {}, "concurrent_clients": {}, "queries": {}}
+    async with asgi_client() as client:
+        for url in ENDPOINTS:
+            await time_request(client, "GET", url)  # warm up
+            results["sequential_clients"][url] = summarize(
+                [await time_request(client, "GET", url) for _ in range(args.requests)]
+            )
+            latencies = []
+            for _ in range(max(1, args.requests // args.concurrency)):
+                latencies += await asyncio.gather(
+                    *(time_request(client, "GET", url) for _ in range(args.concurrency))
+                )
+            results["concurrent_clients"][url] = summarize(latencies)
+
+    for name, make_queries in (("dashboard", dashboard_queries), ("receipts summary", receipts_summary_queries)):
+        for mode, concurrent in (("one after another", False), ("asyncio.gather", True)):
+            results["queries"][f"{name}: {mode}"] = summarize(
+                [await time_queries(make_queries(), concurrent) for _ in range(args.requests)]
+            )
+
+    print_table("One client", results["sequential_clients"])
+    print_table(f"{args.concurrency} concurrent clients", results["concurrent_clients"])
+    print_table("Endpoint queries run directly", results["queries"])
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump({"args": vars(args), **results}, fh, indent=2)
+    await reset_database()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--sales", type=int, default=500_000)
+    parser.add_argument("--receipts", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=730, help="spread the seeded history over this many days")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and mode")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mock", action="store_true", help="use mongomock-motor instead of MONGO_URL")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,79 @@
+"""Throughput and memory of the streaming export endpoints.
+
+Seeds --rows sales, then runs uvicorn in a subprocess and streams
+/api/export/sales (and expenses, receipts with --all) over HTTP,
+reporting rows/sec and the server's resident memory before the export and
+at its peak. Peak memory should stay flat as --rows grows.
+
+Usage (from backend/, with a local mongod):
+    python benchmarks/bench_export.py --rows 1000000 --format csv
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from common import (
+    process_memory_kb, reset_database, running_server, seed_expenses, seed_products,
+    seed_receipts, seed_sales,
+)
+
+
+async def stream_export(base_url: str, kind: str, fmt: str) -> dict:
+    rows = 0
+    size = 0
+    started = time.perf_counter()
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        async with client.stream("GET", f"/api/export/{kind}", params={"format": fmt}) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                rows += 1
+                size += len(line) + 1
+    elapsed = time.perf_counter() - started
+    if fmt == "csv":
+        rows -= 1  # header
+    return {
+        "rows": rows,
+        "bytes": size,
+        "seconds": round(elapsed, 3),
+        "rows_per_s": round(rows / elapsed, 1) if elapsed else None,
+    }
+
+
+async def main(args):
+    await reset_database()
+    print(f"Seeding {args.rows} rows...")
+    products = await seed_products(200)
+    await seed_sales(args.rows, products)
+    kinds = ["sales"]
+    if args.all:
+        await seed_expenses(args.rows)
+        await seed_receipts(args.rows, products)
+        kinds += ["expenses", "receipts"]
+
+    results = {}
+    async with running_server() as (base_url, process):
+        for kind in kinds:
+            before = process_memory_kb(process.pid)
+            result = await stream_export(base_url, kind, args.format)
+            after = process_memory_kb(process.pid)
+            result["server_rss_before_kb"] = before["rss_kb"]
+            result["server_peak_rss_kb"] = after["peak_rss_kb"]
+            results[kind] = result
+            print(f"{kind}: {json.dumps(result)}")
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump({"rows": args.rows, "format": args.format, "results": results}, fh, indent=2)
+    await reset_database()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="rows seeded per exported collection")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--all", action="store_true", help="also export expenses and receipts")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    asyncio.run(main(parser.parse_args()))
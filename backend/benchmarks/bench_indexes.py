@@ -0,0 +1,67 @@
+"""Latency of the hot endpoints before and after the startup index bootstrap.
+
+Usage (from backend/, with a local mongod):
+    python benchmarks/bench_indexes.py --docs 100000 --requests 200
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from common import (
+    asgi_client, cart, drop_indexes, print_table, reset_database, seed_expenses,
+    seed_products, seed_receipts, seed_sales, server, summarize, time_request,
+)
+
+
+async def run_workload(products: list, requests: int) -> dict:
+    async with asgi_client() as client:
+        calls = {
+            "POST /api/receipts/create": lambda: time_request(
+                client, "POST", "/api/receipts/create", json=cart(products, 5)),
+            "POST /api/sales": lambda: time_request(
+                client, "POST", "/api/sales",
+                json={"product_id": random.choice(products)["id"], "quantity": 1}),
+            "GET /api/sales/summary?period=monthly": lambda: time_request(
+                client, "GET", "/api/sales/summary", params={"period": "monthly"}),
+            "GET /api/receipts/summary/totals": lambda: time_request(
+                client, "GET", "/api/receipts/summary/totals"),
+            "GET /api/dashboard/stats": lambda: time_request(
+                client, "GET", "/api/dashboard/stats"),
+        }
+        results = {}
+        for name, call in calls.items():
+            results[name] = summarize([await call() for _ in range(requests)])
+        return results
+
+
+async def main(args):
+    await reset_database()
+    print(f"Seeding {args.docs} products, sales, expenses and receipts...")
+    products = await seed_products(args.docs)
+    await seed_sales(args.docs, products)
+    await seed_expenses(args.docs)
+    await seed_receipts(args.docs, products)
+    await server.rebuild_daily_rollups()
+
+    await drop_indexes()
+    before = await run_workload(products, args.requests)
+    print_table("Without indexes", before)
+
+    report = await server.ensure_indexes()
+    print(f"\nIndex bootstrap: {json.dumps(report)}")
+    after = await run_workload(products, args.requests)
+    print_table("With indexes", after)
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump({"docs": args.docs, "before": before, "after": after}, fh, indent=2)
+    await reset_database()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100_000, help="documents per collection")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,62 @@
+"""Concurrency stress test for POST /api/sales.
+
+Fires --sales parallel single-product sales at one product with
+--stock units and checks the invariant the atomic decrement guarantees:
+final stock equals initial stock minus the quantity of every stored sale,
+and never goes negative. Exits non-zero if it does not hold.
+
+Usage (from backend/):
+    python benchmarks/bench_sales_concurrency.py --sales 500 --stock 300
+    python benchmarks/bench_sales_concurrency.py --mock   # no mongod needed
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+
+from common import asgi_client, reset_database, seed_products, server, summarize, use_mongomock
+
+
+async def main(args):
+    if args.mock:
+        use_mongomock()
+    await reset_database()
+    await server.ensure_indexes()
+    product = (await seed_products(1, quantity=args.stock))[0]
+
+    async def sell(client):
+        started = time.perf_counter()
+        response = await client.post("/api/sales", json={"product_id": product["id"], "quantity": args.quantity})
+        return response.status_code, time.perf_counter() - started
+
+    async with asgi_client() as client:
+        results = await asyncio.gather(*[sell(client) for _ in range(args.sales)])
+
+    final = await server.db.products.find_one({"id": product["id"]}, {"_id": 0, "quantity": 1})
+    sold = sum(
+        sale["quantity"]
+        for sale in await server.db.sales.find({"product_id": product["id"]}, {"_id": 0, "quantity": 1}).to_list(None)
+    )
+    report = {
+        "sales_attempted": args.sales,
+        "status_counts": dict(Counter(status for status, _ in results)),
+        "initial_stock": args.stock,
+        "sold": sold,
+        "final_stock": final["quantity"],
+        **summarize([latency for _, latency in results]),
+    }
+    print(json.dumps(report, indent=2))
+    await reset_database()
+
+    if final["quantity"] < 0 or abs(final["quantity"] - (args.stock - sold)) > 1e-9:
+        raise SystemExit("Final stock does not equal initial stock minus sold quantity")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sales", type=int, default=500, help="parallel sale requests")
+    parser.add_argument("--stock", type=float, default=300, help="initial stock of the product")
+    parser.add_argument("--quantity", type=float, default=1, help="quantity per sale")
+    parser.add_argument("--mock", action="store_true", help="use mongomock-motor instead of MONGO_URL")
+    asyncio.run(main(parser.parse_args()))
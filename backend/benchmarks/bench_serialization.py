@@ -0,0 +1,171 @@
+"""Time to turn a list of documents into a JSON response body.
+
+For 1k, 10k and 100k sales, products and receipts shaped like the stored
+documents, it times each path a list route has used:
+
+  validate + json     response_model validation, then JSONResponse (stdlib json)
+  validate + orjson   response_model validation, then the orjson default response
+  fast_json           no validation, straight to orjson (the list routes now)
+
+Receipts have no response_model, so their baseline is jsonable_encoder +
+stdlib json. The script also checks that every path produces the same
+bytes. The one expected difference is that jsonable_encoder writes UTC
+as +00:00 where Pydantic and fast_json write Z. No database is needed.
+
+Usage (from backend/):
+    python benchmarks/bench_serialization.py
+    python benchmarks/bench_serialization.py --rows 1000 10000 100000 --repeat 7 --output serialization.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from common import server
+
+
+def moment(i: int) -> datetime:
+    # BSON dates have millisecond precision
+    return datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(milliseconds=i * 7919)
+
+
+def make_sale(i: int) -> dict:
+    quantity = float(random.randint(1, 5))
+    price = round(random.uniform(0.5, 9), 2)
+    return {
+        "id": str(uuid.uuid4()),
+        "receipt_number": f"RCP-20260101-{i:08X}",
+        "product_id": str(uuid.uuid4()),
+        "product_name": f"Product {i % 500}",
+        "quantity": quantity,
+        "cost_price": round(price / 1.4, 2),
+        "selling_price": price,
+        "total_amount": quantity * price,
+        "profit": quantity * (price - round(price / 1.4, 2)),
+        "sale_date": moment(i),
+        "created_at": moment(i),
+    }
+
+
+def make_product(i: int) -> dict:
+    cost = round(random.uniform(0.5, 5), 2)
+    return {
+        "id": str(uuid.uuid4()),
+        "name": f"Product {i}",
+        "category": random.choice(["fruit", "vegetable"]),
+        "cost_price": cost,
+        "selling_price": round(cost * 1.4, 2),
+        "quantity": float(random.randint(0, 500)),
+        "unit": random.choice(["kg", "piece", "box"]),
+        "reorder_threshold": server.DEFAULT_REORDER_THRESHOLD,
+        "created_at": moment(i),
+        "updated_at": moment(i),
+    }
+
+
+def make_receipt(i: int) -> dict:
+    items = []
+    for line in range(1 + i % 5):
+        quantity = float(random.randint(1, 3))
+        price = round(random.uniform(0.5, 9), 2)
+        items.append({
+            "product_id": str(uuid.uuid4()),
+            "product_name": f"Product {line}",
+            "quantity": quantity,
+            "unit": "kg",
+            "selling_price": price,
+            "cost_price": round(price / 1.4, 2),
+            "total": quantity * price,
+            "profit": quantity * (price - round(price / 1.4, 2)),
+        })
+    return {
+        "id": str(uuid.uuid4()),
+        "receipt_number": f"RCP-20260101-{i:08X}",
+        "items": items,
+        "total_amount": round(sum(item["total"] for item in items), 2),
+        "total_profit": round(sum(item["profit"] for item in items), 2),
+        "created_at": moment(i),
+    }
+
+
+# name: (document factory, response model or None)
+PAYLOADS = {
+    "sales": (make_sale, server.Sale),
+    "products": (make_product, server.Product),
+    "receipts": (make_receipt, None),
+}
+
+
+def paths(model) -> dict:
+    """Serialization paths as async functions of the documents, returning the body"""
+    if model is None:
+        async def validate_json(docs):
+            return JSONResponse(jsonable_encoder(docs)).body
+
+        async def validate_orjson(docs):
+            return server.FastJSONResponse(jsonable_encoder(docs)).body
+    else:
+        field = create_response_field(name="response", type_=List[model], mode="serialization")
+
+        async def validate_json(docs):
+            return JSONResponse(await serialize_response(field=field, response_content=docs)).body
+
+        async def validate_orjson(docs):
+            return server.FastJSONResponse(await serialize_response(field=field, response_content=docs)).body
+
+    async def fast(docs):
+        return server.fast_json(docs).body
+
+    return {"validate + json": validate_json, "validate + orjson": validate_orjson, "fast_json": fast}
+
+
+async def main(args):
+    random.seed(args.seed)
+    results = {}
+    print(f"{'payload':<10} {'rows':>7} {'path':<18} {'median ms':>10} {'best ms':>10} {'MB/s':>8} {'speed-up':>9}")
+    for name, (make, model) in PAYLOADS.items():
+        for rows in args.rows:
+            docs = [make(i) for i in range(rows)]
+            bodies = {}
+            baseline = None
+            for path, serialize in paths(model).items():
+                timings = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    bodies[path] = await serialize(docs)
+                    timings.append(time.perf_counter() - started)
+                median = statistics.median(timings)
+                baseline = baseline or median
+                megabytes = len(bodies[path]) / 1e6
+                results[f"{name}/{rows}/{path}"] = {
+                    "median_ms": round(median * 1000, 2),
+                    "best_ms": round(min(timings) * 1000, 2),
+                    "bytes": len(bodies[path]),
+                }
+                print(f"{name:<10} {rows:>7} {path:<18} {median * 1000:>10.2f} {min(timings) * 1000:>10.2f} "
+                      f"{megabytes / median:>8.1f} {baseline / median:>8.2f}x")
+            if len({body.replace(b"+00:00", b"Z") for body in bodies.values()}) != 1:
+                print(f"  !! {name} x {rows}: the paths produced different bodies")
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump({"args": vars(args), "results": results}, fh, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per path; the median is reported")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    asyncio.run(main(parser.parse_args()))
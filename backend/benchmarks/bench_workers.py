@@ -0,0 +1,72 @@
+"""Throughput as the number of server worker processes grows.
+
+Seeds the benchmark database once. Then, for each count in --workers, it
+starts the server in a subprocess and drives the load test's request mix
+from --clients concurrent clients. It reports req/s, latency and the
+speed-up over the first count. The server runs under gunicorn with uvicorn
+workers as in production, or under uvicorn --workers.
+
+The clients run in this one process, so leave it cores of its own. On an
+8-core machine, measure up to about 6 workers. Rate limiting is switched
+off for the run.
+
+Usage (from backend/, with a local mongod):
+    python benchmarks/bench_workers.py --workers 1 2 4 --clients 64 --duration 20
+    python benchmarks/bench_workers.py --server uvicorn --mix dashboard=1,products=1,checkout=1
+"""
+import argparse
+import asyncio
+import json
+import os
+
+import httpx
+
+from common import reset_database, running_server
+from load_test import OPERATIONS, drive, parse_mix, request_context, seed
+
+
+async def main(args):
+    os.environ["RATE_LIMIT_PER_MINUTE"] = "0"
+    mix = parse_mix(args.mix)
+    args.mock = False
+    products = await seed(args)
+    ctx = request_context(products)
+
+    results = {}
+    for workers in args.workers:
+        print(f"\n== {workers} worker(s) ==")
+        async with running_server(["--workers", str(workers)], program=args.server) as (base_url, _):
+            limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+            async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+                results[workers] = (await drive(client, ctx, args, mix))["ALL"]
+
+    baseline = results[args.workers[0]]["req_per_s"]
+    print(f"\n{'workers':>8} {'req/s':>9} {'speed-up':>9} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for workers, r in results.items():
+        speedup = r["req_per_s"] / baseline if baseline else 0
+        print(f"{workers:>8} {r['req_per_s']:>9.1f} {speedup:>8.2f}x {r['errors']:>7} "
+              f"{r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f}")
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump({"args": vars(args), "mix": mix, "results": results}, fh, indent=2)
+    await reset_database()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="worker counts to measure")
+    parser.add_argument("--server", choices=["gunicorn", "uvicorn"], default="gunicorn")
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--sales", type=int, default=50_000)
+    parser.add_argument("--clients", type=int, default=64, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds per worker count")
+    parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds before measuring")
+    parser.add_argument("--mix", help="weights as name=weight,... (default: all operations); "
+                                      f"operations: {', '.join(OPERATIONS)}")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the request mix")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+    args.receipts = args.sales // 5
+    args.expenses = args.sales // 10
+    asyncio.run(main(args))
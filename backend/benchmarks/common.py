@@ -0,0 +1,264 @@
+"""Shared helpers for the backend benchmarks.
+
+Benchmarks drive server.app in-process through httpx's ASGI transport
+against the MongoDB at MONGO_URL. They use a throwaway database
+(BENCH_DB_NAME, default "bench_omrans_fruits") that is dropped before
+seeding, so never point BENCH_DB_NAME at real shop data. Scripts that
+accept --mock run against an in-memory mongomock-motor stand-in instead
+(pip install mongomock-motor); it has no transactions and is only useful
+for correctness checks, not for timings.
+"""
+import asyncio
+import contextlib
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ["DB_NAME"] = os.environ.get("BENCH_DB_NAME", "bench_omrans_fruits")
+
+import httpx  # noqa: E402
+
+import server  # noqa: E402
+
+SEED_BATCH = 5000
+CATEGORIES = ["fruit", "vegetable"]
+UNITS = ["kg", "piece", "box"]
+
+
+def use_mongomock():
+    """Point the server at an in-memory mongomock-motor database"""
+    from mongomock_motor import AsyncMongoMockClient
+
+    server.client = AsyncMongoMockClient()
+    server.db = server.client[os.environ["DB_NAME"]]
+    server._transactions_supported = False
+
+
+def asgi_client() -> httpx.AsyncClient:
+    """HTTP client bound to server.app without a network hop.
+
+    An exception inside the app comes back as a 500 response, as it would
+    from a real server, instead of being raised in the benchmark.
+    """
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=server.app, raise_app_exceptions=False),
+        base_url="http://bench",
+        timeout=None,
+    )
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.asynccontextmanager
+async def running_server(args: list = (), startup_timeout: float = 30, program: str = "uvicorn"):
+    """Run server:app under uvicorn or gunicorn in a subprocess for out-of-process measurements.
+
+    Yields (base_url, process). Extra uvicorn or gunicorn arguments go in args.
+    """
+    port = _free_port()
+    if program == "gunicorn":
+        command = ["gunicorn", "server:app", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}"]
+    else:
+        command = ["uvicorn", "server:app", "--port", str(port)]
+    process = subprocess.Popen(
+        [sys.executable, "-m", *command, "--log-level", "warning", *args],
+        cwd=BACKEND_DIR,
+        env=os.environ.copy(),
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + startup_timeout
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            while True:
+                try:
+                    if (await client.get("/api/ready")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn did not become ready")
+                await asyncio.sleep(0.2)
+        yield base_url, process
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def process_memory_kb(pid: int) -> dict:
+    """Current (VmRSS) and peak (VmHWM) resident memory of a process on Linux"""
+    memory = {}
+    with open(f"/proc/{pid}/status") as fh:
+        for line in fh:
+            if line.startswith(("VmRSS:", "VmHWM:")):
+                key, value = line.split(":", 1)
+                memory[key] = int(value.split()[0])
+    return {"rss_kb": memory.get("VmRSS"), "peak_rss_kb": memory.get("VmHWM")}
+
+
+async def reset_database():
+    await server.client.drop_database(server.db.name)
+
+
+async def drop_indexes():
+    """Drop every index except _id so runs start from the pre-bootstrap state"""
+    for collection in server.INDEXES:
+        await server.db[collection].drop_indexes()
+
+
+async def _insert_batched(collection: str, make_doc, count: int):
+    batch = []
+    for i in range(count):
+        batch.append(make_doc(i))
+        if len(batch) == SEED_BATCH:
+            await server.db[collection].insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await server.db[collection].insert_many(batch, ordered=False)
+
+
+def _random_moment(days: int) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(seconds=random.randint(0, days * 86400))
+
+
+async def seed_products(count: int, quantity: float = 1_000_000) -> list:
+    """Insert count products and return them as dicts"""
+    products = []
+
+    def make(i):
+        cost = round(random.uniform(0.5, 5), 2)
+        now = datetime.now(timezone.utc)
+        doc = {
+            "id": str(uuid.uuid4()),
+            "name": f"Product {i}",
+            "category": random.choice(CATEGORIES),
+            "cost_price": cost,
+            "selling_price": round(cost * 1.4, 2),
+            "quantity": quantity,
+            "unit": random.choice(UNITS),
+            "reorder_threshold": server.DEFAULT_REORDER_THRESHOLD,
+            "stock_margin": quantity - server.DEFAULT_REORDER_THRESHOLD,
+            "created_at": now,
+            "updated_at": now,
+        }
+        products.append(dict(doc))
+        return doc
+
+    await _insert_batched("products", make, count)
+    return products
+
+
+async def seed_sales(count: int, products: list, days: int = 365):
+    def make(i):
+        product = random.choice(products)
+        quantity = random.randint(1, 5)
+        moment = _random_moment(days)
+        return {
+            "id": str(uuid.uuid4()),
+            "receipt_number": f"RCP-BENCH-{i:08d}",
+            "product_id": product["id"],
+            "product_name": product["name"],
+            "quantity": quantity,
+            "cost_price": product["cost_price"],
+            "selling_price": product["selling_price"],
+            "total_amount": quantity * product["selling_price"],
+            "profit": quantity * (product["selling_price"] - product["cost_price"]),
+            "sale_date": moment,
+            "created_at": moment,
+        }
+
+    await _insert_batched("sales", make, count)
+
+
+async def seed_expenses(count: int, days: int = 365):
+    def make(i):
+        moment = _random_moment(days)
+        return {
+            "id": str(uuid.uuid4()),
+            "description": f"Expense {i}",
+            "amount": round(random.uniform(5, 500), 2),
+            "expense_date": moment,
+            "created_at": moment,
+        }
+
+    await _insert_batched("expenses", make, count)
+
+
+def cart(products: list, lines: int) -> dict:
+    """Request body for POST /api/receipts/create with random lines"""
+    items = []
+    for product in random.sample(products, min(lines, len(products))):
+        items.append({
+            "product_id": product["id"],
+            "product_name": product["name"],
+            "quantity": random.randint(1, 3),
+            "unit": product["unit"],
+            "selling_price": product["selling_price"],
+            "cost_price": product["cost_price"],
+        })
+    return {"items": items}
+
+
+async def seed_receipts(count: int, products: list, days: int = 365, lines: int = 5):
+    def make(i):
+        items = []
+        for line in cart(products, lines)["items"]:
+            line["total"] = line["quantity"] * line["selling_price"]
+            line["profit"] = line["quantity"] * (line["selling_price"] - line["cost_price"])
+            items.append(line)
+        return {
+            "id": str(uuid.uuid4()),
+            "receipt_number": f"RCP-BENCH-{i:08d}",
+            "items": items,
+            "total_amount": round(sum(line["total"] for line in items), 2),
+            "total_profit": round(sum(line["profit"] for line in items), 2),
+            "created_at": _random_moment(days),
+        }
+
+    await _insert_batched("receipts", make, count)
+
+
+def summarize(latencies: list) -> dict:
+    """Latency percentiles in milliseconds"""
+    ordered = sorted(latencies)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(pct(50), 3),
+        "p95_ms": round(pct(95), 3),
+        "p99_ms": round(pct(99), 3),
+    }
+
+
+async def time_request(client: httpx.AsyncClient, method: str, url: str, **kwargs) -> float:
+    started = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    elapsed = time.perf_counter() - started
+    if response.status_code >= 400:
+        raise RuntimeError(f"{method} {url} -> {response.status_code}: {response.text[:200]}")
+    return elapsed
+
+
+def print_table(title: str, rows: dict):
+    print(f"\n{title}")
+    print(f"{'endpoint':<40} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for name, stats in rows.items():
+        print(f"{name:<40} {stats['p50_ms']:>10.2f} {stats['p95_ms']:>10.2f} {stats['p99_ms']:>10.2f}")
@@ -0,0 +1,268 @@
+"""Mixed-workload load test for the backend.
+
+Seeds the benchmark database, then runs --clients concurrent clients for
+--duration seconds. Each client picks its next request from a weighted mix
+of checkouts, sales, dashboard reads, lists, reports and exports. The
+script reports request counts, req/s and p50/p95/p99 latency per operation,
+and can save them as JSON. Saved runs from two commits can be compared with
+--compare.
+
+The server runs in-process over httpx's ASGI transport by default. Use
+--server uvicorn to run it in a subprocess, where --workers applies.
+--mock uses mongomock-motor, which only works in-process; it checks that
+the harness runs and its timings mean nothing.
+
+Usage (from backend/, with a local mongod):
+    python benchmarks/load_test.py --sales 100000 --clients 32 --duration 60 --output main.json
+    python benchmarks/load_test.py --server uvicorn --workers 4 --sales 1000000 --output branch.json
+    python benchmarks/load_test.py --mix checkout=1,dashboard=1 --duration 30
+    python benchmarks/load_test.py --compare main.json branch.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from common import (
+    BACKEND_DIR, asgi_client, cart, reset_database, running_server, seed_expenses, seed_products,
+    seed_receipts, seed_sales, server, summarize, use_mongomock,
+)
+
+# name: (default weight, request builder); builders return (method, url, httpx kwargs)
+OPERATIONS = {
+    "checkout": (25, lambda ctx, rng: ("POST", "/api/receipts/create", {
+        "json": cart(ctx["products"], rng.randint(1, 8))})),
+    "sale": (10, lambda ctx, rng: ("POST", "/api/sales", {
+        "json": {"product_id": rng.choice(ctx["products"])["id"], "quantity": 1}})),
+    "dashboard": (20, lambda ctx, rng: ("GET", "/api/dashboard/stats", {})),
+    "receipts_summary": (10, lambda ctx, rng: ("GET", "/api/receipts/summary/totals", {})),
+    "sales_list": (10, lambda ctx, rng: ("GET", "/api/sales", {"params": {"limit": 50}})),
+    "receipts_list": (5, lambda ctx, rng: ("GET", "/api/receipts", {"params": {"limit": 20}})),
+    "products": (10, lambda ctx, rng: ("GET", "/api/products", {})),
+    "low_stock": (3, lambda ctx, rng: ("GET", "/api/products/low-stock", {})),
+    "sales_report": (5, lambda ctx, rng: ("GET", "/api/sales/summary", {
+        "params": {"period": rng.choice(["daily", "weekly", "monthly"])}})),
+    "timeseries": (3, lambda ctx, rng: ("GET", "/api/reports/timeseries", {
+        "params": {"from": ctx["quarter_ago"], "bucket": rng.choice(["day", "week"])}})),
+    "top_products": (3, lambda ctx, rng: ("GET", "/api/analytics/products", {
+        "params": {"sort": rng.choice(["revenue", "profit", "units", "margin"])}})),
+    "export_week": (2, lambda ctx, rng: ("GET", "/api/export/sales", {
+        "params": {"format": "ndjson", "start_date": ctx["week_ago"]}})),
+}
+# Operations whose pipelines mongomock cannot run; left out of --mock runs
+MOCK_UNSUPPORTED = {"timeseries": "$dateTrunc", "top_products": "$unionWith"}
+
+
+def parse_mix(text: str) -> dict:
+    if not text:
+        return {name: weight for name, (weight, _) in OPERATIONS.items()}
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise SystemExit(f"Unknown operation '{name}'; choose from {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def seed(args) -> list:
+    await reset_database()
+    print(f"Seeding {args.products} products, {args.sales} sales, "
+          f"{args.receipts} receipts and {args.expenses} expenses...")
+    products = await seed_products(args.products)
+    await seed_sales(args.sales, products)
+    await seed_receipts(args.receipts, products)
+    await seed_expenses(args.expenses)
+    await server.ensure_indexes()
+    if not args.mock:  # mongomock has no $merge
+        await server.rebuild_daily_rollups()
+    return products
+
+
+def request_context(products: list) -> dict:
+    """What the request builders in OPERATIONS draw on"""
+    now = datetime.now(timezone.utc)
+    return {
+        "products": products,
+        "week_ago": (now - timedelta(days=7)).isoformat(),
+        "quarter_ago": (now - timedelta(days=90)).isoformat(),
+    }
+
+
+async def run_client(client, ctx: dict, mix: dict, rng: random.Random, deadline: float, record):
+    names = list(mix)
+    weights = list(mix.values())
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        method, url, kwargs = OPERATIONS[name][1](ctx, rng)
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        record(name, time.perf_counter() - started, status)
+
+
+async def drive(client, ctx: dict, args, mix: dict) -> dict:
+    """Run the warm-up, then the measured phase; return per-operation results"""
+    latencies = defaultdict(list)
+    statuses = defaultdict(Counter)
+
+    def discard(name, elapsed, status):
+        pass
+
+    def record(name, elapsed, status):
+        latencies[name].append(elapsed)
+        statuses[name][str(status)] += 1
+
+    for phase, seconds, sink in (("warm-up", args.warmup, discard), ("measured", args.duration, record)):
+        if seconds <= 0:
+            continue
+        print(f"{phase}: {args.clients} clients for {seconds}s")
+        deadline = time.monotonic() + seconds
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            run_client(client, ctx, mix, random.Random(args.seed + i), deadline, sink)
+            for i in range(args.clients)
+        ))
+        elapsed = time.perf_counter() - started
+
+    results = {}
+    for name in mix:
+        if not latencies[name]:
+            continue
+        codes = statuses[name]
+        errors = sum(count for code, count in codes.items() if not code.startswith(("2", "3")))
+        results[name] = {
+            **summarize(latencies[name]),
+            "req_per_s": round(len(latencies[name]) / elapsed, 1),
+            "errors": errors,
+            "statuses": dict(codes),
+        }
+    total = sum(len(values) for values in latencies.values())
+    results["ALL"] = {
+        **summarize([value for values in latencies.values() for value in values]),
+        "req_per_s": round(total / elapsed, 1),
+        "errors": sum(result["errors"] for result in results.values()),
+    }
+    return results
+
+
+def print_results(results: dict):
+    print(f"\n{'operation':<18} {'count':>8} {'req/s':>9} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, r in results.items():
+        print(f"{name:<18} {r['count']:>8} {r['req_per_s']:>9.1f} {r['errors']:>7} "
+              f"{r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f}")
+
+
+def compare(before_path: str, after_path: str):
+    with open(before_path) as fh:
+        before = json.load(fh)
+    with open(after_path) as fh:
+        after = json.load(fh)
+    print(f"{before_path} ({before['meta']['commit']}) -> {after_path} ({after['meta']['commit']})")
+    print(f"\n{'operation':<18} {'req/s':>20} {'p50 ms':>20} {'p99 ms':>20}")
+
+    def cell(old, new):
+        change = f"{(new - old) / old * 100:+.0f}%" if old else "n/a"
+        return f"{old:.1f}->{new:.1f} {change}"
+
+    for name, new in after["results"].items():
+        old = before["results"].get(name)
+        if old is None:
+            continue
+        print(f"{name:<18} {cell(old['req_per_s'], new['req_per_s']):>20} "
+              f"{cell(old['p50_ms'], new['p50_ms']):>20} {cell(old['p99_ms'], new['p99_ms']):>20}")
+
+
+async def main(args):
+    if args.mock:
+        if args.server != "asgi":
+            raise SystemExit("--mock only works with --server asgi")
+        use_mongomock()
+    mix = parse_mix(args.mix)
+    if args.mock:
+        for name, stage in MOCK_UNSUPPORTED.items():
+            if mix.pop(name, None) is not None:
+                print(f"Skipping {name}: mongomock has no {stage}")
+
+    if args.reuse:
+        products = await server.db.products.find({}, {"_id": 0}).to_list(None)
+        if not products:
+            raise SystemExit("--reuse given but the benchmark database has no products")
+    else:
+        products = await seed(args)
+    ctx = request_context(products)
+
+    if args.server == "asgi":
+        async with asgi_client() as client:
+            results = await drive(client, ctx, args, mix)
+    else:
+        async with running_server(["--workers", str(args.workers)]) as (base_url, _):
+            limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+            async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+                results = await drive(client, ctx, args, mix)
+
+    print_results(results)
+    if args.output:
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "started_at": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "args": vars(args),
+                "mix": mix,
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"\nSaved to {args.output}")
+    if not args.keep:
+        await reset_database()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--sales", type=int, default=10_000, help="seeded sales, e.g. 1000 to 1000000")
+    parser.add_argument("--receipts", type=int, help="seeded receipts (default: sales / 5)")
+    parser.add_argument("--expenses", type=int, help="seeded expenses (default: sales / 10)")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds before measuring")
+    parser.add_argument("--mix", help="weights as name=weight,... (default: all operations); "
+                                      f"operations: {', '.join(OPERATIONS)}")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the request mix")
+    parser.add_argument("--server", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--mock", action="store_true", help="use mongomock-motor instead of MONGO_URL")
+    parser.add_argument("--reuse", action="store_true", help="skip seeding and use the existing benchmark data")
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark data for a later --reuse")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two saved runs and exit")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+    else:
+        args.receipts = args.sales // 5 if args.receipts is None else args.receipts
+        args.expenses = args.sales // 10 if args.expenses is None else args.expenses
+        asyncio.run(main(args))
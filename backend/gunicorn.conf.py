@@ -0,0 +1,21 @@
+"""Gunicorn settings for the production server.
+
+    gunicorn server:app -c gunicorn.conf.py
+
+Each worker is a separate process running uvicorn's event loop, so the API
+uses WEB_CONCURRENCY cores. State the workers must agree on (collection
+versions, cache invalidation, dashboard events, rate limits) is shared
+through SHARED_STATE_DIR; see "Worker Shared State" in server.py.
+"""
+import multiprocessing
+import os
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', '8001')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+# Dashboards keep their event streams open; give them time to finish on restart
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.environ.get("KEEPALIVE", "5"))
+# Replace workers now and then so slow leaks cannot build up
+max_requests = int(os.environ.get("MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
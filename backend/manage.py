@@ -0,0 +1,76 @@
+"""Maintenance commands for the backend.
+
+Usage:
+    python manage.py rebuild-rollups
+    python manage.py migrate-dates
+    python manage.py archive --before 2026-01-01 [--period month] [--target file]
+"""
+import argparse
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import server
+
+
+@asynccontextmanager
+async def worker_bus():
+    """Join the workers' message bus so open dashboards resync after a command.
+
+    The commands also bump the shared collection versions, which is what moves
+    the running workers' ETags and caches on.
+    """
+    await server.worker_bus.start(f"manage-{os.getpid()}")
+    try:
+        yield
+    finally:
+        server.worker_bus.stop()
+
+
+async def rebuild_rollups(args):
+    async with worker_bus():
+        days = await server.rebuild_daily_rollups()
+    print(f"Rebuilt daily rollups for {days} day(s)")
+
+
+async def migrate_dates(args):
+    async with worker_bus():
+        converted = await server.migrate_string_dates()
+    for collection, count in converted.items():
+        print(f"{collection}: converted {count} document(s)")
+
+
+async def archive(args):
+    if not args.before:
+        raise SystemExit("archive needs --before YYYY-MM-DD")
+    async with worker_bus():
+        result = await server.archive_before_cutoff(datetime.fromisoformat(args.before), args.period, args.target)
+    for kind, archives in result['archives'].items():
+        for location, count in archives.items():
+            print(f"{kind}: moved {count} document(s) to {location}")
+
+
+COMMANDS = {
+    "rebuild-rollups": rebuild_rollups,
+    "migrate-dates": migrate_dates,
+    "archive": archive,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    parser.add_argument("--before", help="archive: cutoff date; earlier sales, receipts and expenses are moved")
+    parser.add_argument("--period", choices=["year", "month"], default="year", help="archive: one archive per year or month")
+    parser.add_argument("--target", choices=["collection", "file"], default="collection",
+                        help="archive: archive collections, or gzip NDJSON files in ARCHIVE_DIR")
+    args = parser.parse_args()
+    try:
+        asyncio.run(COMMANDS[args.command](args))
+    finally:
+        server.client.close()
+
+
+if __name__ == "__main__":
+    main()
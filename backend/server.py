@@ -1,32 +1,201 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Header, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
+from starlette.datastructures import MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel, InsertOne, ReplaceOne, ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import DuplicateKeyError
 import os
+import io
+import csv
+import gzip
+import mmap
+import orjson
+import socket
+import tempfile
+import zlib
+import json
+import asyncio
+import base64
+import bisect
+import hashlib
+import threading
+import time
 import logging
+from contextvars import ContextVar
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, ValidationError, field_validator
+from typing import List, Literal, Optional
 import uuid
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime, timezone, timedelta
 
+try:
+    import brotli
+except ImportError:  # Brotli is optional; responses then fall back to gzip
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:  # Not POSIX (e.g. Windows); worker shared state then stays in-process
+    fcntl = None
+
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Query Instrumentation
+# A PyMongo command listener times every MongoDB command. Motor runs commands
+# on executor threads inside a copy of the caller's context, so the listener
+# can append to the list the request middleware put in _request_queries.
+_request_queries: ContextVar[Optional[list]] = ContextVar("request_queries", default=None)
+
+class QueryListener(monitoring.CommandListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._collections = {}  # (connection, request id) -> collection, while in flight
+        self.totals = {}  # (command, collection) -> [count, seconds, failures]
+    
+    def started(self, event):
+        name = event.command_name
+        collection = event.command.get("collection" if name == "getMore" else name)
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = (
+                collection if isinstance(collection, str) else ""
+            )
+    
+    def _finished(self, event, failed: bool):
+        seconds = event.duration_micros / 1e6
+        with self._lock:
+            collection = self._collections.pop((event.connection_id, event.request_id), "")
+            totals = self.totals.setdefault((event.command_name, collection), [0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += failed
+        queries = _request_queries.get()
+        if queries is not None:
+            queries.append((event.command_name, collection, seconds))
+    
+    def succeeded(self, event):
+        self._finished(event, failed=False)
+    
+    def failed(self, event):
+        self._finished(event, failed=True)
+
+query_listener = QueryListener()
+
+# JSON Responses
+# orjson encodes every response. List and report routes go further: their
+# documents were written through this module's models, so instead of having
+# response_model validate them again they return fast_json(docs), which skips
+# validation and jsonable_encoder. response_model stays on those routes for
+# the OpenAPI schema. OPT_UTC_Z writes UTC datetimes with a Z suffix, as
+# Pydantic does, so model-backed lists are byte-for-byte unchanged.
+class FastJSONResponse(ORJSONResponse):
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+
+def fast_json(content, response: Optional[Response] = None) -> FastJSONResponse:
+    """Send content as it is, with the headers the route set on response"""
+    fast = FastJSONResponse(content)
+    if response is not None:
+        fast.raw_headers.extend(response.raw_headers)
+    return fast
+
 # MongoDB connection
+# Creating the client opens no connections; the lifespan below pings and
+# fills the pool before the first request, and closes it on shutdown.
+MONGO_POOL_OPTIONS = {
+    "maxPoolSize": int(os.environ.get('MONGO_MAX_POOL_SIZE', '100')),
+    "minPoolSize": int(os.environ.get('MONGO_MIN_POOL_SIZE', '10')),
+    "maxIdleTimeMS": int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '300000')),
+    "connectTimeoutMS": int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000')),
+    "serverSelectionTimeoutMS": int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+    "waitQueueTimeoutMS": int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '10000')),
+}
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, event_listeners=[query_listener], **MONGO_POOL_OPTIONS)
 db = client[os.environ['DB_NAME']]
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
+
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
 
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', str(24 * 3600)))
+
+# Indexes every query path relies on; created idempotently at startup
+INDEXES = {
+    "products": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+        # Low-stock counts and lists; {"stock_margin": {"$lt": 0}} counts from the index alone
+        IndexModel([("stock_margin", ASCENDING), ("id", ASCENDING)], name="stock_margin_id"),
+    ],
+    "sales": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("sale_date", DESCENDING), ("id", DESCENDING)], name="sale_date_id_desc"),
+        IndexModel([("product_id", ASCENDING), ("sale_date", DESCENDING), ("id", DESCENDING)], name="product_id_sale_date_id_desc"),
+    ],
+    "expenses": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("expense_date", DESCENDING), ("id", DESCENDING)], name="expense_date_id_desc"),
+    ],
+    "receipts": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id_desc"),
+        # Multikey: receipts containing given products, by date (category analytics)
+        IndexModel([("items.product_id", ASCENDING), ("created_at", DESCENDING)], name="items_product_id_created_at_desc"),
+    ],
+    "idempotency_keys": [
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=IDEMPOTENCY_TTL_SECONDS, name="created_at_ttl"),
+    ],
+}
+
+async def ensure_indexes() -> dict:
+    """Create any missing indexes from INDEXES and report what was done.
+
+    Returns {collection: {"created": [...], "present": [...]}} by index name.
+    """
+    report = {}
+    for collection, models in INDEXES.items():
+        existing = await db[collection].index_information()
+        missing = [model for model in models if model.document["name"] not in existing]
+        if missing:
+            await db[collection].create_indexes(missing)
+        report[collection] = {
+            "created": [model.document["name"] for model in missing],
+            "present": [model.document["name"] for model in models if model not in missing],
+        }
+    return report
+
+async def missing_indexes() -> dict:
+    """{collection: [index names]} for indexes in INDEXES that do not exist yet"""
+    collections = list(INDEXES)
+    existing = await asyncio.gather(*(db[collection].index_information() for collection in collections))
+    missing = {}
+    for collection, present in zip(collections, existing):
+        names = [model.document["name"] for model in INDEXES[collection] if model.document["name"] not in present]
+        if names:
+            missing[collection] = names
+    return missing
+
+
 # Define Models
+DEFAULT_REORDER_THRESHOLD = 5.0
+
 class Product(BaseModel):
     model_config = ConfigDict(extra="ignore")
     
@@ -37,6 +206,7 @@ class Product(BaseModel):
     selling_price: float
     quantity: float
     unit: str  # kg, piece, box, etc.
+    reorder_threshold: float = DEFAULT_REORDER_THRESHOLD  # low stock below this quantity
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -47,6 +217,7 @@ class ProductCreate(BaseModel):
     selling_price: float
     quantity: float
     unit: str
+    reorder_threshold: float = DEFAULT_REORDER_THRESHOLD
 
 class ProductUpdate(BaseModel):
     name: Optional[str] = None
@@ -55,6 +226,15 @@ class ProductUpdate(BaseModel):
     selling_price: Optional[float] = None
     quantity: Optional[float] = None
     unit: Optional[str] = None
+    reorder_threshold: Optional[float] = None
+
+    # Optional means "may be left out": a stored product has every field, so null is refused
+    @field_validator("name", "category", "cost_price", "selling_price", "quantity", "unit", "reorder_threshold")
+    @classmethod
+    def not_null(cls, value):
+        if value is None:
+            raise ValueError("cannot be null")
+        return value
 
 class Sale(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -71,6 +251,10 @@ class Sale(BaseModel):
     sale_date: datetime
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class ProductBulkUpdate(ProductUpdate):
+    id: str
+    quantity_delta: Optional[float] = None  # stock received, added to the stored quantity
+
 class SaleCreate(BaseModel):
     product_id: str
     quantity: float
@@ -90,136 +274,1490 @@ class ExpenseCreate(BaseModel):
     amount: float
     expense_date: Optional[datetime] = None
 
+class ReceiptItemCreate(BaseModel):
+    # POST /api/receipts/create charges the prices the till sends and takes any
+    # left out from the catalog; /receipts/sync prices every line from the catalog
+    model_config = ConfigDict(extra="ignore")
+    
+    product_id: str = Field(min_length=1)
+    quantity: float = Field(gt=0)
+    product_name: Optional[str] = None
+    unit: Optional[str] = None
+    selling_price: Optional[float] = Field(None, ge=0)
+    cost_price: Optional[float] = Field(None, ge=0)
+
+class ReceiptCreate(BaseModel):
+    items: List[ReceiptItemCreate]
+
+class QueuedReceipt(BaseModel):
+    client_id: str = Field(min_length=1, max_length=100)  # doubles as the idempotency key
+    # Checked as a ReceiptCreate per receipt, so one malformed receipt is
+    # rejected on its own instead of failing the whole batch
+    items: List[dict]
+    created_at: Optional[datetime] = None  # when the till rang it up
+
+class ReceiptSync(BaseModel):
+    receipts: List[QueuedReceipt]
+
+
+# Stored fields that make up each model's API representation
+def model_projection(model) -> dict:
+    return {"_id": 0, **{field: 1 for field in model.model_fields}}
+
+PRODUCT_PROJECTION = model_projection(Product)
+SALE_PROJECTION = model_projection(Sale)
+EXPENSE_PROJECTION = model_projection(Expense)
+
+
+# Date Migration
+# Date fields used to be stored as ISO strings; they are now native BSON dates
+DATE_FIELDS = {
+    "products": ["created_at", "updated_at"],
+    "sales": ["sale_date", "created_at"],
+    "expenses": ["expense_date", "created_at"],
+    "receipts": ["created_at"],
+}
+DATE_MIGRATION_BATCH = 1000
+
+def _string_dates_filter(fields: list) -> dict:
+    return {"$or": [{field: {"$type": "string"}} for field in fields]}
+
+async def count_string_dates() -> dict:
+    """{collection: documents still holding an ISO string date}"""
+    return {
+        collection: await db[collection].count_documents(_string_dates_filter(fields))
+        for collection, fields in DATE_FIELDS.items()
+    }
+
+async def migrate_string_dates(batch_size: int = DATE_MIGRATION_BATCH) -> dict:
+    """Convert ISO string date fields to BSON dates, batch by batch.
+
+    Safe to run while the API is serving: each update is guarded on the old
+    string value, so a document rewritten in the meantime is left alone, and
+    the run can be interrupted and repeated. Strings without an offset are
+    read as UTC. Returns {collection: documents converted}.
+    """
+    converted = {}
+    for collection, fields in DATE_FIELDS.items():
+        converted[collection] = 0
+        pending = _string_dates_filter(fields)
+        skipped = []
+        while True:
+            batch = await db[collection].find(
+                {"$and": [pending, {"_id": {"$nin": skipped}}]},
+                {"_id": 1, **{field: 1 for field in fields}}
+            ).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+            
+            updates = []
+            for doc in batch:
+                old_values, new_values = {}, {}
+                for field in fields:
+                    if isinstance(doc.get(field), str):
+                        try:
+                            value = datetime.fromisoformat(doc[field])
+                        except ValueError:
+                            continue
+                        old_values[field] = doc[field]
+                        new_values[field] = value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+                if new_values:
+                    updates.append(UpdateOne({"_id": doc["_id"], **old_values}, {"$set": new_values}))
+                else:
+                    logger.warning(f"Unparseable date in {collection} document {doc['_id']}; left as is")
+                    skipped.append(doc["_id"])
+            
+            if updates:
+                result = await db[collection].bulk_write(updates, ordered=False)
+                converted[collection] += result.modified_count
+    
+    # Shared versions, so every worker's caches and ETags move on, even when
+    # the run comes from manage.py in a process of its own
+    changed = [collection for collection, count in converted.items() if count]
+    if "products" in changed:
+        product_cache.invalidate()
+    if "sales" in changed:
+        changed.append("sales_history")
+    if changed:
+        bump_versions(*changed)
+        publish_resync()
+    return converted
+
+
+# Transactions
+_transactions_supported: Optional[bool] = None
+
+async def transactions_supported() -> bool:
+    """True when connected to a replica set or mongos, which support transactions"""
+    global _transactions_supported
+    if _transactions_supported is None:
+        hello = await client.admin.command("hello")
+        _transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+        if not _transactions_supported:
+            logger.warning("MongoDB is standalone; multi-document writes fall back to compensation")
+    return _transactions_supported
+
+async def run_in_transaction(callback):
+    """Await callback(session) inside a transaction, retrying transient errors.
+
+    On a standalone server callback(None) runs without a transaction and is
+    responsible for undoing its own partial writes.
+    """
+    if not await transactions_supported():
+        return await callback(None)
+    async with await client.start_session() as session:
+        return await session.with_transaction(callback)
+
+
+# Stock
+# Products store stock_margin = quantity - reorder_threshold next to the two
+# fields, so "low stock" is the indexed range stock_margin < 0. Every write
+# that changes either field must keep it in step.
+LOW_STOCK = {"stock_margin": {"$lt": 0}}
+
+class StockConflict(Exception):
+    """A guarded stock decrement found less stock than requested"""
+
+def product_document(product: Product) -> dict:
+    doc = product.model_dump()
+    doc['stock_margin'] = product.quantity - product.reorder_threshold
+    return doc
+
+def product_update_pipeline(fields: dict, quantity_delta: Optional[float] = None) -> list:
+    """Update pipeline that sets fields, adds quantity_delta and recomputes stock_margin"""
+    # $literal so string values starting with "$" are not read as field paths
+    stage = {field: {"$literal": value} for field, value in fields.items()}
+    if quantity_delta:
+        stage['quantity'] = {"$add": ["$quantity", quantity_delta]}
+    return [
+        {"$set": stage},
+        {"$set": {"stock_margin": {"$subtract": ["$quantity", "$reorder_threshold"]}}}
+    ]
+
+async def backfill_stock_margins() -> int:
+    """Give products saved before reorder thresholds existed the default one"""
+    result = await db.products.update_many({"stock_margin": {"$exists": False}}, [
+        {"$set": {"reorder_threshold": {"$ifNull": ["$reorder_threshold", DEFAULT_REORDER_THRESHOLD]}}},
+        {"$set": {"stock_margin": {"$subtract": ["$quantity", "$reorder_threshold"]}}}
+    ])
+    return result.modified_count
+
+async def deduct_stock(quantities: dict, session=None):
+    """Decrement stock by {product_id: quantity}, never below zero.
+
+    Every decrement is a conditional $inc guarded by quantity >= requested.
+    In a transaction the guards are sent as one bulk_write and any shortfall
+    raises StockConflict so the caller's transaction aborts. Without a session
+    they are applied one by one and rolled back on a shortfall.
+    """
+    guards = [
+        ({"id": product_id, "quantity": {"$gte": quantity}}, {"$inc": {"quantity": -quantity, "stock_margin": -quantity}})
+        for product_id, quantity in quantities.items()
+    ]
+    if session is not None:
+        result = await db.products.bulk_write(
+            [UpdateOne(query, update) for query, update in guards],
+            ordered=True,
+            session=session
+        )
+        if result.matched_count < len(guards):
+            raise StockConflict()
+        return
+    
+    applied = {}
+    try:
+        for (query, update), (product_id, quantity) in zip(guards, quantities.items()):
+            result = await db.products.update_one(query, update)
+            if result.matched_count == 0:
+                raise StockConflict()
+            applied[product_id] = quantity
+    except BaseException:
+        await restore_stock(applied)
+        raise
+
+async def restore_stock(quantities: dict):
+    """Give back stock taken by deduct_stock outside a transaction"""
+    if quantities:
+        await db.products.bulk_write([
+            UpdateOne({"id": product_id}, {"$inc": {"quantity": quantity, "stock_margin": quantity}})
+            for product_id, quantity in quantities.items()
+        ], ordered=False)
+
+
+# Worker Shared State
+# Under WEB_CONCURRENCY > 1 several worker processes serve the API, and what
+# one of them writes must reach the others. Counters that every worker must
+# read identically (collection versions, the catalog generation, rate limit
+# windows) live in a memory-mapped file updated under flock; caches check
+# them, so they never depend on a message arriving. Dashboard events go to
+# the other workers as best-effort messages on Unix datagram sockets bound
+# in the same directory.
+SHARED_STATE_DIR = Path(os.environ.get('SHARED_STATE_DIR') or os.path.join(
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+    "omrans-" + hashlib.sha1(f"{mongo_url}/{os.environ['DB_NAME']}".encode()).hexdigest()[:12]
+))
+# Slot 0 is the epoch; the named counters follow; the rest are rate limit windows
+COUNTER_SLOTS = {
+    "products": 1, "sales": 2, "expenses": 3, "receipts": 4, "product_catalog": 5,
+    "sales_history": 6, "categories": 7,
+}
+RATE_LIMIT_FIRST_SLOT = 64
+SHARED_COUNTER_SLOTS = 8192
+
+class SharedCounters:
+    """64-bit counters in a file mapped into every worker on the host.
+
+    Reads are plain memory loads; updates take an exclusive flock on the
+    file. Slot 0 holds a random epoch picked when the file is created, so
+    counters that restart from zero (after a reboot empties /dev/shm) are
+    never mistaken for earlier values. The file is reopened after a fork,
+    since a forked worker would otherwise share its parent's lock. Without
+    fcntl the counters live in process memory, which serves a single worker.
+    """
+    
+    def __init__(self, path: Path, slots: int):
+        self.path = path
+        self.slots = slots
+        self._pid = None
+    
+    def _open(self):
+        if self._pid == os.getpid():
+            return
+        if fcntl is None:
+            # Single worker: plain process memory is shared by everything that reads it
+            self._values = memoryview(bytearray(self.slots * 8)).cast("q")
+            self._values[0] = int.from_bytes(os.urandom(7), "big") | 1
+            self._pid = os.getpid()
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = self.slots * 8
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            values = memoryview(mmap.mmap(fd, size)).cast("q")
+            if values[0] == 0:
+                values[0] = int.from_bytes(os.urandom(7), "big") | 1
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._fd, self._values, self._pid = fd, values, os.getpid()
+    
+    @contextmanager
+    def _locked(self):
+        self._open()
+        if fcntl is None:
+            yield self._values
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield self._values
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+    
+    def get(self, slot: int) -> int:
+        self._open()
+        return self._values[slot]
+    
+    def add(self, slot: int, amount: int = 1) -> int:
+        with self._locked() as values:
+            values[slot] += amount
+            return values[slot]
+    
+    def count_in_window(self, slot: int, window: int) -> int:
+        """Count one hit in the window numbered window, using slots slot and slot + 1"""
+        with self._locked() as values:
+            if values[slot] != window:
+                values[slot] = window
+                values[slot + 1] = 0
+            values[slot + 1] += 1
+            return values[slot + 1]
+
+shared_counters = SharedCounters(SHARED_STATE_DIR / "counters", SHARED_COUNTER_SLOTS)
+
+class WorkerBus:
+    """Broadcast small JSON messages to every other worker on the host.
+
+    Each worker binds a datagram socket named after its pid in the shared
+    directory and dispatches what it receives to handlers[message["op"]].
+    broadcast() sends to every other socket there; sockets left behind by
+    workers that died refuse the send and are removed.
+    """
+    
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.handlers = {}
+        self._sock = None
+        self._path = None
+    
+    async def start(self, name: Optional[str] = None):
+        if fcntl is None:
+            return  # Single worker; there is no one to talk to
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._path = self.directory / f"{name or os.getpid()}.sock"
+        self._path.unlink(missing_ok=True)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(str(self._path))
+        self._sock.setblocking(False)
+        asyncio.get_running_loop().add_reader(self._sock.fileno(), self._receive)
+    
+    def stop(self):
+        if self._sock is None:
+            return
+        asyncio.get_running_loop().remove_reader(self._sock.fileno())
+        self._sock.close()
+        self._sock = None
+        self._path.unlink(missing_ok=True)
+    
+    def _receive(self):
+        while True:
+            try:
+                message = json.loads(self._sock.recv(65536))
+            except BlockingIOError:
+                return
+            except ValueError:
+                continue
+            handler = self.handlers.get(message.get("op"))
+            if handler is None:
+                continue
+            try:
+                result = handler(message)
+                if asyncio.iscoroutine(result):
+                    asyncio.ensure_future(result)
+            except Exception as e:
+                logger.error(f"Worker message {message.get('op')} failed: {e}")
+    
+    def broadcast(self, op: str, **fields):
+        if self._sock is None:
+            return  # Not serving, e.g. a benchmark calling routes directly
+        data = json.dumps({"op": op, **jsonable_encoder(fields)}).encode()
+        for path in self.directory.glob("*.sock"):
+            if path == self._path:
+                continue
+            try:
+                self._sock.sendto(data, str(path))
+            except (ConnectionRefusedError, FileNotFoundError):
+                path.unlink(missing_ok=True)
+            except BlockingIOError:
+                logger.warning(f"Worker {path.stem} is not reading its messages; dropped {op}")
+
+worker_bus = WorkerBus(SHARED_STATE_DIR)
+
+_local_locks = set()  # worker_lock without fcntl
+
+@contextmanager
+def worker_lock(name: str):
+    """Try to take an exclusive lock shared by all workers; yields whether it was taken"""
+    if fcntl is None:
+        acquired = name not in _local_locks
+        _local_locks.add(name)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                _local_locks.discard(name)
+        return
+    SHARED_STATE_DIR.mkdir(parents=True, exist_ok=True)
+    fd = os.open(SHARED_STATE_DIR / f"{name}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+        else:
+            yield True
+    finally:
+        os.close(fd)  # Releases the lock
+
+
+ROLLUP_LOCK_POLL_SECONDS = 0.02
+
+class RollupLock:
+    """Readers-writer lock between daily_rollups writers and the rollup rebuild.
+
+    A write holds it shared from inserting or deleting its raw document until
+    its rollup $inc is applied; rebuild_daily_rollups() holds it exclusively
+    from reading the raw collections until its result replaces daily_rollups.
+    A write that arrives during a rebuild waits for the swap, so its delta is
+    neither lost with the replaced collection nor counted twice. The rebuild
+    first takes a separate intent lock, which new writers check before taking
+    theirs, so a steady stream of writes cannot keep it waiting forever. Both
+    are flocks, shared by every worker and released if a process dies; without
+    fcntl the state is kept in process memory for the single worker.
+    """
+    
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self._writers = 0
+        self._rebuilding = False
+    
+    def _open(self, name: str) -> int:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return os.open(self.directory / name, os.O_RDWR | os.O_CREAT, 0o600)
+    
+    @staticmethod
+    async def _flock(fd: int, operation: int):
+        while True:
+            try:
+                fcntl.flock(fd, operation | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                await asyncio.sleep(ROLLUP_LOCK_POLL_SECONDS)
+    
+    @asynccontextmanager
+    async def write(self):
+        if fcntl is None:
+            while self._rebuilding:
+                await asyncio.sleep(ROLLUP_LOCK_POLL_SECONDS)
+            self._writers += 1
+            try:
+                yield
+            finally:
+                self._writers -= 1
+            return
+        intent = self._open("rollups-rebuild.lock")
+        fd = self._open("rollups-write.lock")
+        try:
+            # Held for no longer than the check, so a rebuild can always take it
+            await self._flock(intent, fcntl.LOCK_SH)
+            os.close(intent)
+            intent = None
+            await self._flock(fd, fcntl.LOCK_SH)
+            yield
+        finally:
+            if intent is not None:
+                os.close(intent)
+            os.close(fd)  # Releases the lock
+    
+    @asynccontextmanager
+    async def rebuild(self):
+        if fcntl is None:
+            while self._rebuilding:
+                await asyncio.sleep(ROLLUP_LOCK_POLL_SECONDS)
+            self._rebuilding = True
+            try:
+                while self._writers:
+                    await asyncio.sleep(ROLLUP_LOCK_POLL_SECONDS)
+                yield
+            finally:
+                self._rebuilding = False
+            return
+        intent = self._open("rollups-rebuild.lock")
+        fd = self._open("rollups-write.lock")
+        try:
+            await self._flock(intent, fcntl.LOCK_EX)
+            # Writes already holding the lock finish; new ones wait on the intent lock
+            await self._flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+            os.close(intent)
+
+rollup_lock = RollupLock(SHARED_STATE_DIR)
+
+
+# Product Cache
+class ProductCache:
+    """In-process copy of the product catalog keyed by id.
+
+    The catalog is small and read-mostly, so it is loaded whole and kept as
+    both a dict by id and the materialized list that GET /api/products
+    returns. Writes to products call invalidate() and stock movements call
+    apply_stock_deltas(); both bump the shared catalog generation so every
+    other worker reloads, while stock movements patch this worker's copy in
+    place. The TTL bounds staleness from writes made outside the server.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._products = None
+        self._by_id = {}
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._catalog_generation = None
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return (
+            self._products is not None
+            and time.monotonic() - self._loaded_at < self.ttl
+            and shared_counters.get(COUNTER_SLOTS["product_catalog"]) == self._catalog_generation
+        )
+
+    async def all(self) -> list:
+        """The whole catalog ordered by (created_at, id)"""
+        if self._fresh():
+            self.hits += 1
+            return self._products
+        self.misses += 1
+        async with self._lock:
+            if self._fresh():
+                return self._products
+            generation = self._generation
+            catalog_generation = shared_counters.get(COUNTER_SLOTS["product_catalog"])
+            products = await db.products.find({}, {"_id": 0}).sort(
+                [("created_at", ASCENDING), ("id", ASCENDING)]
+            ).to_list(None)
+            # A write during the load may not be reflected in it; serve it uncached
+            if generation == self._generation:
+                self._products = products
+                self._by_id = {product['id']: product for product in products}
+                self._loaded_at = time.monotonic()
+                self._catalog_generation = catalog_generation
+            return products
+
+    async def get_many(self, product_ids) -> dict:
+        """{id: product} for the ids that exist"""
+        products = await self.all()
+        by_id = self._by_id if products is self._products else {p['id']: p for p in products}
+        return {product_id: by_id[product_id] for product_id in product_ids if product_id in by_id}
+
+    def apply_stock_deltas(self, deltas: dict):
+        """Adjust cached quantities by {product_id: delta} after a committed stock change.
+
+        The shared catalog generation is bumped too, so every other worker
+        reloads before it serves the changed stock. This worker keeps its
+        patched copy when nobody else bumped the generation since it loaded.
+        """
+        self._generation += 1
+        for product_id, delta in deltas.items():
+            if product_id in self._by_id:
+                product = self._by_id[product_id]
+                product['quantity'] += delta
+                if 'stock_margin' in product:
+                    product['stock_margin'] += delta
+        catalog_generation = shared_counters.add(COUNTER_SLOTS["product_catalog"])
+        if self._products is not None and self._catalog_generation == catalog_generation - 1:
+            self._catalog_generation = catalog_generation
+
+    def invalidate(self):
+        self._generation += 1
+        self._products = None
+        self._by_id = {}
+        self.invalidations += 1
+        shared_counters.add(COUNTER_SLOTS["product_catalog"])
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "invalidations": self.invalidations,
+            "cached_products": len(self._by_id),
+            "ttl_seconds": self.ttl,
+        }
+
+product_cache = ProductCache(ttl=float(os.environ.get('PRODUCT_CACHE_TTL', '60')))
+
+
+# Collection Versions
+# Bumped by every write route after its write lands; list endpoints derive
+# their ETag from them, so a matching If-None-Match is answered without a query.
+# They are shared counters, so every worker hands out the same tags.
+# sales_history and categories are narrower versions the report caches key on.
+def collection_version(collection: str) -> int:
+    return shared_counters.get(COUNTER_SLOTS[collection])
+
+def bump_versions(*collections: str):
+    for collection in collections:
+        shared_counters.add(COUNTER_SLOTS[collection])
+
+def not_modified(request: Request, response: Response, *collections: str, extra: str = "") -> Optional[Response]:
+    """Set a strong ETag for the current collection versions and query.
+
+    Returns a 304 response when the client's If-None-Match already matches,
+    otherwise None and the caller goes on to build the full response. Call it
+    before reading so the tag never runs ahead of the data it labels.
+    """
+    state = ":".join(
+        [str(shared_counters.get(0)), request.url.path, str(request.url.query), extra]
+        + [f"{collection}={collection_version(collection)}" for collection in collections]
+    )
+    etag = '"' + hashlib.sha1(state.encode()).hexdigest() + '"'
+    cache_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        # Weak comparison: compressed responses carry the tag as W/"..."
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in tags or etag in tags:
+            return Response(status_code=304, headers=cache_headers)
+    response.headers.update(cache_headers)
+    return None
+
+
+# Idempotency Keys
+# A retried POST carrying the same Idempotency-Key gets the stored response
+# of the first attempt instead of selling the stock again.
+IDEMPOTENCY_LOCK_SECONDS = 30
+IDEMPOTENCY_POLL_SECONDS = 0.1
+_idempotent_inflight = {}
+
+def _request_hash(body) -> str:
+    return hashlib.sha256(json.dumps(jsonable_encoder(body), sort_keys=True).encode()).hexdigest()
+
+def _replay(record: dict) -> JSONResponse:
+    return JSONResponse(
+        content=record['response'],
+        status_code=record['status_code'],
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+async def _claim_idempotency_key(key_id: str, request_hash: str) -> Optional[dict]:
+    """Claim key_id for this request, or return the completed record to replay.
+
+    Waits while another worker holds the key, and takes it over if that
+    worker has held it past IDEMPOTENCY_LOCK_SECONDS without finishing.
+    """
+    deadline = time.monotonic() + IDEMPOTENCY_LOCK_SECONDS
+    while True:
+        now = datetime.now(timezone.utc)
+        try:
+            await db.idempotency_keys.insert_one({
+                "_id": key_id,
+                "status": "in_progress",
+                "request_hash": request_hash,
+                "created_at": now
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+        
+        record = await db.idempotency_keys.find_one({"_id": key_id})
+        if record is None:
+            continue
+        if record['request_hash'] != request_hash:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        if record['status'] == "completed":
+            return record
+        
+        stale = await db.idempotency_keys.find_one_and_update(
+            {"_id": key_id, "status": "in_progress", "created_at": {"$lt": now - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)}},
+            {"$set": {"created_at": now}}
+        )
+        if stale:
+            return None
+        if time.monotonic() > deadline:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed")
+        await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+
+async def run_idempotent(scope: str, key: Optional[str], body, handler):
+    """Run handler() at most once per (scope, Idempotency-Key).
+
+    Only successful responses are stored; a failed attempt releases the key
+    so the retry runs again, which is safe because failed writes are undone.
+    Duplicates arriving in this process while the first is running await it
+    directly instead of polling MongoDB.
+    """
+    if not key:
+        return await handler()
+    
+    key_id = f"{scope}:{key}"
+    request_hash = _request_hash(body)
+    inflight = _idempotent_inflight.get(key_id)
+    if inflight is not None:
+        first_hash, future = inflight
+        if first_hash != request_hash:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        try:
+            return _replay(await asyncio.shield(future))
+        except Exception:
+            pass  # The first attempt failed; go through the normal path
+    
+    record = await _claim_idempotency_key(key_id, request_hash)
+    if record is not None:
+        return _replay(record)
+    
+    future = asyncio.get_running_loop().create_future()
+    _idempotent_inflight[key_id] = (request_hash, future)
+    try:
+        result = await handler()
+        completed = {"status_code": 200, "response": jsonable_encoder(result)}
+        await db.idempotency_keys.update_one(
+            {"_id": key_id},
+            {"$set": {"status": "completed", **completed}}
+        )
+        future.set_result(completed)
+        return result
+    except BaseException as e:
+        await db.idempotency_keys.delete_one({"_id": key_id, "status": "in_progress"})
+        future.set_exception(e)
+        future.exception()  # Mark retrieved so an unawaited failure is not logged
+        raise
+    finally:
+        _idempotent_inflight.pop(key_id, None)
+
+
+# Live Events
+# Dashboards subscribe through GET /api/dashboard/stream. Write routes publish
+# small deltas here; on a replica set a change stream feeds the hub instead,
+# so writes made by other server processes reach every dashboard too.
+EVENT_QUEUE_SIZE = 100
+SSE_KEEPALIVE_SECONDS = 15
+
+class EventHub:
+    """In-process fan-out of dashboard events to one queue per subscriber"""
+    
+    def __init__(self):
+        self._subscribers = set()
+        self._low_stock = None  # ids below their reorder threshold, tracked while anyone listens
+        self.fed_by_change_stream = False
+    
+    async def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        try:
+            await self._load_low_stock()
+        except BaseException:
+            self.unsubscribe(queue)
+            raise
+        return queue
+    
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+        if not self._subscribers:
+            self._low_stock = None  # Nobody tracks crossings while idle; reload on next use
+    
+    def needs_local_events(self) -> bool:
+        """True when write routes should publish; False when idle or fed by the change stream"""
+        return bool(self._subscribers) and not self.fed_by_change_stream
+    
+    def publish(self, event: dict):
+        event = jsonable_encoder(event)
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A stalled client; drop its backlog and have it reload the stats
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+    
+    def resync(self):
+        self._low_stock = None
+        self.publish({"type": "resync"})
+    
+    async def _load_low_stock(self):
+        if self._low_stock is None:
+            low = await db.products.find(LOW_STOCK, {"_id": 0, "id": 1}).to_list(None)
+            self._low_stock = {product['id'] for product in low}
+    
+    async def publish_stock_levels(self, products: list):
+        """Publish new quantities, plus a low_stock event for each threshold crossing"""
+        if not self._subscribers:
+            return
+        await self._load_low_stock()
+        
+        for product in products:
+            is_low = product['quantity'] < product.get('reorder_threshold', DEFAULT_REORDER_THRESHOLD)
+            self.publish({
+                "type": "stock",
+                "product_id": product['id'],
+                "name": product['name'],
+                "quantity": product['quantity'],
+                "unit": product.get('unit'),
+                "reorder_threshold": product.get('reorder_threshold', DEFAULT_REORDER_THRESHOLD),
+                "low_stock": is_low
+            })
+            if is_low != (product['id'] in self._low_stock):
+                if is_low:
+                    self._low_stock.add(product['id'])
+                else:
+                    self._low_stock.discard(product['id'])
+                self.publish({
+                    "type": "low_stock",
+                    "product": {field: product.get(field) for field in ("id", "name", "category", "quantity", "unit", "reorder_threshold")},
+                    "low_stock": is_low,
+                    "low_stock_count": len(self._low_stock)
+                })
+
+event_hub = EventHub()
+
+# Without a change stream, what the routes publish is also sent to the other
+# workers, whose dashboards are subscribed there
+def publish_event(event: dict):
+    if event_hub.needs_local_events():
+        event_hub.publish(event)
+    if not event_hub.fed_by_change_stream:
+        worker_bus.broadcast("event", event=event)
+
+def publish_resync():
+    if event_hub.needs_local_events():
+        event_hub.resync()
+    if not event_hub.fed_by_change_stream:
+        worker_bus.broadcast("resync")
+
+async def publish_stock_change(product_ids):
+    """Read the new quantities of product_ids and publish them, if anyone is listening"""
+    product_ids = list(product_ids)
+    if not event_hub.fed_by_change_stream:
+        worker_bus.broadcast("stock_change", product_ids=product_ids)
+    await publish_local_stock_change(product_ids)
+
+async def publish_local_stock_change(product_ids: list):
+    if not event_hub.needs_local_events():
+        return
+    products = await db.products.find(
+        {"id": {"$in": product_ids}},
+        {"_id": 0, "id": 1, "name": 1, "category": 1, "quantity": 1, "unit": 1, "reorder_threshold": 1}
+    ).to_list(len(product_ids))
+    await event_hub.publish_stock_levels(products)
+
+def relay_worker_event(message: dict):
+    if event_hub.needs_local_events():
+        event_hub.publish(message['event'])
+
+def relay_worker_resync(message: dict):
+    if event_hub.needs_local_events():
+        event_hub.resync()
+
+worker_bus.handlers["event"] = relay_worker_event
+worker_bus.handlers["resync"] = relay_worker_resync
+worker_bus.handlers["stock_change"] = lambda message: publish_local_stock_change(message['product_ids'])
+
+async def relay_change(change: dict):
+    """Turn one change stream event into dashboard events"""
+    operation = change['operationType']
+    collection = change.get('ns', {}).get('coll')
+    if operation in ("drop", "dropDatabase", "rename", "invalidate"):
+        event_hub.resync()
+    elif collection == "sales" and operation == "insert":
+        sale = change['fullDocument']
+        sale.pop('_id', None)
+        event_hub.publish({"type": "sale", "sale": sale})
+    elif collection == "products" and operation == "update":
+        if "stock_margin" in change['updateDescription']['updatedFields'] and change.get('fullDocument'):
+            await event_hub.publish_stock_levels([change['fullDocument']])
+    elif collection == "products":
+        event_hub.resync()
+
+async def relay_change_stream():
+    """Feed the hub from a change stream, falling back to route events while it is down"""
+    pipeline = [{"$match": {"ns.coll": {"$in": ["products", "sales"]}}}]
+    while True:
+        try:
+            async with db.watch(pipeline, full_document="updateLookup") as stream:
+                event_hub.fed_by_change_stream = True
+                async for change in stream:
+                    await relay_change(change)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Change stream interrupted, retrying: {e}")
+        finally:
+            event_hub.fed_by_change_stream = False
+        # Events may have been missed while reconnecting
+        event_hub.resync()
+        await asyncio.sleep(5)
+
+
+# Pagination
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(sort_value, doc_id: str) -> str:
+    """Opaque cursor pointing just past the document with this sort key (a date or number)"""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, doc_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, numeric: bool = False) -> tuple:
+    """(sort value, id) from a cursor; the sort value is a number if numeric, else an aware datetime"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, doc_id = json.loads(raw)
+        if not isinstance(doc_id, str):
+            raise TypeError(doc_id)
+        if numeric:
+            if isinstance(sort_value, bool) or not isinstance(sort_value, (int, float)):
+                raise TypeError(sort_value)
+        else:
+            if not isinstance(sort_value, str):
+                raise TypeError(sort_value)
+            sort_value = datetime.fromisoformat(sort_value)
+            if sort_value.tzinfo is None:
+                raise ValueError(sort_value)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    return sort_value, doc_id
+
+def date_range_filter(field: str, start: Optional[datetime], end: Optional[datetime]) -> dict:
+    """Filter on field between start (inclusive) and end (exclusive)"""
+    bounds = {}
+    for op, value in (("$gte", start), ("$lt", end)):
+        if value is not None:
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=timezone.utc)
+            bounds[op] = value
+    return {field: bounds} if bounds else {}
+
+async def find_page(
+    collection: str,
+    query: dict,
+    sort_field: str,
+    response: Response,
+    limit: int,
+    after: Optional[str] = None,
+    direction: int = DESCENDING,
+    projection: Optional[dict] = None,
+    numeric: bool = False
+) -> list:
+    """Return one keyset page of documents ordered by (sort_field, id).
+
+    The cursor for the following page, if any, is sent in the X-Next-Cursor
+    response header so the body keeps its plain list shape. Pass numeric when
+    sort_field holds numbers rather than dates.
+    """
+    if after:
+        sort_value, last_id = decode_cursor(after, numeric)
+        op = "$lt" if direction == DESCENDING else "$gt"
+        query = {"$and": [query, {"$or": [
+            {sort_field: {op: sort_value}},
+            {sort_field: sort_value, "id": {op: last_id}}
+        ]}]}
+    
+    docs = await db[collection].find(query, projection or {"_id": 0}).sort(
+        [(sort_field, direction), ("id", direction)]
+    ).limit(limit + 1).to_list(limit + 1)
+    
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(docs[-1][sort_field], docs[-1]['id'])
+    return docs
+
+
+# Daily Rollups
+ROLLUP_FIELDS = [
+    "sales_count", "sales_revenue", "sales_profit",
+    "receipts_count", "receipts_amount", "receipts_profit",
+    "expenses_count", "expenses_amount",
+]
+
+def rollup_day(value: datetime) -> str:
+    """UTC calendar date (YYYY-MM-DD) used as the daily_rollups key"""
+    if isinstance(value, str):
+        # Document written before dates were stored natively
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%d')
+
+async def bump_daily_rollup(day_value, session=None, **deltas):
+    """Atomically add deltas to the rollup document for the day of day_value"""
+    await db.daily_rollups.update_one(
+        {"_id": rollup_day(day_value)},
+        {"$inc": deltas},
+        upsert=True,
+        session=session
+    )
+
+async def bump_committed_rollup(day_value, **deltas):
+    """bump_daily_rollup after a committed write, which must not fail because of it"""
+    try:
+        await bump_daily_rollup(day_value, **deltas)
+    except Exception as e:
+        logger.error(
+            f"Daily rollup {rollup_day(day_value)} missed {deltas}: {e}; "
+            "run 'python manage.py rebuild-rollups' to repair it"
+        )
+
+async def sum_daily_rollups(start_day: Optional[str] = None, fields=ROLLUP_FIELDS) -> dict:
+    """Sum rollup counters in fields from start_day (inclusive) onwards, or over all days"""
+    match = {"_id": {"$gte": start_day}} if start_day else {}
+    totals = await db.daily_rollups.aggregate([
+        {"$match": match},
+        {"$group": {"_id": None, **{field: {"$sum": f"${field}"} for field in fields}}}
+    ]).to_list(1)
+    totals = totals[0] if totals else {}
+    return {field: totals.get(field, 0) for field in fields}
+
+async def archived_before() -> Optional[datetime]:
+    """Cutoff of the latest completed archive run, or None if nothing was archived"""
+    run = await db.archive_runs.find_one(
+        {"finished_at": {"$exists": True}}, sort=[("before", DESCENDING)]
+    )
+    return run['before'] if run else None
+
+async def rebuild_daily_rollups():
+    """Rebuild daily_rollups from the raw sales, receipts and expenses collections.
+
+    Totals are grouped on the server into a scratch collection which then
+    replaces daily_rollups in one rename, so readers never see a partial rebuild.
+    Writes wait on rollup_lock from the first read of the raw collections until
+    the rename, so none is lost or counted twice. Dates still stored as ISO
+    strings are converted while grouping; unparseable ones are left out. Days
+    before the last archive cutoff are no longer in the raw collections, so
+    their existing rollups are carried over unchanged.
+    """
+    scratch = "daily_rollups_rebuild"
+    sources = [
+        ("sales", "sale_date", {
+            "sales_count": {"$sum": 1},
+            "sales_revenue": {"$sum": "$total_amount"},
+            "sales_profit": {"$sum": "$profit"},
+        }),
+        ("receipts", "created_at", {
+            "receipts_count": {"$sum": 1},
+            "receipts_amount": {"$sum": "$total_amount"},
+            "receipts_profit": {"$sum": "$total_profit"},
+        }),
+        ("expenses", "expense_date", {
+            "expenses_count": {"$sum": 1},
+            "expenses_amount": {"$sum": "$amount"},
+        }),
+    ]
+    async with rollup_lock.rebuild():
+        await db[scratch].drop()
+        archived = await archived_before()
+        if archived:
+            await db.daily_rollups.aggregate([
+                {"$match": {"_id": {"$lt": rollup_day(archived)}}},
+                {"$merge": {"into": scratch, "whenMatched": "merge", "whenNotMatched": "insert"}}
+            ]).to_list(None)
+        for collection, date_field, accumulators in sources:
+            day = {"$dateToString": {"format": "%Y-%m-%d", "date": {
+                "$convert": {"input": f"${date_field}", "to": "date", "onError": None, "onNull": None}
+            }}}
+            await db[collection].aggregate([
+                {"$group": {"_id": day, **accumulators}},
+                {"$match": {"_id": {"$ne": None}}},
+                {"$merge": {"into": scratch, "whenMatched": "merge", "whenNotMatched": "insert"}}
+            ]).to_list(None)
+        
+        days = await db[scratch].count_documents({})
+        if days:
+            await db[scratch].rename("daily_rollups", dropTarget=True)
+        else:
+            await db.daily_rollups.drop()
+    # The totals the rollups hold; the dashboard's ETag follows sales
+    bump_versions("sales", "receipts", "expenses")
+    publish_resync()
+    return days
+
+
+# Product Validation
+BULK_MAX_ROWS = 5000
+
+def product_rule_violation(values: dict) -> Optional[str]:
+    """First business rule broken by the given product fields, if any.
+
+    Only the fields present are checked. Partial updates pass their fields
+    merged over the stored prices, so a new price is checked against the
+    price it is not changing.
+    """
+    cost_price = values.get('cost_price')
+    selling_price = values.get('selling_price')
+    if cost_price is not None and selling_price is not None and selling_price < cost_price:
+        return "Selling price cannot be less than cost price"
+    if values.get('quantity') is not None and values['quantity'] < 0:
+        return "Quantity cannot be negative"
+    if (cost_price is not None and cost_price < 0) or (selling_price is not None and selling_price < 0):
+        return "Prices cannot be negative"
+    if values.get('reorder_threshold') is not None and values['reorder_threshold'] < 0:
+        return "Reorder threshold cannot be negative"
+    return None
+
+PRICE_FIELDS = ("cost_price", "selling_price")
+
+def price_guard(stored: dict, fields: dict) -> dict:
+    """Filter matching the stored prices a partial update was checked against.
+
+    A patch to one price is validated against the other as stored; adding
+    this to the update's filter makes the write miss if that price changed
+    in between, so the merged values that were checked are the ones saved.
+    """
+    return {field: stored.get(field) for field in PRICE_FIELDS if field not in fields}
+
+def validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc']) or 'row'}: {e['msg']}" for e in error.errors()
+    )
+
+async def read_bulk_rows(request: Request) -> list:
+    """Rows from a JSON array, a text/csv body or a multipart CSV file upload.
+
+    Empty CSV cells are dropped so they count as "not provided".
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        upload = (await request.form()).get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Upload the CSV as a form field named 'file'")
+        text = (await upload.read()).decode("utf-8-sig")
+    elif content_type.startswith("text/csv"):
+        text = (await request.body()).decode("utf-8-sig")
+    else:
+        try:
+            rows = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or CSV")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array of products")
+        text = None
+    
+    if text is not None:
+        rows = [
+            {key.strip(): value.strip() for key, value in row.items() if key and value and value.strip()}
+            for row in csv.DictReader(io.StringIO(text))
+        ]
+    if not rows:
+        raise HTTPException(status_code=400, detail="No rows provided")
+    if len(rows) > BULK_MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_MAX_ROWS} rows per request")
+    return rows
+
 
 # Product Routes
 @api_router.get("/products", response_model=List[Product])
-async def get_products():
-    products = await db.products.find({}, {"_id": 0}).to_list(1000)
+async def get_products(
+    request: Request,
+    response: Response,
+    category: Optional[str] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
+    if cached := not_modified(request, response, "products"):
+        return cached
+    
+    # Served from the in-process catalog cache, paged in memory
+    products = await product_cache.all()
+    if category:
+        products = [p for p in products if p['category'] == category]
+    if after:
+        cursor_key = decode_cursor(after)
+        products = [p for p in products if (p['created_at'], p['id']) > cursor_key]
+    if len(products) > limit:
+        products = products[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(products[-1]['created_at'], products[-1]['id'])
+    # Cached documents also carry stock_margin; send only the model's fields
+    return fast_json([{field: p[field] for field in PRODUCT_PROJECTION if field in p} for p in products], response)
+
+@api_router.get("/products/low-stock", response_model=List[Product])
+async def get_low_stock_products(
+    request: Request,
+    response: Response,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
+    """Products below their reorder threshold, furthest below first"""
+    if cached := not_modified(request, response, "products"):
+        return cached
+    products = await find_page(
+        "products", LOW_STOCK, "stock_margin", response, limit, after,
+        direction=ASCENDING, projection={**PRODUCT_PROJECTION, "stock_margin": 1}, numeric=True
+    )
     for product in products:
-        if isinstance(product.get('created_at'), str):
-            product['created_at'] = datetime.fromisoformat(product['created_at'])
-        if isinstance(product.get('updated_at'), str):
-            product['updated_at'] = datetime.fromisoformat(product['updated_at'])
-    return products
+        del product['stock_margin']  # Fetched only for the cursor
+    return fast_json(products, response)
 
 @api_router.post("/products", response_model=Product)
 async def create_product(product_input: ProductCreate):
     # Validation
-    if product_input.selling_price < product_input.cost_price:
-        raise HTTPException(
-            status_code=400, 
-            detail="Selling price cannot be less than cost price"
-        )
-    
-    if product_input.quantity < 0:
-        raise HTTPException(
-            status_code=400, 
-            detail="Quantity cannot be negative"
-        )
-    
-    if product_input.cost_price < 0 or product_input.selling_price < 0:
-        raise HTTPException(
-            status_code=400, 
-            detail="Prices cannot be negative"
-        )
+    error = product_rule_violation(product_input.model_dump())
+    if error:
+        raise HTTPException(status_code=400, detail=error)
     
     product_dict = product_input.model_dump()
     product = Product(**product_dict)
     
-    doc = product.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
+    doc = product_document(product)
     
     await db.products.insert_one(doc)
+    product_cache.invalidate()
+    bump_versions("products")
+    publish_resync()
     return product
 
 @api_router.put("/products/{product_id}", response_model=Product)
 async def update_product(product_id: str, product_input: ProductUpdate):
-    # Get existing product
-    existing = await db.products.find_one({"id": product_id}, {"_id": 0})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
     # Update fields
     update_data = product_input.model_dump(exclude_unset=True)
-    update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
-    
-    await db.products.update_one({"id": product_id}, {"$set": update_data})
+    guard = {}
+    values = update_data
+    if any(field in update_data for field in PRICE_FIELDS):
+        stored = await db.products.find_one({"id": product_id}, {"_id": 0, **{field: 1 for field in PRICE_FIELDS}})
+        if not stored:
+            raise HTTPException(status_code=404, detail="Product not found")
+        guard = price_guard(stored, update_data)
+        values = {**stored, **update_data}
+    error = product_rule_violation(values)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    update_data['updated_at'] = datetime.now(timezone.utc)
     
-    # Return updated product
-    updated = await db.products.find_one({"id": product_id}, {"_id": 0})
-    if isinstance(updated.get('created_at'), str):
-        updated['created_at'] = datetime.fromisoformat(updated['created_at'])
-    if isinstance(updated.get('updated_at'), str):
-        updated['updated_at'] = datetime.fromisoformat(updated['updated_at'])
+    # Apply and return the updated product in one round trip
+    updated = await db.products.find_one_and_update(
+        {"id": product_id, **guard},
+        product_update_pipeline(update_data),
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated:
+        if guard and await db.products.find_one({"id": product_id}, {"_id": 1}):
+            raise HTTPException(status_code=409, detail="The product's prices changed meanwhile; try again")
+        raise HTTPException(status_code=404, detail="Product not found")
+    product_cache.invalidate()
+    bump_versions("products", *(["categories"] if 'category' in update_data else []))
+    if 'quantity' in update_data or 'reorder_threshold' in update_data:
+        await publish_stock_change([product_id])
     
     return Product(**updated)
 
+@api_router.post("/products/bulk")
+async def create_products_bulk(request: Request):
+    """Create many products from a JSON array or CSV in one bulk_write.
+
+    Every row is validated like POST /api/products; invalid rows are reported
+    and skipped, valid ones are inserted.
+    """
+    rows = await read_bulk_rows(request)
+    results = []
+    inserts = []
+    for index, row in enumerate(rows):
+        try:
+            product_input = ProductCreate.model_validate(row)
+        except ValidationError as e:
+            results.append({"row": index, "status": "error", "detail": validation_message(e)})
+            continue
+        error = product_rule_violation(product_input.model_dump())
+        if error:
+            results.append({"row": index, "status": "error", "detail": error})
+            continue
+        product = Product(**product_input.model_dump())
+        inserts.append(InsertOne(product_document(product)))
+        results.append({"row": index, "status": "created", "id": product.id})
+    
+    if inserts:
+        await db.products.bulk_write(inserts, ordered=False)
+        product_cache.invalidate()
+        bump_versions("products")
+        publish_resync()
+    
+    return {
+        "created": len(inserts),
+        "failed": len(results) - len(inserts),
+        "results": results
+    }
+
+@api_router.patch("/products/bulk")
+async def update_products_bulk(request: Request):
+    """Partially update many products from a JSON array or CSV in one bulk_write.
+
+    Each row needs an id plus any non-null ProductUpdate fields, and a product may
+    appear in one row only. quantity_delta adds received stock with $inc, so
+    it is safe alongside concurrent sales.
+    """
+    rows = await read_bulk_rows(request)
+    results = []
+    parsed = []
+    for index, row in enumerate(rows):
+        try:
+            update = ProductBulkUpdate.model_validate(row)
+        except ValidationError as e:
+            results.append({"row": index, "status": "error", "detail": validation_message(e)})
+            continue
+        fields = update.model_dump(exclude_unset=True, exclude={"id", "quantity_delta"})
+        error = product_rule_violation(fields)
+        if not error and update.quantity_delta is not None:
+            if update.quantity_delta < 0:
+                error = "quantity_delta cannot be negative; set quantity to correct stock"
+            elif 'quantity' in fields:
+                error = "Provide either quantity or quantity_delta, not both"
+        if error:
+            results.append({"row": index, "status": "error", "detail": error})
+            continue
+        parsed.append((index, update, fields))
+        results.append(None)
+    
+    # One query for the stored prices, so missing ids can be reported per row
+    # and price changes checked against the price they leave alone
+    stored = {
+        doc['id']: doc for doc in await db.products.find(
+            {"id": {"$in": [update.id for _, update, _ in parsed]}},
+            {"_id": 0, "id": 1, **{field: 1 for field in PRICE_FIELDS}}
+        ).to_list(None)
+    }
+    # Millisecond precision, as stored, so the rows that were written can be matched on it
+    now = datetime.now(timezone.utc)
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    writes = []
+    guarded = []
+    restocked = []
+    first_rows = {}
+    for index, update, fields in parsed:
+        if update.id not in stored:
+            results[index] = {"row": index, "status": "error", "detail": "Product not found"}
+            continue
+        if update.id in first_rows:
+            # Each row is checked against the prices stored before the request
+            results[index] = {
+                "row": index, "status": "error", "detail": f"Product is already in row {first_rows[update.id]}"
+            }
+            continue
+        first_rows[update.id] = index
+        query = {"id": update.id}
+        if any(field in fields for field in PRICE_FIELDS):
+            prices = {field: stored[update.id].get(field) for field in PRICE_FIELDS}
+            error = product_rule_violation({**prices, **fields})
+            if error:
+                results[index] = {"row": index, "status": "error", "detail": error}
+                continue
+            query.update(price_guard(prices, fields))
+            if len(query) > 1:
+                guarded.append((index, update.id))
+        operation = product_update_pipeline({**fields, "updated_at": now}, update.quantity_delta)
+        writes.append(UpdateOne(query, operation))
+        if 'quantity' in fields or 'reorder_threshold' in fields or update.quantity_delta:
+            restocked.append(update.id)
+        results[index] = {"row": index, "status": "updated", "id": update.id}
+    
+    if writes:
+        outcome = await db.products.bulk_write(writes, ordered=False)
+        if outcome.matched_count < len(writes):
+            # A price guard missed: report the rows whose product was not written
+            written = set(await db.products.distinct(
+                "id", {"id": {"$in": [product_id for _, product_id in guarded]}, "updated_at": now}
+            ))
+            for index, product_id in guarded:
+                if product_id not in written:
+                    results[index] = {
+                        "row": index, "status": "error", "detail": "The product's prices changed meanwhile; try again"
+                    }
+        product_cache.invalidate()
+        bump_versions("products", *(["categories"] if any('category' in fields for _, _, fields in parsed) else []))
+        if restocked:
+            await publish_stock_change(restocked)
+    
+    updated = sum(1 for result in results if result['status'] == "updated")
+    return {
+        "updated": updated,
+        "failed": len(results) - updated,
+        "results": results
+    }
+
 @api_router.delete("/products/{product_id}")
 async def delete_product(product_id: str):
     result = await db.products.delete_one({"id": product_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    product_cache.invalidate()
+    bump_versions("products", "categories")
+    publish_resync()
     return {"message": "Product deleted successfully"}
 
 
 # Sales Routes
 @api_router.post("/sales", response_model=Sale)
-async def create_sale(sale_input: SaleCreate):
-    # Get product details
-    product = await db.products.find_one({"id": sale_input.product_id}, {"_id": 0})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
+async def create_sale(
+    sale_input: SaleCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    return await run_idempotent(
+        "sales", idempotency_key, sale_input, lambda: record_sale(sale_input)
+    )
+
+async def record_sale(sale_input: SaleCreate) -> Sale:
+    if sale_input.quantity <= 0:
+        raise HTTPException(status_code=400, detail="Quantity must be greater than 0")
     
-    # Check if enough quantity available
-    if product['quantity'] < sale_input.quantity:
+    # Check stock up front from the catalog cache; the guarded decrement below
+    # re-checks against the database
+    cached = (await product_cache.get_many([sale_input.product_id])).get(sale_input.product_id)
+    if cached and cached['quantity'] < sale_input.quantity:
         raise HTTPException(status_code=400, detail="Insufficient quantity in stock")
     
-    # Calculate sale details
-    total_amount = sale_input.quantity * product['selling_price']
-    profit = (product['selling_price'] - product['cost_price']) * sale_input.quantity
-    
-    # Generate receipt number
-    receipt_number = f"RCP-{datetime.now(timezone.utc).strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
-    
-    sale_dict = {
-        "product_id": sale_input.product_id,
-        "product_name": product['name'],
-        "quantity": sale_input.quantity,
-        "cost_price": product['cost_price'],
-        "selling_price": product['selling_price'],
-        "total_amount": total_amount,
-        "profit": profit,
-        "receipt_number": receipt_number,
-        "sale_date": sale_input.sale_date or datetime.now(timezone.utc)
-    }
-    
-    sale = Sale(**sale_dict)
-    
-    doc = sale.model_dump()
-    doc['sale_date'] = doc['sale_date'].isoformat()
-    doc['created_at'] = doc['created_at'].isoformat()
-    
-    await db.sales.insert_one(doc)
-    
-    # Update product quantity
-    new_quantity = product['quantity'] - sale_input.quantity
-    await db.products.update_one(
-        {"id": sale_input.product_id},
-        {"$set": {"quantity": new_quantity}}
-    )
+    async def write_sale(session):
+        # Take the stock only if enough is left, in one atomic step
+        product = await db.products.find_one_and_update(
+            {"id": sale_input.product_id, "quantity": {"$gte": sale_input.quantity}},
+            {"$inc": {"quantity": -sale_input.quantity, "stock_margin": -sale_input.quantity}},
+            projection={"_id": 0},
+            session=session
+        )
+        if not product:
+            if not await db.products.find_one({"id": sale_input.product_id}, {"_id": 1}, session=session):
+                raise HTTPException(status_code=404, detail="Product not found")
+            if cached:
+                # Another till sold the stock after the check
+                raise HTTPException(status_code=409, detail="Stock changed while saving the sale. Please try again.")
+            raise HTTPException(status_code=400, detail="Insufficient quantity in stock")
+        
+        # Calculate sale details
+        total_amount = sale_input.quantity * product['selling_price']
+        profit = (product['selling_price'] - product['cost_price']) * sale_input.quantity
+        
+        # Generate receipt number
+        receipt_number = f"RCP-{datetime.now(timezone.utc).strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+        
+        sale_dict = {
+            "product_id": sale_input.product_id,
+            "product_name": product['name'],
+            "quantity": sale_input.quantity,
+            "cost_price": product['cost_price'],
+            "selling_price": product['selling_price'],
+            "total_amount": total_amount,
+            "profit": profit,
+            "receipt_number": receipt_number,
+            "sale_date": sale_input.sale_date or datetime.now(timezone.utc)
+        }
+        
+        sale = Sale(**sale_dict)
+        
+        doc = sale.model_dump()
+        
+        try:
+            await db.sales.insert_one(doc, session=session)
+        except Exception:
+            if session is None:
+                await restore_stock({sale_input.product_id: sale_input.quantity})
+            raise
+        return sale
     
+    # Stock decrement and sale insert are all-or-nothing
+    async with rollup_lock.write():
+        sale = await run_in_transaction(write_sale)
+        # Outside the transaction, like the receipt's, so concurrent sales do
+        # not conflict on the day's rollup document
+        await bump_committed_rollup(
+            sale.sale_date,
+            sales_count=1,
+            sales_revenue=sale.total_amount,
+            sales_profit=sale.profit
+        )
+    product_cache.apply_stock_deltas({sale.product_id: -sale.quantity})
+    bump_versions("sales", "products")
+    bump_sales_history(sale.sale_date)
+    publish_event({"type": "sale", "sale": sale})
+    await publish_stock_change([sale.product_id])
     return sale
 
 @api_router.get("/sales", response_model=List[Sale])
-async def get_sales():
-    sales = await db.sales.find({}, {"_id": 0}).sort("sale_date", -1).to_list(1000)
-    for sale in sales:
-        if isinstance(sale.get('sale_date'), str):
-            sale['sale_date'] = datetime.fromisoformat(sale['sale_date'])
-        if isinstance(sale.get('created_at'), str):
-            sale['created_at'] = datetime.fromisoformat(sale['created_at'])
-    return sales
+async def get_sales(
+    request: Request,
+    response: Response,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    product_id: Optional[str] = None,
+    category: Optional[str] = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
+    if cached := not_modified(request, response, "sales", "products"):
+        return cached
+    
+    query = date_range_filter("sale_date", start_date, end_date)
+    if product_id:
+        query["product_id"] = product_id
+    elif category:
+        product_ids = await db.products.distinct("id", {"category": category})
+        query["product_id"] = {"$in": product_ids}
+    return fast_json(await find_page("sales", query, "sale_date", response, limit, after, projection=SALE_PROJECTION), response)
 
 @api_router.get("/sales/summary")
 async def get_sales_summary(period: str = "daily"):
@@ -228,31 +1766,21 @@ async def get_sales_summary(period: str = "daily"):
     if period == "daily":
         start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
     elif period == "weekly":
+        # Rollups are per UTC day, so this and the monthly window start at
+        # midnight of their first day
         start_date = now - timedelta(days=7)
     elif period == "monthly":
         start_date = now - timedelta(days=30)
     else:
         start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
     
-    start_date_iso = start_date.isoformat()
+    # Sum the rollup documents for the days in the period (at most 31)
+    totals = await sum_daily_rollups(rollup_day(start_date))
     
-    # Get sales in period
-    sales = await db.sales.find(
-        {"sale_date": {"$gte": start_date_iso}},
-        {"_id": 0}
-    ).to_list(10000)
-    
-    total_revenue = sum(sale.get('total_amount', 0) for sale in sales)
-    total_profit = sum(sale.get('profit', 0) for sale in sales)
-    total_sales_count = len(sales)
-    
-    # Get expenses in period
-    expenses = await db.expenses.find(
-        {"expense_date": {"$gte": start_date_iso}},
-        {"_id": 0}
-    ).to_list(10000)
-    
-    total_expenses = sum(expense.get('amount', 0) for expense in expenses)
+    total_revenue = totals['sales_revenue']
+    total_profit = totals['sales_profit']
+    total_sales_count = totals['sales_count']
+    total_expenses = totals['expenses_amount']
     
     net_profit = total_profit - total_expenses
     
@@ -276,95 +1804,202 @@ async def create_expense(expense_input: ExpenseCreate):
     expense = Expense(**expense_dict)
     
     doc = expense.model_dump()
-    doc['expense_date'] = doc['expense_date'].isoformat()
-    doc['created_at'] = doc['created_at'].isoformat()
     
-    await db.expenses.insert_one(doc)
+    async with rollup_lock.write():
+        await db.expenses.insert_one(doc)
+        await bump_daily_rollup(expense.expense_date, expenses_count=1, expenses_amount=expense.amount)
+    bump_versions("expenses")
     return expense
 
 @api_router.get("/expenses", response_model=List[Expense])
-async def get_expenses():
-    expenses = await db.expenses.find({}, {"_id": 0}).sort("expense_date", -1).to_list(1000)
-    for expense in expenses:
-        if isinstance(expense.get('expense_date'), str):
-            expense['expense_date'] = datetime.fromisoformat(expense['expense_date'])
-        if isinstance(expense.get('created_at'), str):
-            expense['created_at'] = datetime.fromisoformat(expense['created_at'])
-    return expenses
+async def get_expenses(
+    request: Request,
+    response: Response,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
+    if cached := not_modified(request, response, "expenses"):
+        return cached
+    
+    query = date_range_filter("expense_date", start_date, end_date)
+    return fast_json(
+        await find_page("expenses", query, "expense_date", response, limit, after, projection=EXPENSE_PROJECTION), response
+    )
+
+@api_router.get("/expenses/summary/totals")
+async def get_expenses_summary():
+    """All-time expense count and amount, from the daily rollups"""
+    totals = await sum_daily_rollups(fields=["expenses_count", "expenses_amount"])
+    return {
+        "total_expenses": totals['expenses_count'],
+        "total_amount": round(totals['expenses_amount'], 2)
+    }
 
 @api_router.delete("/expenses/{expense_id}")
 async def delete_expense(expense_id: str):
-    result = await db.expenses.delete_one({"id": expense_id})
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Expense not found")
+    async with rollup_lock.write():
+        expense = await db.expenses.find_one_and_delete(
+            {"id": expense_id},
+            {"_id": 0, "amount": 1, "expense_date": 1}
+        )
+        if not expense:
+            raise HTTPException(status_code=404, detail="Expense not found")
+        await bump_daily_rollup(expense['expense_date'], expenses_count=-1, expenses_amount=-expense['amount'])
+    bump_versions("expenses")
     return {"message": "Expense deleted successfully"}
 
 
 # Dashboard Stats
+DASHBOARD_PRODUCT_FIELDS = {"_id": 0, "id": 1, "name": 1, "category": 1, "quantity": 1, "unit": 1, "reorder_threshold": 1}
+DASHBOARD_SALE_FIELDS = {
+    "_id": 0, "id": 1, "product_name": 1, "quantity": 1, "selling_price": 1,
+    "total_amount": 1, "profit": 1, "sale_date": 1
+}
+
 @api_router.get("/dashboard/stats")
-async def get_dashboard_stats():
-    # Get total products and low stock
-    products = await db.products.find({}, {"_id": 0}).to_list(1000)
-    total_products = len(products)
-    low_stock_products = [p for p in products if p.get('quantity', 0) < 5]
-    
-    # Get today's sales
-    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    today_iso = today.isoformat()
-    
-    today_sales = await db.sales.find(
-        {"sale_date": {"$gte": today_iso}},
-        {"_id": 0}
-    ).to_list(10000)
-    
-    today_revenue = sum(sale.get('total_amount', 0) for sale in today_sales)
-    today_profit = sum(sale.get('profit', 0) for sale in today_sales)
-    
-    # Get recent sales
-    recent_sales = await db.sales.find({}, {"_id": 0}).sort("sale_date", -1).limit(5).to_list(5)
-    for sale in recent_sales:
-        if isinstance(sale.get('sale_date'), str):
-            sale['sale_date'] = datetime.fromisoformat(sale['sale_date'])
+async def get_dashboard_stats(request: Request, response: Response):
+    # Today's totals roll over at midnight UTC even without writes
+    today_key = rollup_day(datetime.now(timezone.utc))
+    if cached := not_modified(request, response, "products", "sales", extra=today_key):
+        return cached
     
-    return {
+    # The queries are independent, so they run concurrently on separate pool
+    # connections. Counts come from collection metadata and the stock_margin
+    # index; the rest fetch only the fields the dashboard shows.
+    total_products, low_stock_count, low_stock_products, today, recent_sales = await asyncio.gather(
+        db.products.estimated_document_count(),
+        db.products.count_documents(LOW_STOCK),
+        db.products.find(LOW_STOCK, DASHBOARD_PRODUCT_FIELDS).sort(
+            [("stock_margin", ASCENDING), ("id", ASCENDING)]
+        ).limit(5).to_list(5),
+        db.daily_rollups.find_one({"_id": today_key}, {"sales_count": 1, "sales_revenue": 1, "sales_profit": 1}),
+        db.sales.find({}, DASHBOARD_SALE_FIELDS).sort("sale_date", -1).limit(5).to_list(5)
+    )
+    today = today or {}
+    
+    today_revenue = today.get('sales_revenue', 0)
+    today_profit = today.get('sales_profit', 0)
+    
+    return fast_json({
         "total_products": total_products,
-        "low_stock_count": len(low_stock_products),
-        "low_stock_products": low_stock_products[:5],
+        "low_stock_count": low_stock_count,
+        "low_stock_products": low_stock_products,
         "today_revenue": round(today_revenue, 2),
         "today_profit": round(today_profit, 2),
-        "today_sales_count": len(today_sales),
-        "recent_sales": recent_sales
-    }
+        "today_sales_count": today.get('sales_count', 0),
+        "recent_sales": recent_sales,
+        "today": today_key
+    }, response)
+
+@api_router.get("/dashboard/stream")
+async def dashboard_stream():
+    """Server-Sent Events with sale, stock and low_stock deltas for an open dashboard.
+
+    Load /dashboard/stats first, then apply the deltas; a resync event means
+    some were missed and the stats should be fetched again.
+    """
+    async def events():
+        # Subscribed only once the response starts streaming: a client gone
+        # before then never runs the generator, so its finally could not unsubscribe
+        queue = None
+        try:
+            queue = await event_hub.subscribe()
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line so proxies keep the idle connection open
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            if queue is not None:
+                event_hub.unsubscribe(queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 # Receipts Routes
 @api_router.get("/receipts")
-async def get_receipts():
-    """Get all receipts (sales) with receipt numbers"""
-    receipts = await db.receipts.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    for receipt in receipts:
-        if isinstance(receipt.get('created_at'), str):
-            receipt['created_at'] = datetime.fromisoformat(receipt['created_at'])
-    return receipts
+async def get_receipts(
+    request: Request,
+    response: Response,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    product_id: Optional[str] = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
+    """Get receipts (sales) with receipt numbers, newest first, one page at a time"""
+    if cached := not_modified(request, response, "receipts"):
+        return cached
+    
+    query = date_range_filter("created_at", start_date, end_date)
+    if product_id:
+        query["items.product_id"] = product_id
+    return fast_json(await find_page("receipts", query, "created_at", response, limit, after), response)
 
 @api_router.post("/receipts/create")
-async def create_multi_item_receipt(request: dict):
+async def create_multi_item_receipt(
+    request: dict,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
     """Create a receipt with multiple items"""
+    return await run_idempotent(
+        "receipts", idempotency_key, request, lambda: record_receipt(request)
+    )
+
+async def record_receipt(request: dict, created_at: Optional[datetime] = None, catalog_prices: bool = False) -> dict:
+    """Validate a cart, deduct its stock and store the receipt.
+
+    Lines are charged at the prices sent with them, falling back to the
+    catalog for any left out; with catalog_prices the sent prices, names
+    and units are ignored.
+    """
+    created_at = created_at or datetime.now(timezone.utc)
     try:
-        items = request.get('items', [])
-        
-        if not items:
+        if not request.get('items'):
             raise HTTPException(status_code=400, detail="No items provided. Please add items to cart.")
+        try:
+            items = ReceiptCreate.model_validate(request).items
+        except ValidationError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid item: {validation_message(e)}")
         
-        # Validate items
+        # Total quantity requested per product (a product may appear on several lines)
+        requested = {}
         for item in items:
-            if not item.get('product_id'):
-                raise HTTPException(status_code=400, detail="Invalid item: missing product ID")
-            if not item.get('quantity') or item['quantity'] <= 0:
-                raise HTTPException(status_code=400, detail="Invalid quantity. Must be greater than 0")
+            requested[item.product_id] = requested.get(item.product_id, 0) + item.quantity
+        
+        # Look up every product in the cart from the catalog cache
+        products = await product_cache.get_many(requested)
+        
+        for item in items:
+            if item.product_id not in products:
+                raise HTTPException(
+                    status_code=404, 
+                    detail=f"Product '{item.product_name or 'Unknown'}' not found. It may have been deleted."
+                )
+        
+        def insufficient_stock(product):
+            return HTTPException(
+                status_code=400, 
+                detail=f"Insufficient stock for '{product['name']}'. Available: {product['quantity']} {product.get('unit', 'units')}, Requested: {requested[product['id']]}"
+            )
+        
+        # Check stock up front; the guarded decrement below re-checks against the database
+        for product_id, quantity in requested.items():
+            if products[product_id]['quantity'] < quantity:
+                raise insufficient_stock(products[product_id])
         
         # Generate receipt number
-        receipt_number = f"RCP-{datetime.now(timezone.utc).strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+        receipt_number = f"RCP-{created_at.strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
         
         # Calculate totals
         total_amount = 0
@@ -372,46 +2007,29 @@ async def create_multi_item_receipt(request: dict):
         receipt_items = []
         
         for item in items:
-            # Get product to verify stock
-            product = await db.products.find_one({"id": item['product_id']}, {"_id": 0})
-            if not product:
-                raise HTTPException(
-                    status_code=404, 
-                    detail=f"Product '{item.get('product_name', 'Unknown')}' not found. It may have been deleted."
-                )
-            
-            # Check stock
-            if product['quantity'] < item['quantity']:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Insufficient stock for '{product['name']}'. Available: {product['quantity']} {product.get('unit', 'units')}, Requested: {item['quantity']}"
-                )
+            product = products[item.product_id]
+            sent = {} if catalog_prices else item.model_dump(exclude_none=True)
+            selling_price = sent.get('selling_price', product['selling_price'])
+            cost_price = sent.get('cost_price', product['cost_price'])
             
             # Calculate item total and profit
-            item_total = item['quantity'] * item['selling_price']
-            item_profit = (item['selling_price'] - item['cost_price']) * item['quantity']
+            item_total = item.quantity * selling_price
+            item_profit = (selling_price - cost_price) * item.quantity
             
             total_amount += item_total
             total_profit += item_profit
             
             # Add to receipt items
             receipt_items.append({
-                "product_id": item['product_id'],
-                "product_name": item['product_name'],
-                "quantity": item['quantity'],
-                "unit": item.get('unit', 'kg'),
-                "selling_price": item['selling_price'],
-                "cost_price": item['cost_price'],
+                "product_id": item.product_id,
+                "product_name": sent.get('product_name', product['name']),
+                "quantity": item.quantity,
+                "unit": sent.get('unit', product.get('unit', 'kg')),
+                "selling_price": selling_price,
+                "cost_price": cost_price,
                 "total": item_total,
                 "profit": item_profit
             })
-            
-            # Update product stock
-            new_quantity = product['quantity'] - item['quantity']
-            await db.products.update_one(
-                {"id": item['product_id']},
-                {"$set": {"quantity": new_quantity}}
-            )
         
         # Create receipt
         receipt = {
@@ -420,10 +2038,52 @@ async def create_multi_item_receipt(request: dict):
             "items": receipt_items,
             "total_amount": round(total_amount, 2),
             "total_profit": round(total_profit, 2),
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": created_at
         }
         
-        await db.receipts.insert_one(receipt)
+        # Deduct stock and store the receipt all-or-nothing
+        async def write_receipt(session):
+            await deduct_stock(requested, session)
+            try:
+                await db.receipts.insert_one(dict(receipt), session=session)
+            except Exception:
+                if session is None:
+                    await restore_stock(requested)
+                raise
+        
+        try:
+            async with rollup_lock.write():
+                await run_in_transaction(write_receipt)
+                # After the commit: every checkout bumps the same day's document, which
+                # inside the transaction would make concurrent tills abort on write
+                # conflicts. A delta lost to a crash here is repaired by a rebuild.
+                await bump_committed_rollup(
+                    receipt['created_at'],
+                    receipts_count=1,
+                    receipts_amount=receipt['total_amount'],
+                    receipts_profit=receipt['total_profit']
+                )
+            product_cache.apply_stock_deltas({product_id: -quantity for product_id, quantity in requested.items()})
+            bump_versions("receipts", "products")
+        except StockConflict:
+            product_cache.invalidate()
+            # Another till sold the stock after our check; report what is left now
+            current = await db.products.find(
+                {"id": {"$in": list(requested)}},
+                {"_id": 0, "id": 1, "name": 1, "quantity": 1, "unit": 1}
+            ).to_list(len(requested))
+            for product in current:
+                if product['quantity'] < requested[product['id']]:
+                    raise insufficient_stock(product)
+            raise HTTPException(status_code=409, detail="Stock changed while saving the receipt. Please try again.")
+        
+        publish_event({
+            "type": "receipt",
+            "receipt_number": receipt_number,
+            "total_amount": receipt['total_amount'],
+            "created_at": created_at
+        })
+        await publish_stock_change(requested)
         
         return {
             "message": "Receipt created successfully",
@@ -444,6 +2104,69 @@ async def create_multi_item_receipt(request: dict):
             detail="An unexpected error occurred while creating the receipt. Please try again."
         )
 
+SYNC_MAX_RECEIPTS = 500
+
+@api_router.post("/receipts/sync")
+async def sync_queued_receipts(batch: ReceiptSync):
+    """Apply receipts a till queued while offline, reporting on each one.
+
+    Receipts are applied oldest first, so when stock has run short the sales
+    rung up earliest keep it and later ones come back rejected. Each receipt
+    is keyed by its client_id, so resending a batch whose response was lost
+    does not record anything twice. Lines are priced from the catalog at sync
+    time, not from the till's copy of the prices, which may be days old.
+    """
+    if len(batch.receipts) > SYNC_MAX_RECEIPTS:
+        raise HTTPException(status_code=413, detail=f"At most {SYNC_MAX_RECEIPTS} receipts per sync")
+    
+    now = datetime.now(timezone.utc)
+    
+    def rung_up_at(queued: QueuedReceipt) -> datetime:
+        # Trust the till's clock, but never record a sale in the future
+        if queued.created_at is None:
+            return now
+        created_at = queued.created_at
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        return min(created_at, now)
+    
+    # Load every product in the batch in one query before applying receipts
+    await product_cache.get_many({
+        item.get('product_id') for queued in batch.receipts for item in queued.items
+        if isinstance(item.get('product_id'), str)
+    })
+    
+    results = []
+    for queued in sorted(batch.receipts, key=rung_up_at):
+        body = {"items": queued.items}
+        created_at = rung_up_at(queued)
+        try:
+            result = await run_idempotent(
+                "receipts", queued.client_id, body, lambda: record_receipt(body, created_at, catalog_prices=True)
+            )
+        except HTTPException as e:
+            results.append({
+                "client_id": queued.client_id,
+                "status": "rejected",
+                "status_code": e.status_code,
+                "detail": e.detail
+            })
+            continue
+        
+        status = "created"
+        if isinstance(result, JSONResponse):
+            # Already recorded by an earlier sync
+            status = "duplicate"
+            result = json.loads(result.body)
+        results.append({"client_id": queued.client_id, "status": status, **result})
+    
+    return {
+        "results": results,
+        "created": sum(1 for r in results if r['status'] == "created"),
+        "duplicates": sum(1 for r in results if r['status'] == "duplicate"),
+        "rejected": sum(1 for r in results if r['status'] == "rejected")
+    }
+
 @api_router.get("/receipts/{receipt_id}")
 async def get_receipt_by_id(receipt_id: str):
     """Get a specific receipt by ID"""
@@ -451,31 +2174,29 @@ async def get_receipt_by_id(receipt_id: str):
     if not receipt:
         raise HTTPException(status_code=404, detail="Receipt not found")
     
-    if isinstance(receipt.get('created_at'), str):
-        receipt['created_at'] = datetime.fromisoformat(receipt['created_at'])
-    
-    return receipt
+    # Same encoding as GET /receipts, so created_at has the same Z form
+    return fast_json(receipt)
 
 @api_router.get("/receipts/summary/totals")
 async def get_receipts_summary():
     """Calculate total receipts amount"""
-    all_receipts = await db.receipts.find({}, {"_id": 0}).to_list(10000)
-    
-    total_receipts = len(all_receipts)
-    total_amount = sum(receipt.get('total_amount', 0) for receipt in all_receipts)
-    total_profit = sum(receipt.get('total_profit', 0) for receipt in all_receipts)
-    
-    # Get today's receipts
-    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    today_iso = today.isoformat()
+    receipt_fields = ["receipts_count", "receipts_amount", "receipts_profit"]
+    # All-time and today's totals are read concurrently
+    totals, today = await asyncio.gather(
+        sum_daily_rollups(fields=receipt_fields),
+        db.daily_rollups.find_one(
+            {"_id": rollup_day(datetime.now(timezone.utc))},
+            {field: 1 for field in receipt_fields}
+        )
+    )
+    today = today or {}
     
-    today_receipts = await db.receipts.find(
-        {"created_at": {"$gte": today_iso}},
-        {"_id": 0}
-    ).to_list(10000)
+    total_receipts = totals['receipts_count']
+    total_amount = totals['receipts_amount']
+    total_profit = totals['receipts_profit']
     
-    today_total = sum(receipt.get('total_amount', 0) for receipt in today_receipts)
-    today_count = len(today_receipts)
+    today_total = today.get('receipts_amount', 0)
+    today_count = today.get('receipts_count', 0)
     
     return {
         "total_receipts": total_receipts,
@@ -486,35 +2207,919 @@ async def get_receipts_summary():
     }
 
 
+# Reports
+TIMESERIES_MAX_BUCKETS = 2000
+BUCKET_UNITS = ("hour", "day", "week", "month")
+
+def bucket_start(value: datetime, unit: str) -> datetime:
+    """Start of the UTC hour, day, week (from Monday) or month containing value"""
+    value = value.astimezone(timezone.utc) if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    value = value.replace(minute=0, second=0, microsecond=0)
+    if unit == "hour":
+        return value
+    value = value.replace(hour=0)
+    if unit == "week":
+        return value - timedelta(days=value.weekday())
+    if unit == "month":
+        return value.replace(day=1)
+    return value
+
+def next_bucket(start: datetime, unit: str) -> datetime:
+    if unit == "hour":
+        return start + timedelta(hours=1)
+    if unit == "day":
+        return start + timedelta(days=1)
+    if unit == "week":
+        return start + timedelta(weeks=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def bucket_expression(unit: str) -> dict:
+    # Same boundaries as bucket_start; weeks start on Monday like ISO weeks
+    return {"$dateTrunc": {"date": "$sale_date", "unit": unit, "startOfWeek": "monday"}}
+
+class VersionedCache:
+    """Report results keyed by their query parameters.
+
+    An entry is served while the collection versions it was computed at are
+    unchanged and it is younger than the TTL, which bounds staleness from
+    writes made by other processes.
+    """
+    
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+    
+    def get(self, key: tuple, versions: tuple):
+        entry = self._entries.get(key)
+        if entry and entry[0] == versions and time.monotonic() - entry[1] < self.ttl:
+            self.hits += 1
+            return entry[2]
+        self.misses += 1
+        return None
+    
+    def put(self, key: tuple, versions: tuple, result):
+        self._entries.pop(key, None)
+        if len(self._entries) >= self.max_entries:
+            del self._entries[next(iter(self._entries))]  # Oldest first
+        self._entries[key] = (versions, time.monotonic(), result)
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "cached_results": len(self._entries),
+            "ttl_seconds": self.ttl,
+        }
+
+# Closed buckets only change when a sale lands in one (sales_history) or, for
+# group_by=category, when products change category (categories); both are
+# shared versions, so every worker drops its entries after such a write.
+timeseries_cache = VersionedCache(
+    ttl=float(os.environ.get('TIMESERIES_CACHE_TTL', '600')),
+    max_entries=int(os.environ.get('TIMESERIES_CACHE_SIZE', '50000'))
+)
+
+def timeseries_versions(group_by: Optional[str]) -> tuple:
+    if group_by == "category":
+        return collection_version("sales_history"), collection_version("categories")
+    return (collection_version("sales_history"),)
+
+def bump_sales_history(sale_date: datetime):
+    """Bump sales_history when a sale lands in an hour that has already closed"""
+    if bucket_start(sale_date, "hour") < bucket_start(datetime.now(timezone.utc), "hour"):
+        bump_versions("sales_history")
+
+async def aggregate_timeseries(start: datetime, end: datetime, unit: str, group_by: Optional[str]) -> dict:
+    """{bucket start: rows} for sales in [start, end), from one aggregation"""
+    pipeline = [{"$match": {"sale_date": {"$gte": start, "$lt": end}}}]
+    key = None
+    if group_by == "product":
+        key = "$product_id"
+    elif group_by == "category":
+        # Categories live on the product; sales of deleted products count as "unknown"
+        pipeline += [
+            {"$lookup": {"from": "products", "localField": "product_id", "foreignField": "id", "as": "product"}},
+            {"$set": {"category": {"$ifNull": [{"$arrayElemAt": ["$product.category", 0]}, "unknown"]}}},
+        ]
+        key = "$category"
+    pipeline.append({"$group": {
+        "_id": {"start": bucket_expression(unit), "key": key},
+        "name": {"$first": "$product_name" if group_by == "product" else key},
+        "revenue": {"$sum": "$total_amount"},
+        "profit": {"$sum": "$profit"},
+        "quantity": {"$sum": "$quantity"},
+        "count": {"$sum": 1},
+    }})
+    
+    buckets = {}
+    async for row in db.sales.aggregate(pipeline):
+        bucket = bucket_start(row['_id']['start'], unit)
+        entry = {
+            "revenue": round(row['revenue'], 2),
+            "profit": round(row['profit'], 2),
+            "quantity": row['quantity'],
+            "count": row['count'],
+        }
+        if group_by:
+            entry = {"key": row['_id']['key'], "name": row['name'], **entry}
+        buckets.setdefault(bucket, []).append(entry)
+    for rows in buckets.values():
+        rows.sort(key=lambda entry: -entry['revenue'])
+    return buckets
+
+@api_router.get("/reports/timeseries")
+async def get_sales_timeseries(
+    start: datetime = Query(..., alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    bucket: Literal["hour", "day", "week", "month"] = "day",
+    group_by: Optional[Literal["product", "category"]] = None
+):
+    """Sales revenue, profit, quantity and count per UTC time bucket in [from, to).
+
+    from is rounded down to the start of its bucket and to defaults to now.
+    Every bucket in the range is listed, empty ones with zeros. With group_by
+    each bucket also carries a row per product or category, highest revenue
+    first. Buckets that have closed are served from a cache, so only the
+    buckets that were never requested before, or are still open, reach
+    MongoDB, in one aggregation.
+    """
+    now = datetime.now(timezone.utc)
+    if end is None:
+        end = now
+    elif end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    start = bucket_start(start, bucket)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+    
+    starts = [start]
+    while next_bucket(starts[-1], bucket) < end:
+        starts.append(next_bucket(starts[-1], bucket))
+        if len(starts) > TIMESERIES_MAX_BUCKETS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {TIMESERIES_MAX_BUCKETS} buckets per request; use a larger bucket"
+            )
+    
+    # Closed: ended before the current bucket began, and not cut short by 'to'
+    open_since = bucket_start(now, bucket)
+    def closed(bucket_from: datetime) -> bool:
+        bucket_to = next_bucket(bucket_from, bucket)
+        return bucket_to <= open_since and bucket_to <= end
+    
+    grouping = group_by or ""
+    versions = timeseries_versions(group_by)  # Read before the data they label
+    rows_by_start = {}
+    query_from = None
+    for bucket_from in starts:
+        rows = timeseries_cache.get((bucket, grouping, bucket_from), versions) if closed(bucket_from) else None
+        if rows is None:
+            query_from = bucket_from
+            break
+        rows_by_start[bucket_from] = rows
+    
+    if query_from is not None:
+        fetched = await aggregate_timeseries(query_from, end, bucket, group_by)
+        for bucket_from in starts:
+            if bucket_from >= query_from:
+                rows_by_start[bucket_from] = fetched.get(bucket_from, [])
+                if closed(bucket_from):
+                    timeseries_cache.put((bucket, grouping, bucket_from), versions, rows_by_start[bucket_from])
+    
+    series = []
+    for bucket_from in starts:
+        rows = rows_by_start[bucket_from]
+        point = {
+            "start": bucket_from,
+            "revenue": round(sum(row['revenue'] for row in rows), 2),
+            "profit": round(sum(row['profit'] for row in rows), 2),
+            "quantity": sum(row['quantity'] for row in rows),
+            "count": sum(row['count'] for row in rows),
+        }
+        if group_by:
+            point["groups"] = rows
+        series.append(point)
+    
+    return fast_json({"from": start, "to": end, "bucket": bucket, "group_by": group_by, "series": series})
+
+
+# Product Analytics
+# Rankings are computed inside MongoDB: receipt lines are unwound and unioned
+# with single-product sales, then grouped per product, sorted and cut to the
+# top N, so only N rows ever reach Python.
+ANALYTICS_SORTS = ("revenue", "profit", "units", "margin")
+ANALYTICS_MAX_LIMIT = 100
+
+analytics_cache = VersionedCache(
+    ttl=float(os.environ.get('ANALYTICS_CACHE_TTL', '30')),
+    max_entries=int(os.environ.get('ANALYTICS_CACHE_SIZE', '256'))
+)
+
+def analytics_line_stages(source: str, start: datetime, end: datetime, product_ids: Optional[list]) -> list:
+    """Stages turning receipts or sales into {product_id, name, quantity, revenue, profit} lines"""
+    if source == "receipts":
+        match = {"created_at": {"$gte": start, "$lt": end}}
+        if product_ids is not None:
+            match["items.product_id"] = {"$in": product_ids}
+        stages = [{"$match": match}, {"$unwind": "$items"}]
+        if product_ids is not None:
+            # The receipt matched on one of its lines; drop its other lines
+            stages.append({"$match": {"items.product_id": {"$in": product_ids}}})
+        return stages + [{"$project": {
+            "_id": 0,
+            "product_id": "$items.product_id",
+            "name": "$items.product_name",
+            "quantity": "$items.quantity",
+            "revenue": "$items.total",
+            "profit": "$items.profit",
+        }}]
+    
+    match = {"sale_date": {"$gte": start, "$lt": end}}
+    if product_ids is not None:
+        match["product_id"] = {"$in": product_ids}
+    return [{"$match": match}, {"$project": {
+        "_id": 0,
+        "product_id": 1,
+        "name": "$product_name",
+        "quantity": 1,
+        "revenue": "$total_amount",
+        "profit": 1,
+    }}]
+
+async def aggregate_product_analytics(
+    start: datetime, end: datetime, sort: str, limit: int, source: str, product_ids: Optional[list]
+) -> list:
+    if source == "all":
+        pipeline = analytics_line_stages("receipts", start, end, product_ids) + [
+            {"$unionWith": {"coll": "sales", "pipeline": analytics_line_stages("sales", start, end, product_ids)}}
+        ]
+        collection = db.receipts
+    else:
+        pipeline = analytics_line_stages(source, start, end, product_ids)
+        collection = db[source]
+    pipeline += [
+        {"$group": {
+            "_id": "$product_id",
+            "name": {"$last": "$name"},
+            "revenue": {"$sum": "$revenue"},
+            "profit": {"$sum": "$profit"},
+            "units": {"$sum": "$quantity"},
+            "lines": {"$sum": 1},
+        }},
+        {"$set": {"margin": {"$cond": [
+            {"$gt": ["$revenue", 0]}, {"$multiply": [{"$divide": ["$profit", "$revenue"]}, 100]}, None
+        ]}}},
+        {"$sort": {sort: -1, "_id": 1}},
+        {"$limit": limit},
+    ]
+    
+    rows = await collection.aggregate(pipeline, allowDiskUse=True).to_list(limit)
+    # Lines keep the name a product had when sold; show the current one, and
+    # a line's name only for a product deleted since
+    catalog = await product_cache.get_many([row['_id'] for row in rows])
+    return [{
+        "product_id": row['_id'],
+        "name": catalog[row['_id']]['name'] if row['_id'] in catalog else row['name'],
+        "revenue": round(row['revenue'], 2),
+        "profit": round(row['profit'], 2),
+        "units": row['units'],
+        "lines": row['lines'],
+        "margin": round(row['margin'], 2) if row['margin'] is not None else None,
+    } for row in rows]
+
+@api_router.get("/analytics/products")
+async def get_product_analytics(
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    sort: Literal["revenue", "profit", "units", "margin"] = "revenue",
+    limit: int = Query(10, ge=1, le=ANALYTICS_MAX_LIMIT),
+    source: Literal["all", "receipts", "sales"] = "all",
+    category: Optional[str] = None
+):
+    """Top products in [from, to) by revenue, profit, units sold or margin %.
+
+    from defaults to 30 days ago and to to now. Receipt line items and
+    single-product sales are both counted unless source narrows it to one.
+    margin is profit as a percentage of revenue. Results are cached until
+    the next write to sales, receipts or products.
+    """
+    # Keyed by the parameters as given; an omitted bound follows the clock,
+    # and the TTL bounds how far it drifts between writes
+    key = (start, end, sort, limit, source, category)
+    now = datetime.now(timezone.utc)
+    end = end or now
+    start = start or now - timedelta(days=30)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+    
+    versions = tuple(collection_version(name) for name in ("sales", "receipts", "products"))
+    products = analytics_cache.get(key, versions)
+    if products is None:
+        product_ids = await db.products.distinct("id", {"category": category}) if category else None
+        products = await aggregate_product_analytics(start, end, sort, limit, source, product_ids)
+        analytics_cache.put(key, versions, products)
+    
+    return fast_json({
+        "from": start, "to": end, "sort": sort, "source": source, "category": category, "products": products
+    })
+
+
+# Export Routes
+EXPORT_BATCH_SIZE = 1000
+EXPORTS = {
+    "sales": ("sale_date", [
+        "id", "receipt_number", "sale_date", "product_id", "product_name",
+        "quantity", "cost_price", "selling_price", "total_amount", "profit", "created_at",
+    ]),
+    "expenses": ("expense_date", [
+        "id", "expense_date", "description", "amount", "created_at",
+    ]),
+    # One CSV row per receipt line; NDJSON keeps the items array intact
+    "receipts": ("created_at", [
+        "id", "receipt_number", "created_at", "total_amount", "total_profit",
+        "product_id", "product_name", "quantity", "unit", "selling_price", "cost_price", "total", "profit",
+    ]),
+}
+RECEIPT_EXPORT_FIELDS = ["id", "receipt_number", "created_at", "total_amount", "total_profit"]
+
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+async def _export_chunks(kind: str, query: dict, fmt: str):
+    """Yield the export one cursor batch at a time, so memory stays flat"""
+    date_field, columns = EXPORTS[kind]
+    cursor = db[kind].find(query, {"_id": 0}).sort(date_field, ASCENDING).batch_size(EXPORT_BATCH_SIZE)
+    
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    if fmt == "csv":
+        writer.writeheader()
+    rows = 0
+    async for doc in cursor:
+        if fmt == "ndjson":
+            buffer.write(json.dumps(doc, default=_export_value))
+            buffer.write("\n")
+        elif kind == "receipts":
+            header = {field: _export_value(doc.get(field)) for field in RECEIPT_EXPORT_FIELDS}
+            for item in doc.get('items', []):
+                writer.writerow({**header, **item})
+        else:
+            writer.writerow({field: _export_value(doc.get(field)) for field in columns})
+        
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@api_router.get("/export/{kind}")
+async def export_data(
+    kind: Literal["sales", "expenses", "receipts"],
+    fmt: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+):
+    """Stream sales, expenses or receipts in a date range as NDJSON or CSV"""
+    query = date_range_filter(EXPORTS[kind][0], start_date, end_date)
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _export_chunks(kind, query, fmt),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{kind}.{fmt}"'}
+    )
+
+
+# Year-End Archive
+# Closing a period moves its sales, receipts and expenses out of the hot
+# collections into one archive per year or month, so the hot collections and
+# their indexes only hold recent history. Daily rollups stay behind, so the
+# all-time and per-day summaries still include archived days.
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '1000'))
+ARCHIVE_DIR = Path(os.environ.get('ARCHIVE_DIR', str(ROOT_DIR / 'archive')))
+ARCHIVED_COLLECTIONS = ("sales", "receipts", "expenses")
+
+def archive_name(value: datetime, period: str) -> str:
+    return value.strftime('%Y') if period == "year" else value.strftime('%Y-%m')
+
+def append_archive_file(path: Path, docs: list):
+    """Append docs as NDJSON to a gzip file; each call adds one gzip member"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(path, "at", encoding="utf-8") as fh:
+        for doc in docs:
+            fh.write(json.dumps(doc, default=_export_value))
+            fh.write("\n")
+
+async def archive_collection(kind: str, before: datetime, period: str, target: str) -> dict:
+    """Move documents dated before the cutoff out of kind, one batch at a time.
+
+    Each batch is copied to its archive first and deleted from the hot
+    collection after, so an interrupted run loses nothing and can simply be
+    run again. Archive collections upsert by _id and so stay exact; archive
+    files may then repeat a batch, which readers drop by id.
+    Returns {archive name: documents moved}.
+    """
+    date_field = EXPORTS[kind][0]
+    moved = {}
+    indexed = set()
+    while True:
+        batch = await db[kind].find({date_field: {"$lt": before}}).sort(
+            date_field, ASCENDING
+        ).limit(ARCHIVE_BATCH_SIZE).to_list(ARCHIVE_BATCH_SIZE)
+        if not batch:
+            return moved
+        
+        by_name = {}
+        for doc in batch:
+            by_name.setdefault(archive_name(doc[date_field], period), []).append(doc)
+        for name, docs in by_name.items():
+            if target == "collection":
+                archive = db[f"{kind}_archive_{name}"]
+                if name not in indexed:
+                    await archive.create_indexes([
+                        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+                        IndexModel([(date_field, DESCENDING), ("id", DESCENDING)], name=f"{date_field}_id_desc"),
+                    ])
+                    indexed.add(name)
+                await archive.bulk_write(
+                    [ReplaceOne({"_id": doc['_id']}, doc, upsert=True) for doc in docs], ordered=False
+                )
+                location = archive.name
+            else:
+                path = ARCHIVE_DIR / f"{kind}-{name}.ndjson.gz"
+                await asyncio.to_thread(
+                    append_archive_file, path, [{k: v for k, v in doc.items() if k != '_id'} for doc in docs]
+                )
+                location = str(path)
+            moved[location] = moved.get(location, 0) + len(docs)
+        
+        await db[kind].delete_many({"_id": {"$in": [doc['_id'] for doc in batch]}})
+
+@api_router.post("/archive")
+async def archive_before_cutoff(
+    before: datetime,
+    period: Literal["year", "month"] = "year",
+    target: Literal["collection", "file"] = "collection"
+):
+    """Year-end close: archive sales, receipts and expenses dated before 'before'.
+
+    The cutoff is rounded down to midnight UTC, so every day is either fully
+    archived or fully hot and its rollup stays exact. With target=collection
+    documents go to e.g. sales_archive_2025; with target=file they are
+    appended to gzip-compressed NDJSON files such as sales-2025.ndjson.gz in
+    ARCHIVE_DIR. Products are never archived.
+    """
+    before = bucket_start(before, "day")
+    if before > bucket_start(datetime.now(timezone.utc), "day"):
+        raise HTTPException(status_code=400, detail="Only days that have ended can be archived")
+    
+    with worker_lock("archive") as acquired:
+        if not acquired:
+            raise HTTPException(status_code=409, detail="An archive run is already in progress")
+        run = {
+            "_id": str(uuid.uuid4()),
+            "before": before,
+            "period": period,
+            "target": target,
+            "started_at": datetime.now(timezone.utc),
+        }
+        await db.archive_runs.insert_one(dict(run))
+        moved = {}
+        try:
+            for kind in ARCHIVED_COLLECTIONS:
+                moved[kind] = await archive_collection(kind, before, period, target)
+        finally:
+            # Shared versions, so every worker's caches and ETags move on, even
+            # when the run comes from manage.py in a process of its own
+            bump_versions(*ARCHIVED_COLLECTIONS, "sales_history")
+            publish_resync()
+        
+        run['finished_at'] = datetime.now(timezone.utc)
+        run['moved'] = {kind: sum(counts.values()) for kind, counts in moved.items()}
+        await db.archive_runs.update_one(
+            {"_id": run['_id']}, {"$set": {"finished_at": run['finished_at'], "moved": run['moved']}}
+        )
+    
+    logger.info(f"Archived before {before.date()}: {run['moved']}")
+    return {**run, "archives": moved}
+
+@api_router.get("/archive")
+async def get_archives():
+    """Past archive runs, newest first, and the archives they wrote"""
+    runs = await db.archive_runs.find().sort("started_at", DESCENDING).to_list(100)
+    names = await db.list_collection_names(filter={"name": {"$regex": "_archive_"}})
+    collections = {name: await db[name].estimated_document_count() for name in sorted(names)}
+    files = {
+        path.name: path.stat().st_size for path in sorted(ARCHIVE_DIR.glob("*.ndjson.gz"))
+    } if ARCHIVE_DIR.is_dir() else {}
+    return fast_json({"runs": runs, "collections": collections, "files": files})
+
+
+# Cache Stats
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters for the in-process caches"""
+    return {
+        "products": product_cache.stats(),
+        "timeseries": timeseries_cache.stats(),
+        "analytics": analytics_cache.stats(),
+    }
+
+
+# Health Checks
+# /health is liveness: the process is serving requests. /ready is readiness:
+# startup has finished, MongoDB answers within READY_TIMEOUT_SECONDS and
+# every index exists, so a load balancer only routes traffic here after that.
+READY_TIMEOUT_SECONDS = float(os.environ.get('READY_TIMEOUT_SECONDS', '2'))
+
+@api_router.get("/health")
+async def health():
+    return {"status": "ok"}
+
+@api_router.get("/ready")
+async def readiness():
+    checks = {"startup": "ok" if getattr(app.state, "started", False) else "pending"}
+    try:
+        await asyncio.wait_for(db.command("ping"), READY_TIMEOUT_SECONDS)
+        checks["database"] = "ok"
+        missing = await asyncio.wait_for(missing_indexes(), READY_TIMEOUT_SECONDS)
+        checks["indexes"] = "ok" if not missing else f"missing {missing}"
+    except Exception as e:
+        checks["database"] = f"unreachable: {type(e).__name__}"
+    ready = all(check == "ok" for check in checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not ready", "checks": checks}
+    )
+
+
 # Reset All Data
 @api_router.delete("/reset-all-data")
 async def reset_all_data():
-    """Delete all products, sales, and expenses - use with caution!"""
+    """Delete all products, sales, expenses and receipts - use with caution!
+
+    The collections are dropped rather than emptied document by document,
+    which takes the same short time at any size, and their indexes are then
+    recreated. Stored idempotency keys go too, so a retried key cannot replay
+    a sale or receipt that no longer exists. Archives are kept.
+    """
     try:
-        # Delete all collections
-        await db.products.delete_many({})
-        await db.sales.delete_many({})
-        await db.expenses.delete_many({})
+        await asyncio.gather(*(
+            db[collection].drop()
+            for collection in ("products", "sales", "expenses", "receipts", "daily_rollups", "idempotency_keys")
+        ))
+        await ensure_indexes()
+        product_cache.invalidate()
+        bump_versions("products", "sales", "expenses", "receipts", "sales_history", "categories")
+        publish_resync()
         
         return {
             "message": "All data has been reset successfully",
             "products_deleted": True,
             "sales_deleted": True,
-            "expenses_deleted": True
+            "expenses_deleted": True,
+            "receipts_deleted": True
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error resetting data: {str(e)}")
 
 
+# Request Metrics
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', '1.0'))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Prometheus-style histogram keyed by a tuple of label values"""
+    
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [count per bucket..., overflow, sum]
+    
+    def observe(self, labels: tuple, value: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+    
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            label_text = ",".join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Time to serve a request", ("method", "route", "status")
+)
+request_db_time = Histogram(
+    "http_request_db_seconds", "MongoDB time spent by a request", ("method", "route", "status")
+)
+request_queries = {}  # (method, route) -> MongoDB commands issued
+streamed_responses = {}  # (method, route, status) -> streamed responses, kept out of the histograms
+
+def query_breakdown(queries: list) -> str:
+    """'find products x3 12.1ms, ...' grouped by command and collection, slowest first"""
+    grouped = {}
+    for command, collection, seconds in queries:
+        entry = grouped.setdefault(f"{command} {collection}".strip(), [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+    return ", ".join(
+        f"{name} x{count} {seconds * 1000:.1f}ms"
+        for name, (count, seconds) in sorted(grouped.items(), key=lambda item: -item[1][1])
+    )
+
+class RequestMetricsMiddleware:
+    """Times each request and its MongoDB commands.
+
+    Adds a Server-Timing header (db time and query count, total time up to
+    the headers), feeds the /api/metrics histograms and logs requests slower
+    than SLOW_REQUEST_SECONDS with their query breakdown. DB time is summed
+    over commands, so queries run with asyncio.gather can add up to more than
+    the total. Streamed responses (the dashboard event stream, exports) are
+    detected as the compression middleware does, by a first body chunk with
+    more to come: their header reflects the time to the first byte, and they
+    are only counted, since an event stream open for minutes would swamp the
+    latency histograms.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        queries = []
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        status = 500
+        streamed = None
+        
+        async def send_with_timing(message):
+            nonlocal status, streamed
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                total_ms = (time.perf_counter() - started) * 1000
+                db_ms = sum(seconds for _, _, seconds in queries) * 1000
+                MutableHeaders(scope=message).append(
+                    "Server-Timing", f'db;dur={db_ms:.1f};desc="{len(queries)} queries", app;dur={total_ms:.1f}'
+                )
+            elif message["type"] == "http.response.body" and streamed is None:
+                streamed = message.get("more_body", False)
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_queries.reset(token)
+            elapsed = time.perf_counter() - started
+            db_seconds = sum(seconds for _, _, seconds in queries)
+            # The route template, not the raw path, keeps the label set small
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            labels = (scope["method"], path, str(status))
+            request_queries[labels[:2]] = request_queries.get(labels[:2], 0) + len(queries)
+            if streamed:
+                streamed_responses[labels] = streamed_responses.get(labels, 0) + 1
+            else:
+                request_duration.observe(labels, elapsed)
+                request_db_time.observe(labels, db_seconds)
+                if elapsed >= SLOW_REQUEST_SECONDS:
+                    logger.warning(
+                        f"Slow request: {scope['method']} {scope['path']} {status} {elapsed * 1000:.0f}ms, "
+                        f"{len(queries)} queries {db_seconds * 1000:.0f}ms: {query_breakdown(queries) or 'none'}"
+                    )
+
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Request and MongoDB metrics in the Prometheus text format"""
+    lines = request_duration.render() + request_db_time.render()
+    
+    lines += ["# HELP http_request_queries_total MongoDB commands issued by requests",
+              "# TYPE http_request_queries_total counter"]
+    for (method, route), count in sorted(request_queries.items()):
+        lines.append(f'http_request_queries_total{{method="{method}",route="{route}"}} {count}')
+    lines += ["# HELP http_streamed_responses_total Streamed responses, not timed in the histograms",
+              "# TYPE http_streamed_responses_total counter"]
+    for (method, route, status), count in sorted(streamed_responses.items()):
+        lines.append(f'http_streamed_responses_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+    
+    with query_listener._lock:
+        totals = sorted(query_listener.totals.items())
+    for metric, index, help_text in (
+        ("mongodb_commands_total", 0, "MongoDB commands completed"),
+        ("mongodb_command_seconds_total", 1, "Time spent in MongoDB commands"),
+        ("mongodb_command_failures_total", 2, "MongoDB commands that failed"),
+    ):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        for (command, collection), values in totals:
+            lines.append(f'{metric}{{command="{command}",collection="{collection}"}} {values[index]}')
+    
+    cache = product_cache.stats()
+    lines += [
+        "# TYPE product_cache_hits_total counter", f"product_cache_hits_total {cache['hits']}",
+        "# TYPE product_cache_misses_total counter", f"product_cache_misses_total {cache['misses']}",
+        "# TYPE dashboard_stream_subscribers gauge", f"dashboard_stream_subscribers {len(event_hub._subscribers)}",
+    ]
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+
+# Rate Limiting
+# At most RATE_LIMIT_PER_MINUTE requests per client address per minute,
+# counted in shared fixed windows so the limit holds however many workers
+# serve the client. Addresses hash into RATE_LIMIT_BUCKETS counters; two
+# clients that share one just share the allowance. 0 turns it off.
+RATE_LIMIT_PER_MINUTE = int(os.environ.get('RATE_LIMIT_PER_MINUTE', '0'))
+RATE_LIMIT_BUCKETS = (SHARED_COUNTER_SLOTS - RATE_LIMIT_FIRST_SLOT) // 2
+# Behind a proxy every request comes from the proxy; use its X-Forwarded-For
+RATE_LIMIT_TRUST_FORWARDED = os.environ.get('RATE_LIMIT_TRUST_FORWARDED', '').lower() in ("1", "true", "yes")
+RATE_LIMIT_EXEMPT = {"/api/health", "/api/ready", "/api/metrics", "/api/dashboard/stream"}
+
+class RateLimitMiddleware:
+    """Answers 429 with Retry-After once a client exceeds its per-minute allowance"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    def client_address(self, scope) -> str:
+        if RATE_LIMIT_TRUST_FORWARDED:
+            for name, value in scope["headers"]:
+                if name == b"x-forwarded-for":
+                    return value.decode("latin-1").split(",")[0].strip()
+        return scope["client"][0] if scope.get("client") else ""
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or RATE_LIMIT_PER_MINUTE <= 0 or scope["path"] in RATE_LIMIT_EXEMPT:
+            return await self.app(scope, receive, send)
+        
+        now = time.time()
+        bucket = zlib.crc32(self.client_address(scope).encode()) % RATE_LIMIT_BUCKETS
+        hits = shared_counters.count_in_window(RATE_LIMIT_FIRST_SLOT + 2 * bucket, int(now // 60))
+        if hits > RATE_LIMIT_PER_MINUTE:
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Too many requests. Please slow down."},
+                headers={"Retry-After": str(60 - int(now) % 60)}
+            )
+            return await response(scope, receive, send)
+        await self.app(scope, receive, send)
+
+
+# Response Compression
+# Lists are repetitive JSON that tablets fetch over mobile data. Complete
+# responses of an allowed type and at least COMPRESSION_MIN_SIZE bytes are
+# sent with Brotli or gzip, whichever the client ranks higher (Brotli on a
+# tie). Streaming responses, i.e. the dashboard event stream and exports,
+# pass through untouched: they flush as they go, and buffering them to
+# compress would hold their data back.
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSION_TYPES = {
+    media_type.strip()
+    for media_type in os.environ.get('COMPRESSION_TYPES', 'application/json,text/plain,text/csv').split(',')
+    if media_type.strip()
+}
+COMPRESSION_ENCODINGS = [
+    encoding.strip()
+    for encoding in os.environ.get('COMPRESSION_ENCODINGS', 'br,gzip').split(',')
+    if encoding.strip() == "gzip" or (encoding.strip() == "br" and brotli is not None)
+]
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '4'))
+# Larger bodies are compressed on a worker thread so the event loop keeps serving
+COMPRESSION_THREAD_SIZE = 256 * 1024
+
+def preferred_encoding(accept_encoding: str) -> Optional[str]:
+    """The encoding in COMPRESSION_ENCODINGS with the highest q-value in Accept-Encoding"""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in COMPRESSION_ENCODINGS:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+class CompressionMiddleware:
+    """Compresses complete responses as described above.
+
+    A compressed response gets Content-Encoding, a new Content-Length and a
+    weak ETag, since its bytes differ from the uncompressed representation;
+    not_modified compares tags weakly, so either form revalidates. Every
+    compressible response carries Vary: Accept-Encoding, and the time spent
+    is reported in Server-Timing.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENCODINGS:
+            return await self.app(scope, receive, send)
+        
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+        encoding = preferred_encoding(accept_encoding) if accept_encoding else None
+        held_start = None
+        
+        async def send_compressed(message):
+            nonlocal held_start
+            if message["type"] == "http.response.start":
+                held_start = message  # Headers depend on the body; hold them until it arrives
+                return
+            if held_start is None or message["type"] != "http.response.body":
+                return await send(message)
+            
+            start, held_start = held_start, None
+            headers = MutableHeaders(scope=start)
+            body = message.get("body", b"")
+            media_type = headers.get("content-type", "").split(";")[0].strip()
+            if (
+                message.get("more_body", False)
+                or media_type not in COMPRESSION_TYPES
+                or "content-encoding" in headers
+                or start["status"] < 200 or start["status"] in (204, 304)
+            ):
+                await send(start)
+                return await send(message)
+            
+            headers.add_vary_header("Accept-Encoding")
+            if encoding and len(body) >= COMPRESSION_MIN_SIZE:
+                started = time.perf_counter()
+                if len(body) >= COMPRESSION_THREAD_SIZE:
+                    compressed = await asyncio.to_thread(compress_body, body, encoding)
+                else:
+                    compressed = compress_body(body, encoding)
+                if len(compressed) < len(body):
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(compressed))
+                    etag = headers.get("etag")
+                    if etag and not etag.startswith("W/"):
+                        headers["ETag"] = f"W/{etag}"
+                    headers.append(
+                        "Server-Timing",
+                        f'compress;dur={elapsed_ms:.1f};desc="{encoding} {len(body)}>{len(compressed)}"'
+                    )
+                    message = {**message, "body": compressed}
+            await send(start)
+            await send(message)
+        
+        await self.app(scope, receive, send_compressed)
+
+
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(RequestMetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Idempotent-Replayed", "Server-Timing"],
 )
 
 # Configure logging
@@ -524,6 +3129,84 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+MONGO_WARMUP_CONNECTIONS = int(os.environ.get('MONGO_WARMUP_CONNECTIONS', str(MONGO_POOL_OPTIONS["minPoolSize"])))
+
+async def warm_up():
+    """Open pool connections and load the catalog before the first request.
+
+    Concurrent pings each hold a connection, so the pool has
+    MONGO_WARMUP_CONNECTIONS open sockets when they return; minPoolSize keeps
+    it topped up from then on. The first sale after a restart then pays for
+    neither the TCP/TLS handshakes nor the catalog load.
+    """
+    started = time.perf_counter()
+    await db.command("ping")
+    await asyncio.gather(*(db.command("ping") for _ in range(max(0, MONGO_WARMUP_CONNECTIONS - 1))))
+    await transactions_supported()
+    await product_cache.all()
+    logger.info(
+        f"Warmed up {MONGO_WARMUP_CONNECTIONS} MongoDB connection(s) and the product cache "
+        f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+    )
+
+async def create_indexes():
+    report = await ensure_indexes()
+    for collection, result in report.items():
+        logger.info(
+            f"Indexes on {collection}: created {result['created'] or 'none'}, "
+            f"already present {result['present'] or 'none'}"
+        )
+
+async def backfill_reorder_thresholds():
+    backfilled = await backfill_stock_margins()
+    if backfilled:
+        logger.info(f"Set the default reorder threshold on {backfilled} products")
+
+async def check_string_dates():
+    pending = {collection: count for collection, count in (await count_string_dates()).items() if count}
+    if pending:
+        logger.warning(
+            f"Documents with ISO string dates: {pending}. "
+            "Run 'python manage.py migrate-dates' to convert them."
+        )
+
+async def ensure_daily_rollups():
+    # Totals read from daily_rollups; fill it once when upgrading a shop that has history
+    if await db.daily_rollups.find_one({}, {"_id": 1}):
+        return
+    if not any(await asyncio.gather(*(
+        db[collection].find_one({}, {"_id": 1}) for collection in ("sales", "receipts", "expenses")
+    ))):
+        return
+    with worker_lock("rollups") as acquired:
+        if acquired:  # Another worker starting alongside is already building them
+            days = await rebuild_daily_rollups()
+            logger.info(f"Built daily rollups for {days} days from the existing history")
+
+async def start_change_stream():
+    # Change streams need a replica set; standalone servers publish from the routes
+    if await transactions_supported():
+        app.state.change_stream_task = asyncio.create_task(relay_change_stream())
+
+async def startup():
+    app.state.started = False
+    await worker_bus.start()
+    await create_indexes()
+    await backfill_reorder_thresholds()
+    await check_string_dates()
+    await ensure_daily_rollups()
+    await warm_up()
+    await start_change_stream()
+    app.state.started = True
+
+async def shutdown():
+    app.state.started = False
+    task = getattr(app.state, "change_stream_task", None)
+    if task:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    worker_bus.stop()
+    client.close()
@@ -0,0 +1,53 @@
+import axios from "axios";
+
+// Responses kept for conditional GETs, keyed by URL + params.
+// Map insertion order doubles as LRU order.
+const MAX_ENTRIES = 50;
+const etagCache = new Map();
+
+/**
+ * GET that revalidates with If-None-Match. When the server answers
+ * 304 Not Modified the previously received data and headers are returned,
+ * so callers can treat the result like a normal axios response.
+ */
+export async function getWithETag(url, config = {}) {
+  const key = `${url}?${new URLSearchParams(config.params || {}).toString()}`;
+  const cached = etagCache.get(key);
+
+  const response = await axios.get(url, {
+    ...config,
+    headers: {
+      ...config.headers,
+      ...(cached && { "If-None-Match": cached.etag }),
+    },
+    validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+  });
+
+  if (response.status === 304 && cached) {
+    etagCache.delete(key);
+    etagCache.set(key, cached);
+    return { ...response, status: 200, data: cached.data, headers: cached.headers };
+  }
+
+  const etag = response.headers.etag;
+  if (etag) {
+    etagCache.delete(key);
+    etagCache.set(key, { etag, data: response.data, headers: response.headers });
+    if (etagCache.size > MAX_ENTRIES) {
+      etagCache.delete(etagCache.keys().next().value);
+    }
+  }
+  return response;
+}
+
+/**
+ * Fresh value for the Idempotency-Key header. Reuse the same key when
+ * retrying a POST so the server replays the first result instead of
+ * recording the sale twice.
+ */
+export function newIdempotencyKey() {
+  if (window.crypto?.randomUUID) {
+    return window.crypto.randomUUID();
+  }
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
@@ -0,0 +1,93 @@
+import axios from "axios";
+
+// Receipts rung up at the till wait here until /receipts/sync accepts them,
+// so checkout never waits on the network and survives the link dropping.
+const DB_NAME = "omrans-till";
+const STORE = "queued_receipts";
+const SYNC_BATCH_SIZE = 100;
+
+let dbPromise = null;
+
+function openDB() {
+  if (!dbPromise) {
+    dbPromise = new Promise((resolve, reject) => {
+      const request = window.indexedDB.open(DB_NAME, 1);
+      request.onupgradeneeded = () => {
+        request.result.createObjectStore(STORE, { keyPath: "client_id" });
+      };
+      request.onsuccess = () => resolve(request.result);
+      request.onerror = () => {
+        dbPromise = null;
+        reject(request.error);
+      };
+    });
+  }
+  return dbPromise;
+}
+
+// Run fn against the object store and resolve with its request's result
+async function withStore(mode, fn) {
+  const db = await openDB();
+  return new Promise((resolve, reject) => {
+    const tx = db.transaction(STORE, mode);
+    const request = fn(tx.objectStore(STORE));
+    tx.oncomplete = () => resolve(request?.result);
+    tx.onerror = () => reject(tx.error);
+  });
+}
+
+export function queueReceipt(receipt) {
+  return withStore("readwrite", (store) => store.put(receipt));
+}
+
+export async function queuedReceipts() {
+  const all = await withStore("readonly", (store) => store.getAll());
+  return all.sort((a, b) => a.created_at.localeCompare(b.created_at));
+}
+
+export function discardReceipt(clientId) {
+  return withStore("readwrite", (store) => store.delete(clientId));
+}
+
+let syncing = null;
+
+/**
+ * Send every pending receipt to /receipts/sync. Accepted receipts leave the
+ * queue; rejected ones stay with the server's reason so the cashier can
+ * resolve them, and ones that hit a transient error are retried next time.
+ * Concurrent calls share one run. Resolves with the per-receipt results, or
+ * throws if the server could not be reached.
+ */
+export function syncQueuedReceipts(API) {
+  if (!syncing) {
+    syncing = runSync(API).finally(() => {
+      syncing = null;
+    });
+  }
+  return syncing;
+}
+
+async function runSync(API) {
+  const pending = (await queuedReceipts()).filter((receipt) => !receipt.rejected);
+  const results = [];
+
+  for (let i = 0; i < pending.length; i += SYNC_BATCH_SIZE) {
+    const batch = pending.slice(i, i + SYNC_BATCH_SIZE);
+    const response = await axios.post(`${API}/receipts/sync`, {
+      receipts: batch.map(({ client_id, items, created_at }) => ({ client_id, items, created_at })),
+    });
+
+    for (const result of response.data.results) {
+      if (result.status === "rejected" && (result.status_code === 409 || result.status_code >= 500)) {
+        // Transient; leave it queued for the next sync
+      } else if (result.status === "rejected") {
+        const receipt = batch.find((r) => r.client_id === result.client_id);
+        await queueReceipt({ ...receipt, rejected: true, detail: result.detail });
+      } else {
+        await discardReceipt(result.client_id);
+      }
+      results.push(result);
+    }
+  }
+  return results;
+}
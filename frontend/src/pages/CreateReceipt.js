@@ -1,17 +1,20 @@
 import { useState, useEffect } from "react";
 import axios from "axios";
+import { getWithETag, newIdempotencyKey } from "../lib/api";
+import { queueReceipt, queuedReceipts, discardReceipt, syncQueuedReceipts } from "../lib/offlineQueue";
 import { Button } from "../components/ui/button";
 import { Card } from "../components/ui/card";
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogFooter } from "../components/ui/dialog";
 import { Input } from "../components/ui/input";
 import { Label } from "../components/ui/label";
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "../components/ui/select";
-import { Plus, Trash2, ShoppingCart, Save, Eye, Printer } from "lucide-react";
+import { Plus, Trash2, ShoppingCart, Save, Eye, Printer, CloudOff } from "lucide-react";
 import { toast } from "sonner";
 import { format } from "date-fns";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const SYNC_INTERVAL_MS = 30000;
 
 export default function CreateReceipt() {
   const [products, setProducts] = useState([]);
@@ -23,15 +26,26 @@ export default function CreateReceipt() {
   const [selectedReceipt, setSelectedReceipt] = useState(null);
   const [selectedProduct, setSelectedProduct] = useState("");
   const [quantity, setQuantity] = useState("");
+  // Receipts saved at the till but not yet accepted by the server
+  const [queued, setQueued] = useState([]);
 
   useEffect(() => {
     fetchProducts();
     fetchReceipts();
+    syncQueue();
+
+    // Push queued receipts as soon as the link is back, and keep retrying
+    window.addEventListener("online", syncQueue);
+    const timer = setInterval(syncQueue, SYNC_INTERVAL_MS);
+    return () => {
+      window.removeEventListener("online", syncQueue);
+      clearInterval(timer);
+    };
   }, []);
 
   const fetchProducts = async () => {
     try {
-      const response = await axios.get(`${API}/products`);
+      const response = await getWithETag(`${API}/products`);
       // Ensure we always have an array to prevent .map() errors
       setProducts(Array.isArray(response.data) ? response.data : []);
     } catch (error) {
@@ -55,7 +69,8 @@ export default function CreateReceipt() {
 
   const fetchReceipts = async () => {
     try {
-      const response = await axios.get(`${API}/receipts`);
+      // Only the latest receipts are listed here; the Receipts page pages through the rest
+      const response = await getWithETag(`${API}/receipts`, { params: { limit: 20 } });
       // Ensure we always have an array to prevent .map() errors
       setReceipts(Array.isArray(response.data) ? response.data : []);
     } catch (error) {
@@ -124,16 +139,77 @@ export default function CreateReceipt() {
     }, 0);
   };
 
+  const refreshQueue = async () => {
+    try {
+      setQueued(await queuedReceipts());
+    } catch (error) {
+      console.error("Error reading queued receipts:", error);
+    }
+  };
+
+  const syncQueue = async () => {
+    try {
+      const results = await syncQueuedReceipts(API);
+      if (results.some(result => result.status === "created")) {
+        fetchReceipts();
+        fetchProducts();
+      }
+      results
+        .filter(result => result.status === "rejected")
+        .forEach(result => toast.error(`Queued receipt could not be saved: ${result.detail}`));
+    } catch (error) {
+      // Offline or server unreachable; the receipts stay queued for the next try
+      console.error("Error syncing queued receipts:", error);
+    }
+    refreshQueue();
+  };
+
+  const handleDiscardQueued = async (clientId) => {
+    await discardReceipt(clientId);
+    refreshQueue();
+    toast.success("Queued receipt discarded");
+  };
+
   const handleSaveReceipt = async () => {
     if (cart.length === 0) {
       toast.error("Cart is empty. Please add items first.");
       return;
     }
 
+    const receipt = {
+      client_id: newIdempotencyKey(),
+      items: cart,
+      created_at: new Date().toISOString()
+    };
+
+    try {
+      await queueReceipt(receipt);
+    } catch (error) {
+      // No IndexedDB (e.g. private browsing); save straight to the server
+      console.error("Error queueing receipt:", error);
+      await postReceipt(receipt);
+      return;
+    }
+
+    // The sale is done as far as the cashier is concerned; the server catches up
+    toast.success(`Receipt saved! Total: $${calculateTotal().toFixed(2)}`);
+    setProducts(products.map(product => {
+      const sold = cart
+        .filter(item => item.product_id === product.id)
+        .reduce((sum, item) => sum + item.quantity, 0);
+      return sold ? { ...product, quantity: product.quantity - sold } : product;
+    }));
+    setCart([]);
+    setShowDialog(false);
+    syncQueue();
+  };
+
+  const postReceipt = async (receipt) => {
     try {
-      // Create receipt with all items
       const response = await axios.post(`${API}/receipts/create`, {
-        items: cart
+        items: receipt.items
+      }, {
+        headers: { "Idempotency-Key": receipt.client_id }
       });
       
       toast.success(`Receipt created! Total: $${response.data.total_amount}`);
@@ -192,6 +268,39 @@ export default function CreateReceipt() {
         </Button>
       </div>
 
+      {/* Receipts waiting to reach the server */}
+      {queued.length > 0 && (
+        <Card className="p-4 mb-6 border-amber-300 bg-amber-50" data-testid="queued-receipts">
+          <div className="flex items-center justify-between">
+            <div className="flex items-center text-amber-800">
+              <CloudOff className="w-5 h-5 mr-2" />
+              <span className="font-semibold">
+                {queued.filter(receipt => !receipt.rejected).length} receipt(s) waiting to sync
+              </span>
+            </div>
+            <Button size="sm" variant="outline" onClick={syncQueue} data-testid="sync-now-btn">
+              Sync now
+            </Button>
+          </div>
+          {queued.filter(receipt => receipt.rejected).map(receipt => (
+            <div key={receipt.client_id} className="flex items-center justify-between mt-3 text-sm">
+              <span className="text-red-700">
+                {format(new Date(receipt.created_at), "MMM dd, HH:mm")}: {receipt.detail}
+              </span>
+              <Button
+                size="sm"
+                variant="ghost"
+                onClick={() => handleDiscardQueued(receipt.client_id)}
+                data-testid={`discard-queued-${receipt.client_id}`}
+              >
+                <Trash2 className="w-4 h-4 mr-1" />
+                Discard
+              </Button>
+            </div>
+          ))}
+        </Card>
+      )}
+
       {/* Receipts List */}
       <Card className="overflow-hidden">
         <div className="overflow-x-auto">
@@ -1,5 +1,6 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import axios from "axios";
+import { getWithETag } from "../lib/api";
 import { Card } from "../components/ui/card";
 import { Button } from "../components/ui/button";
 import { AlertDialog, AlertDialogAction, AlertDialogCancel, AlertDialogContent, AlertDialogDescription, AlertDialogFooter, AlertDialogHeader, AlertDialogTitle, AlertDialogTrigger } from "../components/ui/alert-dialog";
@@ -8,24 +9,106 @@ import { toast } from "sonner";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const RESYNC_DELAY_MS = 500;
+
+const round2 = (value) => Math.round(value * 100) / 100;
+
+// Apply one event from /dashboard/stream to the stats last loaded from /dashboard/stats.
+// Returns null when the change cannot be applied locally and the stats must be reloaded.
+function applyEvent(stats, type, data) {
+  switch (type) {
+    case "sale": {
+      const { sale } = data;
+      const day = sale.sale_date.slice(0, 10);
+      if (day > stats.today) return null; // Midnight passed; today's totals start over
+      const recent = [sale, ...stats.recent_sales.filter(s => s.id !== sale.id)]
+        .sort((a, b) => b.sale_date.localeCompare(a.sale_date))
+        .slice(0, 5);
+      if (day < stats.today) return { ...stats, recent_sales: recent };
+      return {
+        ...stats,
+        today_revenue: round2(stats.today_revenue + sale.total_amount),
+        today_profit: round2(stats.today_profit + sale.profit),
+        today_sales_count: stats.today_sales_count + 1,
+        recent_sales: recent
+      };
+    }
+    case "stock":
+      return {
+        ...stats,
+        low_stock_products: stats.low_stock_products.map(product =>
+          product.id === data.product_id ? { ...product, quantity: data.quantity } : product
+        )
+      };
+    case "low_stock": {
+      const others = stats.low_stock_products.filter(product => product.id !== data.product.id);
+      if (!data.low_stock && others.length < Math.min(data.low_stock_count, 5)) {
+        return null; // Another low-stock product should move into the list
+      }
+      return {
+        ...stats,
+        low_stock_count: data.low_stock_count,
+        low_stock_products: data.low_stock ? [...others, data.product].slice(0, 5) : others
+      };
+    }
+    default:
+      return stats;
+  }
+}
 
 export default function Dashboard() {
   const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(true);
   const [resetting, setResetting] = useState(false);
+  const resyncTimer = useRef(null);
+  // Latest stats for the stream handlers, which are set up once
+  const statsRef = useRef(null);
+
+  const updateStats = (value) => {
+    statsRef.current = value;
+    setStats(value);
+  };
 
   useEffect(() => {
     fetchDashboardStats();
+
+    // Live deltas instead of polling; EventSource reconnects on its own
+    const stream = new EventSource(`${API}/dashboard/stream`);
+    const scheduleResync = () => {
+      clearTimeout(resyncTimer.current);
+      resyncTimer.current = setTimeout(() => fetchDashboardStats({ silent: true }), RESYNC_DELAY_MS);
+    };
+    const handle = (event) => {
+      if (!statsRef.current) return;
+      const next = applyEvent(statsRef.current, event.type, JSON.parse(event.data));
+      if (next) {
+        updateStats(next);
+      } else {
+        scheduleResync();
+      }
+    };
+
+    ["sale", "stock", "low_stock"].forEach(type => stream.addEventListener(type, handle));
+    stream.addEventListener("resync", scheduleResync);
+    // Anything written while disconnected was missed
+    stream.onerror = scheduleResync;
+
+    return () => {
+      stream.close();
+      clearTimeout(resyncTimer.current);
+    };
   }, []);
 
-  const fetchDashboardStats = async () => {
-    setLoading(true);
+  const fetchDashboardStats = async ({ silent = false } = {}) => {
+    if (!silent) setLoading(true);
     try {
-      const response = await axios.get(`${API}/dashboard/stats`);
-      setStats(response.data);
+      const response = await getWithETag(`${API}/dashboard/stats`);
+      updateStats(response.data);
     } catch (error) {
       console.error("Error fetching dashboard stats:", error);
-      if (error.response) {
+      if (silent) {
+        // Background refresh; the stream retries on its own
+      } else if (error.response) {
         toast.error(`Error: ${error.response.data?.detail || 'Failed to load dashboard'}`);
       } else if (error.request) {
         toast.error("Cannot connect to server. Please check your connection.");
@@ -84,7 +167,7 @@ export default function Dashboard() {
               <AlertDialogTitle>Are you absolutely sure?</AlertDialogTitle>
               <AlertDialogDescription>
                 This action cannot be undone. This will permanently delete all your products, 
-                sales records, and expenses from the database.
+                sales records, receipts and expenses from the database.
               </AlertDialogDescription>
             </AlertDialogHeader>
             <AlertDialogFooter>
@@ -1,5 +1,6 @@
 import { useState, useEffect } from "react";
 import axios from "axios";
+import { getWithETag } from "../lib/api";
 import { Button } from "../components/ui/button";
 import { Card } from "../components/ui/card";
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogFooter } from "../components/ui/dialog";
@@ -11,10 +12,14 @@ import { format } from "date-fns";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const PAGE_SIZE = 50;
 
 export default function Expenses() {
   const [expenses, setExpenses] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [totalExpenses, setTotalExpenses] = useState(0);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [showDialog, setShowDialog] = useState(false);
   const [formData, setFormData] = useState({
     description: "",
@@ -23,20 +28,38 @@ export default function Expenses() {
 
   useEffect(() => {
     fetchExpenses();
+    fetchSummary();
   }, []);
 
-  const fetchExpenses = async () => {
+  // Fetch one page of expenses; pass the cursor from the previous page to append
+  const fetchExpenses = async (after = null) => {
+    if (after) setLoadingMore(true);
     try {
-      const response = await axios.get(`${API}/expenses`);
+      const response = await getWithETag(`${API}/expenses`, {
+        params: { limit: PAGE_SIZE, ...(after && { after }) }
+      });
       // Ensure we always have an array to prevent .map() errors
-      setExpenses(Array.isArray(response.data) ? response.data : []);
+      const page = Array.isArray(response.data) ? response.data : [];
+      setExpenses(after ? (prev) => [...prev, ...page] : page);
+      setNextCursor(response.headers["x-next-cursor"] || null);
     } catch (error) {
       console.error("Error fetching expenses:", error);
       // Set empty array on error to prevent .map() errors
-      setExpenses([]);
+      if (!after) setExpenses([]);
       toast.error("Failed to load expenses");
     } finally {
       setLoading(false);
+      setLoadingMore(false);
+    }
+  };
+
+  // The total covers every expense, not just the pages loaded so far
+  const fetchSummary = async () => {
+    try {
+      const response = await axios.get(`${API}/expenses/summary/totals`);
+      setTotalExpenses(response.data.total_amount);
+    } catch (error) {
+      console.error("Error fetching expense totals:", error);
     }
   };
 
@@ -52,6 +75,7 @@ export default function Expenses() {
       setShowDialog(false);
       resetForm();
       fetchExpenses();
+      fetchSummary();
     } catch (error) {
       console.error("Error adding expense:", error);
       toast.error("Failed to add expense");
@@ -65,6 +89,7 @@ export default function Expenses() {
       await axios.delete(`${API}/expenses/${expenseId}`);
       toast.success("Expense deleted successfully");
       fetchExpenses();
+      fetchSummary();
     } catch (error) {
       console.error("Error deleting expense:", error);
       toast.error("Failed to delete expense");
@@ -78,8 +103,6 @@ export default function Expenses() {
     });
   };
 
-  const totalExpenses = expenses.reduce((sum, expense) => sum + expense.amount, 0);
-
   if (loading) {
     return (
       <div className="flex items-center justify-center min-h-screen">
@@ -157,6 +180,19 @@ export default function Expenses() {
         </div>
       </Card>
 
+      {nextCursor && (
+        <div className="flex justify-center mt-6">
+          <Button
+            variant="outline"
+            onClick={() => fetchExpenses(nextCursor)}
+            disabled={loadingMore}
+            data-testid="load-more-expenses-btn"
+          >
+            {loadingMore ? "Loading..." : "Load More"}
+          </Button>
+        </div>
+      )}
+
       {/* Add Expense Dialog */}
       <Dialog open={showDialog} onOpenChange={setShowDialog}>
         <DialogContent data-testid="expense-dialog">
@@ -1,5 +1,6 @@
 import { useState, useEffect } from "react";
 import axios from "axios";
+import { getWithETag } from "../lib/api";
 import { Button } from "../components/ui/button";
 import { Card } from "../components/ui/card";
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogFooter } from "../components/ui/dialog";
@@ -23,7 +24,8 @@ export default function Products() {
     cost_price: "",
     selling_price: "",
     quantity: "",
-    unit: "kg"
+    unit: "kg",
+    reorder_threshold: "5"
   });
 
   useEffect(() => {
@@ -32,7 +34,7 @@ export default function Products() {
 
   const fetchProducts = async () => {
     try {
-      const response = await axios.get(`${API}/products`);
+      const response = await getWithETag(`${API}/products`);
       // Ensure we always have an array to prevent .map() errors
       setProducts(Array.isArray(response.data) ? response.data : []);
     } catch (error) {
@@ -95,7 +97,8 @@ export default function Products() {
       cost_price: product.cost_price,
       selling_price: product.selling_price,
       quantity: product.quantity,
-      unit: product.unit
+      unit: product.unit,
+      reorder_threshold: product.reorder_threshold
     });
     setShowDialog(true);
   };
@@ -120,7 +123,8 @@ export default function Products() {
       cost_price: "",
       selling_price: "",
       quantity: "",
-      unit: "kg"
+      unit: "kg",
+      reorder_threshold: "5"
     });
     setEditingProduct(null);
   };
@@ -181,7 +185,7 @@ export default function Products() {
                       <td className="px-6 py-4 whitespace-nowrap text-gray-700">${product.cost_price}</td>
                       <td className="px-6 py-4 whitespace-nowrap text-gray-700">${product.selling_price}</td>
                       <td className="px-6 py-4 whitespace-nowrap">
-                        <span className={product.quantity < 5 ? "text-orange-600 font-semibold" : "text-gray-700"}>
+                        <span className={product.quantity < product.reorder_threshold ? "text-orange-600 font-semibold" : "text-gray-700"}>
                           {product.quantity} {product.unit}
                         </span>
                       </td>
@@ -311,6 +315,21 @@ export default function Products() {
                   </Select>
                 </div>
               </div>
+
+              <div>
+                <Label htmlFor="reorder_threshold">Reorder Below</Label>
+                <Input
+                  id="reorder_threshold"
+                  type="number"
+                  step="0.1"
+                  min="0"
+                  data-testid="product-reorder-threshold-input"
+                  value={formData.reorder_threshold}
+                  onChange={(e) => setFormData({ ...formData, reorder_threshold: e.target.value })}
+                  required
+                />
+                <p className="text-xs text-gray-500 mt-1">Shown as low stock when the quantity drops below this</p>
+              </div>
             </div>
             
             <DialogFooter>
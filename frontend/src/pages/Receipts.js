@@ -1,5 +1,6 @@
 import { useState, useEffect } from "react";
 import axios from "axios";
+import { getWithETag } from "../lib/api";
 import { Card } from "../components/ui/card";
 import { Button } from "../components/ui/button";
 import { Dialog, DialogContent, DialogHeader, DialogTitle } from "../components/ui/dialog";
@@ -9,11 +10,14 @@ import { format } from "date-fns";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const PAGE_SIZE = 50;
 
 export default function Receipts() {
   const [receipts, setReceipts] = useState([]);
   const [summary, setSummary] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [selectedReceipt, setSelectedReceipt] = useState(null);
   const [showReceiptDialog, setShowReceiptDialog] = useState(false);
 
@@ -22,18 +26,25 @@ export default function Receipts() {
     fetchSummary();
   }, []);
 
-  const fetchReceipts = async () => {
+  // Fetch one page of receipts; pass the cursor from the previous page to append
+  const fetchReceipts = async (after = null) => {
+    if (after) setLoadingMore(true);
     try {
-      const response = await axios.get(`${API}/receipts`);
+      const response = await getWithETag(`${API}/receipts`, {
+        params: { limit: PAGE_SIZE, ...(after && { after }) }
+      });
       // Ensure we always have an array to prevent .map() errors
-      setReceipts(Array.isArray(response.data) ? response.data : []);
+      const page = Array.isArray(response.data) ? response.data : [];
+      setReceipts(after ? (prev) => [...prev, ...page] : page);
+      setNextCursor(response.headers["x-next-cursor"] || null);
     } catch (error) {
       console.error("Error fetching receipts:", error);
       // Set empty array on error to prevent .map() errors
-      setReceipts([]);
+      if (!after) setReceipts([]);
       toast.error("Failed to load receipts");
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
@@ -204,6 +215,19 @@ export default function Receipts() {
         </div>
       </Card>
 
+      {nextCursor && (
+        <div className="flex justify-center mt-6">
+          <Button
+            variant="outline"
+            onClick={() => fetchReceipts(nextCursor)}
+            disabled={loadingMore}
+            data-testid="load-more-receipts-btn"
+          >
+            {loadingMore ? "Loading..." : "Load More"}
+          </Button>
+        </div>
+      )}
+
       {/* Receipt View Dialog */}
       <Dialog open={showReceiptDialog} onOpenChange={setShowReceiptDialog}>
         <DialogContent className="max-w-md" data-testid="receipt-dialog">
@@ -4,19 +4,71 @@ import { Card } from "../components/ui/card";
 import { Button } from "../components/ui/button";
 import { TrendingUp, TrendingDown } from "lucide-react";
 import { toast } from "sonner";
+import { format } from "date-fns";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Trend ranges: how far back to chart and the bucket size for each
+const TRENDS = {
+  "30 days": { days: 30, bucket: "day", label: "MMM dd" },
+  "12 weeks": { days: 7 * 12, bucket: "week", label: "MMM dd" },
+  "12 months": { days: 365, bucket: "month", label: "MMM yyyy" },
+};
+
 export default function Reports() {
   const [period, setPeriod] = useState("daily");
   const [summary, setSummary] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [trend, setTrend] = useState("30 days");
+  const [series, setSeries] = useState([]);
+  const [rankBy, setRankBy] = useState("revenue");
+  const [topProducts, setTopProducts] = useState([]);
 
   useEffect(() => {
     fetchSummary();
   }, [period]);
 
+  useEffect(() => {
+    fetchTrend();
+  }, [trend]);
+
+  useEffect(() => {
+    fetchTopProducts();
+  }, [trend, rankBy]);
+
+  const fetchTopProducts = async () => {
+    try {
+      const response = await axios.get(`${API}/analytics/products`, {
+        params: {
+          from: new Date(Date.now() - TRENDS[trend].days * 86400000).toISOString(),
+          sort: rankBy,
+          limit: 10
+        }
+      });
+      setTopProducts(response.data.products);
+    } catch (error) {
+      console.error("Error fetching top products:", error);
+      setTopProducts([]);
+    }
+  };
+
+  const fetchTrend = async () => {
+    const { days, bucket } = TRENDS[trend];
+    try {
+      // One request for the whole chart; closed buckets are cached on the server
+      const response = await axios.get(`${API}/reports/timeseries`, {
+        params: { from: new Date(Date.now() - days * 86400000).toISOString(), bucket }
+      });
+      setSeries(response.data.series);
+    } catch (error) {
+      console.error("Error fetching trend:", error);
+      setSeries([]);
+    }
+  };
+
+  const maxRevenue = Math.max(1, ...series.map(point => point.revenue));
+
   const fetchSummary = async () => {
     setLoading(true);
     try {
@@ -104,6 +156,96 @@ export default function Reports() {
         </Card>
       </div>
 
+      {/* Sales Trend */}
+      <Card className="p-6 mb-8" data-testid="sales-trend">
+        <div className="flex justify-between items-center mb-6">
+          <h3 className="text-xl font-semibold text-gray-900">Sales Trend</h3>
+          <div className="flex space-x-2">
+            {Object.keys(TRENDS).map((t) => (
+              <Button
+                key={t}
+                size="sm"
+                onClick={() => setTrend(t)}
+                data-testid={`trend-${t.replace(" ", "-")}-btn`}
+                variant={trend === t ? "default" : "outline"}
+                className={trend === t ? "bg-emerald-600 hover:bg-emerald-700" : ""}
+              >
+                {t}
+              </Button>
+            ))}
+          </div>
+        </div>
+        <div className="flex items-end h-48 gap-1">
+          {series.map((point) => (
+            <div
+              key={point.start}
+              className="flex-1 flex flex-col justify-end h-full"
+              title={`${format(new Date(point.start), TRENDS[trend].label)}: $${point.revenue.toFixed(2)} revenue, $${point.profit.toFixed(2)} profit, ${point.count} sales`}
+            >
+              <div
+                className="bg-emerald-500 rounded-t"
+                style={{ height: `${(point.revenue / maxRevenue) * 100}%` }}
+              />
+            </div>
+          ))}
+        </div>
+        {series.length > 0 && (
+          <div className="flex justify-between text-xs text-gray-500 mt-2">
+            <span>{format(new Date(series[0].start), TRENDS[trend].label)}</span>
+            <span>{format(new Date(series[series.length - 1].start), TRENDS[trend].label)}</span>
+          </div>
+        )}
+      </Card>
+
+      {/* Top Products */}
+      <Card className="p-6 mb-8" data-testid="top-products">
+        <div className="flex justify-between items-center mb-6">
+          <h3 className="text-xl font-semibold text-gray-900">Top Products ({trend})</h3>
+          <div className="flex space-x-2">
+            {["revenue", "profit", "units", "margin"].map((field) => (
+              <Button
+                key={field}
+                size="sm"
+                onClick={() => setRankBy(field)}
+                data-testid={`rank-${field}-btn`}
+                variant={rankBy === field ? "default" : "outline"}
+                className={rankBy === field ? "bg-emerald-600 hover:bg-emerald-700" : ""}
+              >
+                {field.charAt(0).toUpperCase() + field.slice(1)}
+              </Button>
+            ))}
+          </div>
+        </div>
+        {topProducts.length === 0 ? (
+          <p className="text-gray-500 text-center py-4">No sales in this period</p>
+        ) : (
+          <table className="w-full">
+            <thead className="bg-gray-50 border-b">
+              <tr>
+                <th className="px-4 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">Product</th>
+                <th className="px-4 py-3 text-right text-xs font-medium text-gray-500 uppercase tracking-wider">Units</th>
+                <th className="px-4 py-3 text-right text-xs font-medium text-gray-500 uppercase tracking-wider">Revenue</th>
+                <th className="px-4 py-3 text-right text-xs font-medium text-gray-500 uppercase tracking-wider">Profit</th>
+                <th className="px-4 py-3 text-right text-xs font-medium text-gray-500 uppercase tracking-wider">Margin</th>
+              </tr>
+            </thead>
+            <tbody className="divide-y divide-gray-200">
+              {topProducts.map((product) => (
+                <tr key={product.product_id}>
+                  <td className="px-4 py-3 text-sm font-medium text-gray-900">{product.name}</td>
+                  <td className="px-4 py-3 text-sm text-right text-gray-700">{product.units}</td>
+                  <td className="px-4 py-3 text-sm text-right text-blue-600">${product.revenue.toFixed(2)}</td>
+                  <td className="px-4 py-3 text-sm text-right text-emerald-600">${product.profit.toFixed(2)}</td>
+                  <td className="px-4 py-3 text-sm text-right text-gray-700">
+                    {product.margin === null ? "-" : `${product.margin.toFixed(1)}%`}
+                  </td>
+                </tr>
+              ))}
+            </tbody>
+          </table>
+        )}
+      </Card>
+
       {/* Detailed Breakdown */}
       <Card className="p-6">
         <h3 className="text-xl font-semibold text-gray-900 mb-6">Financial Breakdown</h3>
@@ -1,5 +1,6 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import axios from "axios";
+import { getWithETag, newIdempotencyKey } from "../lib/api";
 import { Button } from "../components/ui/button";
 import { Card } from "../components/ui/card";
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogFooter } from "../components/ui/dialog";
@@ -12,40 +13,56 @@ import { format } from "date-fns";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const PAGE_SIZE = 50;
 
 export default function Sales() {
   const [sales, setSales] = useState([]);
   const [products, setProducts] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [showDialog, setShowDialog] = useState(false);
   const [formData, setFormData] = useState({
     product_id: "",
     quantity: ""
   });
+  // One key per filled-in form, so a retried submit is not recorded twice
+  const idempotencyKey = useRef(newIdempotencyKey());
 
   useEffect(() => {
     fetchSales();
     fetchProducts();
   }, []);
 
-  const fetchSales = async () => {
+  useEffect(() => {
+    idempotencyKey.current = newIdempotencyKey();
+  }, [formData]);
+
+  // Fetch one page of sales; pass the cursor from the previous page to append
+  const fetchSales = async (after = null) => {
+    if (after) setLoadingMore(true);
     try {
-      const response = await axios.get(`${API}/sales`);
+      const response = await getWithETag(`${API}/sales`, {
+        params: { limit: PAGE_SIZE, ...(after && { after }) }
+      });
       // Ensure we always have an array to prevent .map() errors
-      setSales(Array.isArray(response.data) ? response.data : []);
+      const page = Array.isArray(response.data) ? response.data : [];
+      setSales(after ? (prev) => [...prev, ...page] : page);
+      setNextCursor(response.headers["x-next-cursor"] || null);
     } catch (error) {
       console.error("Error fetching sales:", error);
       // Set empty array on error to prevent .map() errors
-      setSales([]);
+      if (!after) setSales([]);
       toast.error("Failed to load sales");
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
   const fetchProducts = async () => {
     try {
-      const response = await axios.get(`${API}/products`);
+      const response = await getWithETag(`${API}/products`);
       // Ensure we always have an array to prevent .map() errors
       setProducts(Array.isArray(response.data) ? response.data : []);
     } catch (error) {
@@ -62,6 +79,8 @@ export default function Sales() {
       await axios.post(`${API}/sales`, {
         product_id: formData.product_id,
         quantity: parseFloat(formData.quantity)
+      }, {
+        headers: { "Idempotency-Key": idempotencyKey.current }
       });
       toast.success("Sale recorded successfully");
       setShowDialog(false);
@@ -146,6 +165,19 @@ export default function Sales() {
         </div>
       </Card>
 
+      {nextCursor && (
+        <div className="flex justify-center mt-6">
+          <Button
+            variant="outline"
+            onClick={() => fetchSales(nextCursor)}
+            disabled={loadingMore}
+            data-testid="load-more-sales-btn"
+          >
+            {loadingMore ? "Loading..." : "Load More"}
+          </Button>
+        </div>
+      )}
+
       {/* Record Sale Dialog */}
       <Dialog open={showDialog} onOpenChange={setShowDialog}>
         <DialogContent data-testid="sale-dialog">
@@ -0,0 +1,67 @@
+"""Fixtures for the backend tests.
+
+The app runs in-process over httpx's ASGI transport against an in-memory
+mongomock-motor database, so no MongoDB server is needed. Each test gets an
+empty database and empty caches. Run from the repository root:
+
+    python -m pytest -q tests
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "omrans_test")
+# Keep the shared counters away from any server running on this machine
+os.environ["SHARED_STATE_DIR"] = tempfile.mkdtemp(prefix="omrans-test-")
+os.environ["RATE_LIMIT_PER_MINUTE"] = "0"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import httpx  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def db():
+    """A fresh in-memory database behind server.db"""
+    server.client = AsyncMongoMockClient(tz_aware=True)
+    server.db = server.client[os.environ["DB_NAME"]]
+    server._transactions_supported = False  # mongomock has no transactions
+    server._idempotent_inflight.clear()
+    server.product_cache.invalidate()
+    server.timeseries_cache.clear()
+    server.analytics_cache.clear()
+    return server.db
+
+
+@pytest.fixture
+async def client(db):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def make_product(client):
+    """POST a product, with valid defaults for any field not given"""
+    async def make_product(**fields):
+        body = {
+            "name": "Apple", "category": "fruit", "cost_price": 1.0,
+            "selling_price": 2.0, "quantity": 100, "unit": "kg", **fields,
+        }
+        response = await client.post("/api/products", json=body)
+        assert response.status_code == 200, response.text
+        return response.json()
+    return make_product
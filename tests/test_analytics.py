@@ -0,0 +1,118 @@
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+# mongomock has no $unionWith, so most of these rank one source at a time;
+# the union_with fixture stands in for it where both sources are ranked
+
+
+@pytest.fixture
+async def shop(client, make_product):
+    """Apple sells the most units, kale the most revenue, pear the best margin"""
+    apple = await make_product(name="Apple", category="fruit", cost_price=1, selling_price=1.4)
+    kale = await make_product(name="Kale", category="vegetable", cost_price=4, selling_price=5)
+    pear = await make_product(name="Pear", category="fruit", cost_price=1, selling_price=3)
+    response = await client.post("/api/receipts/create", json={"items": [
+        {"product_id": apple["id"], "quantity": 10},
+        {"product_id": kale["id"], "quantity": 4},
+        {"product_id": pear["id"], "quantity": 1},
+    ]})
+    assert response.status_code == 200, response.text
+    response = await client.post("/api/receipts/create", json={"items": [{"product_id": kale["id"], "quantity": 1}]})
+    assert response.status_code == 200, response.text
+
+
+async def ranking(client, **params):
+    response = await client.get("/api/analytics/products", params={"source": "receipts", **params})
+    assert response.status_code == 200, response.text
+    return response.json()["products"]
+
+
+@pytest.mark.parametrize("sort, names", [
+    ("revenue", ["Kale", "Apple", "Pear"]),
+    ("profit", ["Kale", "Apple", "Pear"]),
+    ("units", ["Apple", "Kale", "Pear"]),
+    ("margin", ["Pear", "Apple", "Kale"]),
+])
+async def test_products_are_ranked_by_the_sort(client, shop, sort, names):
+    assert [product["name"] for product in await ranking(client, sort=sort)] == names
+
+
+async def test_ranking_rows(client, shop):
+    kale = (await ranking(client))[0]
+    assert kale["revenue"] == 25 and kale["profit"] == 5 and kale["units"] == 5
+    assert kale["lines"] == 2
+    assert kale["margin"] == 20
+
+
+async def test_limit_and_category_narrow_the_ranking(client, shop):
+    assert [product["name"] for product in await ranking(client, limit=1)] == ["Kale"]
+    assert [product["name"] for product in await ranking(client, category="fruit")] == ["Apple", "Pear"]
+
+
+async def test_results_are_cached_until_a_write(client, shop, make_product):
+    await ranking(client)
+    hits = server.analytics_cache.hits
+    await ranking(client)
+    assert server.analytics_cache.hits == hits + 1
+
+    fig = await make_product(name="Fig", cost_price=1, selling_price=50)
+    await client.post("/api/receipts/create", json={"items": [{"product_id": fig["id"], "quantity": 1}]})
+    assert (await ranking(client))[0]["name"] == "Fig"
+
+
+async def test_bad_parameters_are_rejected(client):
+    response = await client.get("/api/analytics/products", params={"from": "2026-02-01", "to": "2026-01-01"})
+    assert response.status_code == 400
+    response = await client.get("/api/analytics/products", params={"limit": server.ANALYTICS_MAX_LIMIT + 1})
+    assert response.status_code == 422
+    response = await client.get("/api/analytics/products", params={"sort": "name"})
+    assert response.status_code == 422
+
+
+@pytest.fixture
+def union_with(db, monkeypatch):
+    """Run a pipeline's $unionWith as MongoDB would: both halves, then the rest over their union"""
+    collection_type = type(db.receipts)
+    aggregate = collection_type.aggregate
+
+    class UnionCursor:
+        def __init__(self, collection, pipeline, at):
+            self.collection, self.pipeline, self.at = collection, pipeline, at
+
+        async def to_list(self, length):
+            union = self.pipeline[self.at]["$unionWith"]
+            lines = await aggregate(self.collection, self.pipeline[:self.at]).to_list(None)
+            lines += await aggregate(db[union["coll"]], union["pipeline"]).to_list(None)
+            if lines:
+                await db.union_scratch.insert_many(lines)
+            rows = await aggregate(db.union_scratch, self.pipeline[self.at + 1:]).to_list(length)
+            await db.union_scratch.drop()
+            return rows
+
+    def aggregate_with_union(collection, pipeline, **kwargs):
+        at = next((i for i, stage in enumerate(pipeline) if "$unionWith" in stage), None)
+        if at is None:
+            return aggregate(collection, pipeline, **kwargs)
+        return UnionCursor(collection, pipeline, at)
+    monkeypatch.setattr(collection_type, "aggregate", aggregate_with_union)
+
+
+async def test_all_sources_add_sales_to_receipt_lines(client, shop, union_with):
+    products = {product["name"]: product for product in (await client.get("/api/products")).json()}
+    response = await client.post("/api/sales", json={"product_id": products["Pear"]["id"], "quantity": 10})
+    assert response.status_code == 200
+
+    ranked = await ranking(client, source="all", sort="units")
+    assert [product["name"] for product in ranked] == ["Pear", "Apple", "Kale"]
+    pear = ranked[0]
+    assert (pear["units"], pear["lines"], pear["revenue"]) == (11, 2, 33)
+
+
+async def test_rows_show_the_current_product_name(client, shop):
+    kale = (await ranking(client))[0]
+    response = await client.put(f"/api/products/{kale['product_id']}", json={"name": "Curly kale"})
+    assert response.status_code == 200
+    assert (await ranking(client))[0]["name"] == "Curly kale"
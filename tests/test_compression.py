@@ -0,0 +1,92 @@
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+needs_brotli = pytest.mark.skipif(server.brotli is None, reason="brotli is not installed")
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip", "gzip"),
+    ("gzip, deflate", "gzip"),
+    ("deflate", None),
+    ("identity", None),
+    ("gzip;q=0", None),
+    ("br;q=0, gzip;q=0", None),
+    ("GZIP", "gzip"),
+    ("gzip;q=abc", None),
+])
+def test_preferred_encoding(accept_encoding, expected):
+    assert server.preferred_encoding(accept_encoding) == expected
+
+
+@needs_brotli
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip, br", "br"),               # Brotli wins a tie
+    ("gzip;q=1, br;q=0.5", "gzip"),
+    ("br;q=0.2, gzip;q=0.8", "gzip"),
+    ("*", "br"),
+    ("*;q=0.5, gzip", "gzip"),
+])
+def test_preferred_encoding_with_brotli(accept_encoding, expected):
+    assert server.preferred_encoding(accept_encoding) == expected
+
+
+@pytest.fixture
+async def catalog(make_product):
+    """Enough products that GET /api/products is over COMPRESSION_MIN_SIZE"""
+    for i in range(30):
+        await make_product(name=f"Product {i}")
+
+
+async def test_large_json_is_compressed(client, catalog):
+    plain = await client.get("/api/products", headers={"Accept-Encoding": "identity"})
+    assert len(plain.content) >= server.COMPRESSION_MIN_SIZE
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["vary"] == "Accept-Encoding"
+
+    response = await client.get("/api/products", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(plain.content)
+    assert response.content == plain.content  # httpx decodes it
+    assert response.headers["etag"] == f"W/{plain.headers['etag']}"
+    assert any(value.startswith("compress;") for value in response.headers.get_list("server-timing"))
+
+
+@needs_brotli
+async def test_brotli_is_used_when_preferred(client, catalog):
+    plain = await client.get("/api/products", headers={"Accept-Encoding": "identity"})
+    response = await client.get("/api/products", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.content == plain.content
+
+
+async def test_small_responses_are_sent_as_is(client):
+    response = await client.get("/api/health", headers={"Accept-Encoding": "gzip"})
+    assert len(response.content) < server.COMPRESSION_MIN_SIZE
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+async def test_streamed_exports_are_not_compressed(client, make_product):
+    product = await make_product()
+    for _ in range(50):
+        await client.post("/api/sales", json={"product_id": product["id"], "quantity": 1})
+    response = await client.get("/api/export/sales", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert len(response.content) >= server.COMPRESSION_MIN_SIZE
+    assert "content-encoding" not in response.headers
+
+
+@pytest.mark.parametrize("tag_form", ["strong", "weak"])
+async def test_either_etag_form_revalidates(client, catalog, tag_form):
+    compressed = await client.get("/api/products", headers={"Accept-Encoding": "gzip"})
+    etag = compressed.headers["etag"]  # W/"..."
+    if tag_form == "strong":
+        etag = etag.removeprefix("W/")
+    response = await client.get("/api/products", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert "content-encoding" not in response.headers
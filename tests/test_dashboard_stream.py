@@ -0,0 +1,41 @@
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_stream_subscribes_only_once_it_is_iterated(db):
+    response = await server.dashboard_stream()
+    assert not server.event_hub._subscribers  # A client gone before streaming leaves nothing behind
+
+    events = response.body_iterator
+    assert await events.__anext__() == "retry: 5000\n\n"
+    assert len(server.event_hub._subscribers) == 1
+    await events.aclose()
+    assert not server.event_hub._subscribers
+
+
+async def test_product_stock_edit_reaches_local_and_other_workers(client, make_product, monkeypatch):
+    apple = await make_product(quantity=10)
+    sent = []
+    monkeypatch.setattr(server.worker_bus, "broadcast", lambda op, **fields: sent.append((op, fields)))
+    queue = await server.event_hub.subscribe()
+    try:
+        response = await client.put(f"/api/products/{apple['id']}", json={"quantity": 3})
+        assert response.status_code == 200
+        events = [queue.get_nowait() for _ in range(queue.qsize())]
+    finally:
+        server.event_hub.unsubscribe(queue)
+
+    assert ("stock_change", {"product_ids": [apple["id"]]}) in sent
+    assert [event["type"] for event in events] == ["stock", "low_stock"]
+    assert events[0]["quantity"] == 3 and events[1]["low_stock"] is True
+
+
+async def test_price_edit_publishes_no_stock_change(client, make_product, monkeypatch):
+    apple = await make_product()
+    sent = []
+    monkeypatch.setattr(server.worker_bus, "broadcast", lambda op, **fields: sent.append(op))
+    await client.put(f"/api/products/{apple['id']}", json={"selling_price": 3})
+    assert "stock_change" not in sent
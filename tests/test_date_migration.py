@@ -0,0 +1,38 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_migration_moves_etags_and_caches_on(client, db):
+    await db.products.insert_one({
+        "id": "p1", "name": "Apple", "category": "fruit", "cost_price": 1, "selling_price": 2, "quantity": 10,
+        "unit": "kg", "reorder_threshold": 5, "stock_margin": 5,
+        "created_at": "2025-01-01T10:00:00+00:00", "updated_at": "2025-01-01T10:00:00+00:00",
+    })
+    await db.sales.insert_one({
+        "id": "s1", "product_id": "p1", "product_name": "Apple", "quantity": 1, "cost_price": 1,
+        "selling_price": 2, "total_amount": 2, "profit": 1, "receipt_number": "RCP-1",
+        "sale_date": "2025-01-02T10:00:00", "created_at": "2025-01-02T10:00:00",
+    })
+    before = await client.get("/api/products")
+    history = server.collection_version("sales_history")
+
+    converted = await server.migrate_string_dates()
+    assert (converted["products"], converted["sales"]) == (1, 1)
+    assert server.collection_version("sales_history") > history
+
+    after = await client.get("/api/products", headers={"If-None-Match": before.headers["etag"]})
+    assert after.status_code == 200
+    assert after.json()[0]["created_at"] == "2025-01-01T10:00:00Z"
+    assert (await db.sales.find_one({"id": "s1"}))["sale_date"] == datetime(2025, 1, 2, 10, tzinfo=timezone.utc)
+
+
+async def test_nothing_to_migrate_keeps_the_etags(client):
+    before = await client.get("/api/products")
+    await server.migrate_string_dates()
+    after = await client.get("/api/products", headers={"If-None-Match": before.headers["etag"]})
+    assert after.status_code == 304
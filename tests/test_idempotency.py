@@ -0,0 +1,71 @@
+import anyio
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def key(value):
+    return {"Idempotency-Key": value}
+
+
+async def test_retried_sale_is_replayed_not_repeated(client, db, make_product):
+    apple = await make_product(quantity=10)
+    body = {"product_id": apple["id"], "quantity": 2}
+    first = await client.post("/api/sales", json=body, headers=key("till-1"))
+    again = await client.post("/api/sales", json=body, headers=key("till-1"))
+    assert first.status_code == again.status_code == 200
+    assert again.json()["id"] == first.json()["id"]
+    assert await db.sales.count_documents({}) == 1
+    assert (await db.products.find_one({"id": apple["id"]}))["quantity"] == 8
+
+
+async def test_key_reused_for_a_different_body_is_422(client, make_product):
+    apple = await make_product(quantity=10)
+    await client.post("/api/sales", json={"product_id": apple["id"], "quantity": 1}, headers=key("till-1"))
+    response = await client.post("/api/sales", json={"product_id": apple["id"], "quantity": 5}, headers=key("till-1"))
+    assert response.status_code == 422
+
+
+async def test_concurrent_requests_with_one_key_write_once(client, db, make_product):
+    apple = await make_product(quantity=10)
+    body = {"items": [{"product_id": apple["id"], "quantity": 1}]}
+    responses = []
+
+    async def checkout():
+        responses.append(await client.post("/api/receipts/create", json=body, headers=key("till-2")))
+
+    async with anyio.create_task_group() as tasks:
+        for _ in range(3):
+            tasks.start_soon(checkout)
+
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    assert len({response.json()["receipt_number"] for response in responses}) == 1
+    assert await db.receipts.count_documents({}) == 1
+    assert (await db.products.find_one({"id": apple["id"]}))["quantity"] == 9
+
+
+async def test_failed_attempt_releases_the_key(client, make_product):
+    apple = await make_product(quantity=1)
+    body = {"product_id": apple["id"], "quantity": 2}
+    assert (await client.post("/api/sales", json=body, headers=key("till-1"))).status_code == 400
+    await client.put(f"/api/products/{apple['id']}", json={"quantity": 5})
+    assert (await client.post("/api/sales", json=body, headers=key("till-1"))).status_code == 200
+
+
+async def test_keys_are_scoped_per_route(client, make_product):
+    apple = await make_product(quantity=10)
+    sale = await client.post("/api/sales", json={"product_id": apple["id"], "quantity": 1}, headers=key("k"))
+    receipt = await client.post(
+        "/api/receipts/create", json={"items": [{"product_id": apple["id"], "quantity": 1}]}, headers=key("k")
+    )
+    assert sale.status_code == receipt.status_code == 200
+
+
+async def test_reset_forgets_the_keys(client, db, make_product):
+    apple = await make_product(quantity=10)
+    body = {"product_id": apple["id"], "quantity": 1}
+    assert (await client.post("/api/sales", json=body, headers=key("till-1"))).status_code == 200
+    assert (await client.delete("/api/reset-all-data")).status_code == 200
+    assert await db.idempotency_keys.count_documents({}) == 0
+    # Runs again instead of replaying a sale the reset deleted
+    assert (await client.post("/api/sales", json=body, headers=key("till-1"))).status_code == 404
@@ -0,0 +1,27 @@
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+def timed(route):
+    """Requests to route in the duration histogram"""
+    return sum(sum(series[:-1]) for labels, series in server.request_duration._series.items() if labels[1] == route)
+
+
+async def test_streamed_responses_are_counted_but_not_timed(client, make_product):
+    product = await make_product()
+    for _ in range(3):
+        await client.post("/api/sales", json={"product_id": product["id"], "quantity": 1})
+    exports = timed("/api/export/{kind}")
+    lists = timed("/api/products")
+
+    response = await client.get("/api/export/sales", params={"format": "ndjson"})
+    assert response.status_code == 200
+    await client.get("/api/products")
+
+    assert timed("/api/export/{kind}") == exports
+    assert timed("/api/products") == lists + 1
+    metrics = (await client.get("/api/metrics")).text
+    assert 'http_streamed_responses_total{method="GET",route="/api/export/{kind}",status="200"}' in metrics
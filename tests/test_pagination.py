@@ -0,0 +1,78 @@
+import base64
+import json
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trips_dates_and_numbers():
+    moment = datetime(2026, 3, 1, 12, 30, tzinfo=timezone.utc)
+    assert server.decode_cursor(server.encode_cursor(moment, "a")) == (moment, "a")
+    assert server.decode_cursor(server.encode_cursor(-2.5, "b"), numeric=True) == (-2.5, "b")
+
+
+@pytest.mark.parametrize("cursor, numeric", [
+    ("not base64!", False),
+    (raw_cursor(["2026-03-01T12:30:00+00:00"]), False),         # no id
+    (raw_cursor(["2026-03-01T12:30:00+00:00", 7]), False),      # id not a string
+    (raw_cursor(["2026-03-01T12:30:00", "a"]), False),          # naive timestamp
+    (raw_cursor(["yesterday", "a"]), False),
+    (raw_cursor([5, "a"]), False),                              # number where a date belongs
+    (raw_cursor(["2026-03-01T12:30:00+00:00", "a"]), True),     # date where a number belongs
+    (raw_cursor([True, "a"]), True),
+])
+def test_malformed_cursor_is_rejected(cursor, numeric):
+    with pytest.raises(HTTPException) as error:
+        server.decode_cursor(cursor, numeric)
+    assert error.value.status_code == 400
+
+
+async def test_product_pages_follow_the_cursor(client, make_product):
+    for i in range(5):
+        await make_product(name=f"Product {i}")
+    # Products created in the same millisecond are ordered by id, so compare with one full page
+    names = [product["name"] for product in (await client.get("/api/products")).json()]
+    seen = []
+    after = None
+    while True:
+        response = await client.get("/api/products", params={"limit": 2, **({"after": after} if after else {})})
+        assert response.status_code == 200
+        seen += [product["name"] for product in response.json()]
+        after = response.headers.get(server.NEXT_CURSOR_HEADER)
+        if after is None:
+            break
+    assert seen == names and len(names) == 5
+
+
+async def test_sales_pages_follow_the_cursor(client, make_product):
+    product = await make_product()
+    for _ in range(5):
+        assert (await client.post("/api/sales", json={"product_id": product["id"], "quantity": 1})).status_code == 200
+    first = await client.get("/api/sales", params={"limit": 3})
+    rest = await client.get("/api/sales", params={"limit": 3, "after": first.headers[server.NEXT_CURSOR_HEADER]})
+    assert len(first.json()) == 3 and len(rest.json()) == 2
+    assert server.NEXT_CURSOR_HEADER not in rest.headers
+    ids = [sale["id"] for sale in first.json() + rest.json()]
+    assert len(set(ids)) == 5
+
+
+@pytest.mark.parametrize("url, wrong_type", [
+    ("/api/products", raw_cursor([5, "a"])),
+    ("/api/products/low-stock", raw_cursor(["2026-03-01T12:30:00+00:00", "a"])),
+    ("/api/sales", raw_cursor([5, "a"])),
+    ("/api/expenses", raw_cursor([5, "a"])),
+    ("/api/receipts", raw_cursor([5, "a"])),
+])
+async def test_list_routes_answer_a_bad_cursor_with_400(client, url, wrong_type):
+    for cursor in (wrong_type, raw_cursor(["2026-03-01T12:30:00", "a"]), raw_cursor([1, 2]), "%%%"):
+        response = await client.get(url, params={"after": cursor})
+        assert response.status_code == 400, (url, cursor, response.text)
@@ -0,0 +1,113 @@
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("values, error", [
+    ({"cost_price": 1, "selling_price": 2, "quantity": 0, "reorder_threshold": 0}, None),
+    ({"cost_price": 2, "selling_price": 2}, None),
+    ({"cost_price": 2, "selling_price": 1}, "Selling price cannot be less than cost price"),
+    ({"quantity": -1}, "Quantity cannot be negative"),
+    ({"cost_price": -1}, "Prices cannot be negative"),
+    ({"reorder_threshold": -0.5}, "Reorder threshold cannot be negative"),
+    ({"name": "only fields that carry no rule"}, None),
+])
+def test_product_rule_violation(values, error):
+    assert server.product_rule_violation(values) == error
+
+
+async def test_create_rejects_selling_below_cost(client):
+    response = await client.post("/api/products", json={
+        "name": "Pear", "category": "fruit", "cost_price": 3, "selling_price": 2, "quantity": 1, "unit": "kg",
+    })
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("patch", [{"selling_price": 0.5}, {"cost_price": 3}])
+async def test_put_checks_a_price_against_the_stored_other_price(client, make_product, patch):
+    product = await make_product(cost_price=1, selling_price=2)
+    response = await client.put(f"/api/products/{product['id']}", json=patch)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Selling price cannot be less than cost price"
+    stored = (await client.get("/api/products")).json()[0]
+    assert (stored["cost_price"], stored["selling_price"]) == (1, 2)
+
+
+async def test_put_accepts_prices_that_fit_together(client, make_product):
+    product = await make_product(cost_price=1, selling_price=2)
+    response = await client.put(f"/api/products/{product['id']}", json={"selling_price": 1.5})
+    assert response.status_code == 200
+    assert response.json()["selling_price"] == 1.5
+    response = await client.put(f"/api/products/{product['id']}", json={"cost_price": 5, "selling_price": 6})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("field", ["reorder_threshold", "selling_price", "name"])
+async def test_put_refuses_null(client, make_product, field):
+    product = await make_product()
+    response = await client.put(f"/api/products/{product['id']}", json={field: None})
+    assert response.status_code == 422
+    # The stored product is untouched and still usable
+    assert (await client.put(f"/api/products/{product['id']}", json={"quantity": 3})).status_code == 200
+    assert (await client.post("/api/sales", json={"product_id": product["id"], "quantity": 1})).status_code == 200
+
+
+async def test_put_of_a_missing_product_is_404(client):
+    response = await client.put("/api/products/missing", json={"selling_price": 3})
+    assert response.status_code == 404
+
+
+async def test_bulk_patch_reports_each_row(client, make_product):
+    apple = await make_product(name="Apple", cost_price=1, selling_price=2)
+    kale = await make_product(name="Kale", cost_price=2, selling_price=3)
+    response = await client.patch("/api/products/bulk", json=[
+        {"id": apple["id"], "selling_price": 0.5},
+        {"id": kale["id"], "cost_price": 2.5},
+        {"id": "missing", "name": "Ghost"},
+        {"id": kale["id"], "quantity_delta": 5},
+        {"id": apple["id"], "quantity": -1},
+    ])
+    assert response.status_code == 200
+    body = response.json()
+    assert [row["status"] for row in body["results"]] == ["error", "updated", "error", "error", "error"]
+    assert body["results"][0]["detail"] == "Selling price cannot be less than cost price"
+    assert body["results"][2]["detail"] == "Product not found"
+    assert body["results"][3]["detail"] == "Product is already in row 1"
+    assert body["results"][4]["detail"] == "Quantity cannot be negative"
+    assert (body["updated"], body["failed"]) == (1, 4)
+
+    stored = {product["name"]: product for product in (await client.get("/api/products")).json()}
+    assert stored["Apple"]["selling_price"] == 2
+    assert stored["Kale"]["cost_price"] == 2.5
+
+
+async def test_bulk_patch_refuses_null_fields_per_row(client, make_product):
+    apple = await make_product(name="Apple", cost_price=1, selling_price=2)
+    kale = await make_product(name="Kale", cost_price=2, selling_price=3)
+    response = await client.patch("/api/products/bulk", json=[
+        {"id": apple["id"], "selling_price": None},
+        {"id": kale["id"], "reorder_threshold": None, "quantity_delta": 1},
+    ])
+    assert response.status_code == 200
+    body = response.json()
+    assert [row["status"] for row in body["results"]] == ["error", "error"]
+    assert body["results"][0]["detail"].startswith("selling_price:")
+    assert (body["updated"], body["failed"]) == (0, 2)
+    # Both products still load and sell
+    stored = {product["name"]: product for product in (await client.get("/api/products")).json()}
+    assert stored["Apple"]["selling_price"] == 2 and stored["Kale"]["quantity"] == 100
+    assert (await client.post("/api/sales", json={"product_id": kale["id"], "quantity": 1})).status_code == 200
+
+
+async def test_price_change_racing_a_write_is_not_saved(client, make_product, monkeypatch):
+    product = await make_product(cost_price=1, selling_price=2)
+    # As if another request changed cost_price between the check and the write
+    monkeypatch.setattr(server, "price_guard", lambda stored, fields: {"cost_price": 99})
+
+    response = await client.put(f"/api/products/{product['id']}", json={"selling_price": 1.5})
+    assert response.status_code == 409
+    response = await client.patch("/api/products/bulk", json=[{"id": product["id"], "selling_price": 1.5}])
+    assert response.json()["results"][0]["status"] == "error"
+    assert (await client.get("/api/products")).json()[0]["selling_price"] == 2
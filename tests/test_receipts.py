@@ -0,0 +1,136 @@
+import anyio
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def racing_writes(monkeypatch):
+    """Hold each write back until every request in flight has passed its stock check"""
+    write = server.run_in_transaction
+
+    async def after_the_others_checked(callback):
+        await anyio.sleep(0.05)
+        return await write(callback)
+    monkeypatch.setattr(server, "run_in_transaction", after_the_others_checked)
+
+
+async def stock(client, product_id):
+    products = (await client.get("/api/products")).json()
+    return next(product["quantity"] for product in products if product["id"] == product_id)
+
+
+async def receipts_count(db):
+    rollups = await db.daily_rollups.find({}).to_list(None)
+    return sum(rollup.get("receipts_count", 0) for rollup in rollups)
+
+
+async def test_concurrent_receipts_cannot_oversell(client, db, make_product, racing_writes):
+    apple = await make_product(quantity=5)
+    statuses = []
+
+    async def checkout():
+        response = await client.post("/api/receipts/create", json={"items": [{"product_id": apple["id"], "quantity": 3}]})
+        statuses.append(response.status_code)
+
+    async with anyio.create_task_group() as tasks:
+        for _ in range(3):
+            tasks.start_soon(checkout)
+
+    assert sorted(statuses) == [200, 400, 400]
+    assert await stock(client, apple["id"]) == 2
+    assert await db.receipts.count_documents({}) == 1
+    assert await receipts_count(db) == 1
+
+
+async def test_short_line_rolls_back_the_whole_receipt(client, db, make_product):
+    apple = await make_product(name="Apple", quantity=10)
+    kale = await make_product(name="Kale", quantity=10)
+    await client.get("/api/products")  # Load the catalog cache
+    # Another worker sells the kale; this worker's cache still shows 10
+    await db.products.update_one({"id": kale["id"]}, {"$set": {"quantity": 1, "stock_margin": -4}})
+
+    response = await client.post("/api/receipts/create", json={"items": [
+        {"product_id": apple["id"], "quantity": 4},
+        {"product_id": kale["id"], "quantity": 2},
+    ]})
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Insufficient stock for 'Kale'")
+    assert (await db.products.find_one({"id": apple["id"]}))["quantity"] == 10
+    assert (await db.products.find_one({"id": kale["id"]}))["quantity"] == 1
+    assert await db.receipts.count_documents({}) == 0
+    assert await receipts_count(db) == 0
+
+
+async def test_failed_insert_gives_the_stock_back(client, db, make_product, monkeypatch):
+    apple = await make_product(quantity=10)
+
+    async def insert_fails(*args, **kwargs):
+        raise RuntimeError("connection lost")
+    monkeypatch.setattr(type(db.receipts), "insert_one", insert_fails)
+
+    response = await client.post("/api/receipts/create", json={"items": [{"product_id": apple["id"], "quantity": 4}]})
+    assert response.status_code == 500
+    assert (await db.products.find_one({"id": apple["id"]}))["quantity"] == 10
+    assert await receipts_count(db) == 0
+
+
+async def test_receipt_is_rolled_up_after_it_is_saved(client, db, make_product):
+    apple = await make_product(selling_price=2, quantity=10)
+    response = await client.post("/api/receipts/create", json={"items": [{"product_id": apple["id"], "quantity": 3}]})
+    assert response.status_code == 200
+    assert await stock(client, apple["id"]) == 7
+    rollup = await db.daily_rollups.find_one({})
+    assert (rollup["receipts_count"], rollup["receipts_amount"]) == (1, 6)
+
+
+async def test_create_charges_the_prices_sent(client, db, make_product):
+    apple = await make_product(cost_price=1, selling_price=2)
+    response = await client.post("/api/receipts/create", json={"items": [
+        {"product_id": apple["id"], "quantity": 2, "selling_price": 1.5, "cost_price": 1, "product_name": "Apples"},
+        {"product_id": apple["id"], "quantity": 1},
+    ]})
+    assert response.status_code == 200
+    assert response.json()["total_amount"] == 5
+    lines = (await db.receipts.find_one({}))["items"]
+    assert [(line["product_name"], line["selling_price"]) for line in lines] == [("Apples", 1.5), ("Apple", 2)]
+
+
+def queued(client_id, product, quantity, **fields):
+    return {"client_id": client_id, "items": [{"product_id": product["id"], "quantity": quantity, **fields}]}
+
+
+async def test_sync_applies_what_it_can_and_resending_records_nothing_twice(client, db, make_product):
+    apple = await make_product(quantity=5, selling_price=2)
+    batch = {"receipts": [
+        # Rung up later than the others, so applied last; the stock is gone by then
+        {**queued("c", apple, 3), "created_at": "2026-01-01T10:00:00Z"},
+        # The till's stale price is ignored
+        {**queued("a", apple, 4, selling_price=0.5), "created_at": "2026-01-01T08:00:00Z"},
+        {**queued("b", apple, 0), "created_at": "2026-01-01T09:00:00Z"},
+    ]}
+    response = await client.post("/api/receipts/sync", json=batch)
+    assert response.status_code == 200
+    body = response.json()
+    assert [result["client_id"] for result in body["results"]] == ["a", "b", "c"]
+    assert [result["status"] for result in body["results"]] == ["created", "rejected", "rejected"]
+    assert body["results"][0]["total_amount"] == 8
+    assert [result.get("status_code") for result in body["results"][1:]] == [400, 400]
+    assert (body["created"], body["duplicates"], body["rejected"]) == (1, 0, 2)
+
+    resent = (await client.post("/api/receipts/sync", json=batch)).json()
+    assert [result["status"] for result in resent["results"]] == ["duplicate", "rejected", "rejected"]
+    assert resent["results"][0]["receipt_number"] == body["results"][0]["receipt_number"]
+    assert await db.receipts.count_documents({}) == 1
+    assert (await db.products.find_one({"id": apple["id"]}))["quantity"] == 1
+
+
+async def test_one_receipt_is_encoded_like_the_list(client, make_product):
+    apple = await make_product()
+    await client.post("/api/receipts/create", json={"items": [{"product_id": apple["id"], "quantity": 1}]})
+    listed = (await client.get("/api/receipts")).json()[0]
+    single = (await client.get(f"/api/receipts/{listed['id']}")).json()
+    assert single == listed
+    assert single["created_at"].endswith("Z")
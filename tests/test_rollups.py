@@ -0,0 +1,53 @@
+import anyio
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=["flock", "in-process"])
+def lock(request, tmp_path, monkeypatch):
+    if request.param == "in-process":
+        monkeypatch.setattr(server, "fcntl", None)
+    return server.RollupLock(tmp_path)
+
+
+async def test_rebuild_waits_for_writes_in_flight_and_holds_new_ones(lock):
+    order = []
+    write_started = anyio.Event()
+    release_write = anyio.Event()
+
+    async def write(name, started=None, release=None):
+        async with lock.write():
+            order.append(f"{name} start")
+            if started:
+                started.set()
+            if release:
+                await release.wait()
+            order.append(f"{name} end")
+
+    async def rebuild():
+        async with lock.rebuild():
+            order.append("rebuild start")
+            await anyio.sleep(0.1)
+            order.append("rebuild end")
+
+    async with anyio.create_task_group() as tasks:
+        tasks.start_soon(write, "first", write_started, release_write)
+        await write_started.wait()
+        tasks.start_soon(rebuild)
+        await anyio.sleep(0.05)
+        tasks.start_soon(write, "second")
+        await anyio.sleep(0.05)
+        assert order == ["first start"]
+        release_write.set()
+
+    assert order == ["first start", "first end", "rebuild start", "rebuild end", "second start", "second end"]
+
+
+async def test_writes_share_the_lock(lock):
+    async with lock.write():
+        with anyio.fail_after(1):
+            async with lock.write():
+                pass
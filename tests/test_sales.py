@@ -0,0 +1,45 @@
+import anyio
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_sales_of_the_last_unit(client, db, make_product, monkeypatch):
+    apple = await make_product(quantity=1)
+    write = server.run_in_transaction
+
+    async def after_both_checked(callback):
+        await anyio.sleep(0.05)
+        return await write(callback)
+    monkeypatch.setattr(server, "run_in_transaction", after_both_checked)
+
+    responses = []
+
+    async def sell():
+        responses.append(await client.post("/api/sales", json={"product_id": apple["id"], "quantity": 1}))
+
+    async with anyio.create_task_group() as tasks:
+        tasks.start_soon(sell)
+        tasks.start_soon(sell)
+
+    assert sorted(response.status_code for response in responses) == [200, 409]
+    stored = await db.products.find_one({"id": apple["id"]})
+    assert (stored["quantity"], stored["stock_margin"]) == (0, -5)
+    assert await db.sales.count_documents({}) == 1
+    assert (await db.daily_rollups.find_one({}))["sales_count"] == 1
+
+
+async def test_sale_beyond_the_stock_is_refused(client, db, make_product):
+    apple = await make_product(quantity=2)
+    response = await client.post("/api/sales", json={"product_id": apple["id"], "quantity": 3})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Insufficient quantity in stock"
+    assert (await db.products.find_one({"id": apple["id"]}))["quantity"] == 2
+    assert await db.daily_rollups.count_documents({}) == 0
+
+
+async def test_sale_of_a_missing_product_is_404(client):
+    response = await client.post("/api/sales", json={"product_id": "missing", "quantity": 1})
+    assert response.status_code == 404
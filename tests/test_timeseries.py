@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+UTC = timezone.utc
+
+
+@pytest.mark.parametrize("unit, value, start, following", [
+    ("hour", datetime(2026, 1, 31, 15, 59, 59, 999000, tzinfo=UTC),
+     datetime(2026, 1, 31, 15, tzinfo=UTC), datetime(2026, 1, 31, 16, tzinfo=UTC)),
+    ("day", datetime(2026, 1, 31, 23, 59, tzinfo=UTC),
+     datetime(2026, 1, 31, tzinfo=UTC), datetime(2026, 2, 1, tzinfo=UTC)),
+    # Weeks start on Monday; 2026-02-01 is a Sunday
+    ("week", datetime(2026, 2, 1, 12, tzinfo=UTC),
+     datetime(2026, 1, 26, tzinfo=UTC), datetime(2026, 2, 2, tzinfo=UTC)),
+    ("week", datetime(2026, 2, 2, tzinfo=UTC),
+     datetime(2026, 2, 2, tzinfo=UTC), datetime(2026, 2, 9, tzinfo=UTC)),
+    ("month", datetime(2026, 1, 31, 15, tzinfo=UTC),
+     datetime(2026, 1, 1, tzinfo=UTC), datetime(2026, 2, 1, tzinfo=UTC)),
+    ("month", datetime(2026, 12, 31, 23, tzinfo=UTC),
+     datetime(2026, 12, 1, tzinfo=UTC), datetime(2027, 1, 1, tzinfo=UTC)),
+    ("month", datetime(2028, 2, 29, tzinfo=UTC),
+     datetime(2028, 2, 1, tzinfo=UTC), datetime(2028, 3, 1, tzinfo=UTC)),
+])
+def test_bucket_boundaries(unit, value, start, following):
+    assert server.bucket_start(value, unit) == start
+    assert server.next_bucket(start, unit) == following
+
+
+def test_buckets_are_utc():
+    # 01:30 at +03:00 is 22:30 UTC the day before
+    local = datetime(2026, 3, 2, 1, 30, tzinfo=timezone(timedelta(hours=3)))
+    assert server.bucket_start(local, "day") == datetime(2026, 3, 1, tzinfo=UTC)
+    # Naive datetimes are read as UTC
+    assert server.bucket_start(datetime(2026, 3, 2, 1, 30), "day") == datetime(2026, 3, 2, tzinfo=UTC)
+
+
+@pytest.fixture
+def day_buckets(monkeypatch):
+    """Day buckets with $dateFromParts, since mongomock has no $dateTrunc"""
+    monkeypatch.setattr(server, "bucket_expression", lambda unit: {"$dateFromParts": {
+        "year": {"$year": "$sale_date"}, "month": {"$month": "$sale_date"}, "day": {"$dayOfMonth": "$sale_date"},
+    }})
+
+
+async def record_sale(client, product, when: datetime, quantity: float = 1):
+    response = await client.post("/api/sales", json={
+        "product_id": product["id"], "quantity": quantity, "sale_date": when.isoformat(),
+    })
+    assert response.status_code == 200, response.text
+
+
+async def test_sales_either_side_of_midnight_land_in_their_own_day(client, make_product, day_buckets):
+    product = await make_product(selling_price=2)
+    midnight = server.bucket_start(datetime.now(UTC), "day") - timedelta(days=2)
+    await record_sale(client, product, midnight - timedelta(milliseconds=1), quantity=1)
+    await record_sale(client, product, midnight, quantity=3)
+
+    response = await client.get("/api/reports/timeseries", params={
+        "from": (midnight - timedelta(days=2)).isoformat(), "to": (midnight + timedelta(days=1)).isoformat(),
+    })
+    assert response.status_code == 200
+    series = response.json()["series"]
+    assert [point["quantity"] for point in series] == [0, 1, 3]
+    assert series[1]["start"].startswith((midnight - timedelta(days=1)).date().isoformat())
+    assert series[2]["revenue"] == 6
+
+
+async def test_from_is_rounded_down_to_its_bucket(client, day_buckets):
+    response = await client.get("/api/reports/timeseries", params={
+        "from": "2026-01-05T13:45:00Z", "to": "2026-01-07T00:00:00Z",
+    })
+    body = response.json()
+    assert body["from"] == "2026-01-05T00:00:00Z"
+    assert [point["start"] for point in body["series"]] == ["2026-01-05T00:00:00Z", "2026-01-06T00:00:00Z"]
+
+
+async def test_back_dated_sale_refreshes_a_cached_closed_bucket(client, make_product, day_buckets):
+    product = await make_product(selling_price=2)
+    day = server.bucket_start(datetime.now(UTC), "day") - timedelta(days=3)
+    await record_sale(client, product, day + timedelta(hours=9))
+    params = {"from": day.isoformat(), "to": (day + timedelta(days=1)).isoformat()}
+
+    assert (await client.get("/api/reports/timeseries", params=params)).json()["series"][0]["count"] == 1
+    hits = server.timeseries_cache.hits
+    assert (await client.get("/api/reports/timeseries", params=params)).json()["series"][0]["count"] == 1
+    assert server.timeseries_cache.hits == hits + 1
+
+    await record_sale(client, product, day + timedelta(hours=10))
+    assert (await client.get("/api/reports/timeseries", params=params)).json()["series"][0]["count"] == 2
+
+
+async def test_invalid_ranges_are_rejected(client):
+    response = await client.get("/api/reports/timeseries", params={"from": "2026-01-05", "to": "2026-01-04"})
+    assert response.status_code == 400
+    response = await client.get("/api/reports/timeseries", params={"from": "2000-01-01", "bucket": "hour"})
+    assert response.status_code == 400